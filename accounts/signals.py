@@ -22,5 +22,8 @@ def create_user_profile(sender, instance, created, **kwargs):
         Registro.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
+    # Al iniciar sesión solo se guarda last_login; el registro no cambia
+    if update_fields == frozenset({'last_login'}):
+        return
     instance.registro.save()
\ No newline at end of file
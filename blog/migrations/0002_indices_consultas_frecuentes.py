@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(fields=['estado', '-fecha_publicacion'], name='noticia_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(fields=['estado', 'destacada', '-fecha_publicacion'], name='noticia_destacada_idx'),
+        ),
+    ]
@@ -51,6 +51,10 @@ class Noticia(models.Model):
         verbose_name = "Noticia"
         verbose_name_plural = "Noticias"
         ordering = ['-fecha_publicacion']
+        indexes = [
+            models.Index(fields=['estado', '-fecha_publicacion'], name='noticia_estado_fecha_idx'),
+            models.Index(fields=['estado', 'destacada', '-fecha_publicacion'], name='noticia_destacada_idx'),
+        ]
     
     def __str__(self):
         return self.titulo
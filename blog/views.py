@@ -8,6 +8,7 @@ from django.views.generic import CreateView, UpdateView, DeleteView, ListView
 from django.urls import reverse_lazy
 from .models import Noticia, Categoria, Comentario
 from .forms import ComentarioForm, NoticiaForm
+from principal.roles import pertenece_a
 
 def lista_noticias(request):
     """Vista para mostrar todas las noticias publicadas"""
@@ -125,7 +126,7 @@ def noticias_por_categoria(request, slug):
 # Función para verificar si el usuario es editor
 def es_editor(user):
     return user.is_authenticated and (
-        user.groups.filter(name='Editores').exists() or 
+        pertenece_a(user, 'Editores') or 
         user.is_staff or 
         user.is_superuser
     )
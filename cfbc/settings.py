@@ -148,6 +148,56 @@ LOGIN_REDIRECT_URL = 'principal:login_redirect'
 LOGOUT_REDIRECT_URL = 'principal:home'
 
 
+# Segundos que se guardan en caché los grupos de cada usuario entre peticiones
+# (0 para resolverlos siempre desde la base de datos). Las señales los invalidan
+# al cambiar los grupos del usuario, pero solo en el caché del proceso que hizo
+# el cambio: activarlo únicamente si CACHES usa un backend compartido por todos
+# los procesos (Redis, Memcached). Con el LocMem por defecto, los demás workers
+# seguirían autorizando a un usuario quitado de un grupo hasta que venza.
+ROLES_CACHE_TIMEOUT = 0
+
+# Segundos que cada proceso guarda su copia del curso académico activo (0 para
+# consultarlo siempre). Las señales de CursoAcademico solo vacían la copia del
+# proceso que hizo el cambio: los demás siguen con el año anterior hasta que la
+# suya vence, por eso es corto. CURSO_ACTIVO_CACHE_COMPARTIDO (segundos) agrega
+# el caché de Django como segundo nivel, que las señales vacían para todos;
+# activarlo solo si CACHES usa un backend compartido (Redis, Memcached).
+CURSO_ACTIVO_CACHE_TIMEOUT = 5
+CURSO_ACTIVO_CACHE_COMPARTIDO = 0
+
+# Segundos que se guardan en caché los totales de solicitudes por estado de cada
+# curso académico (0 para calcularlos siempre). Las señales de
+# SolicitudInscripcion los invalidan en el caché del proceso que hizo el cambio:
+# activarlo solo si CACHES usa un backend compartido (Redis, Memcached), o los
+# demás workers mostrarían totales viejos hasta que venza.
+ESTADISTICAS_CACHE_TIMEOUT = 0
+
+# Segundos que se guardan en caché las preguntas y opciones de cada formulario
+# de aplicación (0 para leerlas siempre). La clave incluye la fecha de
+# modificación del formulario, que las señales renuevan al cambiar una pregunta
+# u opción.
+FORMULARIOS_CACHE_TIMEOUT = 60 * 60
+
+# Segundos que se guardan en caché los carruseles de la página de inicio y la
+# página completa de los visitantes anónimos (0 para renderizarlas siempre). Las
+# señales de Curso, Noticia y FormularioAplicacion las invalidan renovando una
+# versión guardada en la base de datos, que ven todos los procesos.
+PORTADA_CACHE_TIMEOUT = 300
+
+# Segundos que se guarda en caché el historial académico de cada estudiante (0
+# para armarlo siempre). Las señales de notas, asistencias y matrículas lo
+# invalidan en el caché del proceso que hizo el cambio: activarlo solo si CACHES
+# usa un backend compartido (Redis, Memcached), o los demás workers mostrarían
+# notas viejas hasta que venza.
+HISTORIAL_CACHE_TIMEOUT = 0
+
+# Segundos que un archivo de exportación (PDF/Excel) generado por el worker
+# `manage.py exportaciones` se reutiliza para pedidos idénticos mientras los
+# datos no cambien. Los trabajos más viejos los borra el worker al iniciar y
+# luego cada hora (opción --limpieza), cuando la cola está vacía.
+EXPORTACIONES_VIGENCIA = 60 * 60 * 24
+
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -165,4 +215,16 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 # Configuración de timeout para evitar bloqueos prolongados
 EMAIL_TIMEOUT = 60  # segundos
 # Configuración del remitente por defecto para correos noreply
-DEFAULT_FROM_EMAIL = 'Centro Fray Bartolome de las Casas <noreply@cfbc.edu.ni>'
\ No newline at end of file
+DEFAULT_FROM_EMAIL = 'Centro Fray Bartolome de las Casas <noreply@cfbc.edu.ni>'
+
+# Bandeja de salida (ver principal/correos.py). Las vistas encolan los correos y
+# el worker `manage.py enviar_correos` los envía de a CORREOS_LOTE por una misma
+# conexión. Un correo que falla se reintenta tras CORREOS_REINTENTO segundos,
+# espera que se duplica en cada fallo, hasta CORREOS_MAX_INTENTOS intentos.
+CORREOS_LOTE = 50
+CORREOS_MAX_INTENTOS = 5
+CORREOS_REINTENTO = 60
+# Backend con el que envía el worker (por defecto EMAIL_BACKEND). En desarrollo
+# puede usarse 'django.core.mail.backends.filebased.EmailBackend' junto con
+# EMAIL_FILE_PATH, o 'django.core.mail.backends.locmem.EmailBackend'.
+CORREOS_BACKEND = os.getenv("CORREOS_BACKEND") or None
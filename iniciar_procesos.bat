@@ -0,0 +1,16 @@
+@echo off
+echo ======================================================
+echo Iniciando los procesos en segundo plano...
+echo ======================================================
+echo.
+echo - enviar_correos: bandeja de salida (registro, recuperacion de contrasena, solicitudes)
+start "CFBC - Correos" python manage.py enviar_correos
+echo - exportaciones: genera los PDF y Excel pedidos desde las vistas
+start "CFBC - Exportaciones" python manage.py exportaciones
+echo - transiciones_cursos: cambia el estado de los cursos al vencer sus fechas (cada hora)
+start "CFBC - Transiciones de cursos" python manage.py transiciones_cursos --intervalo 3600
+echo.
+echo Cada proceso se abre en su propia ventana; cierrela para detenerlo.
+echo Deben estar corriendo junto al servidor web: sin enviar_correos no llegan
+echo los codigos de registro ni de recuperacion de contrasena.
+pause
\ No newline at end of file
@@ -1,12 +1,19 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
+from django.db import transaction
 from.models import (
     Curso, Matriculas, Asistencia, Calificaciones, CursoAcademico, NotaIndividual,
-    FormularioAplicacion, PreguntaFormulario, OpcionRespuesta, SolicitudInscripcion, RespuestaEstudiante
+    FormularioAplicacion, PreguntaFormulario, OpcionRespuesta, SolicitudInscripcion, RespuestaEstudiante,
+    TransicionCurso, CorreoPendiente,
 )
 # Register your models here.
 
 from .models import CursoAcademico
+from . import contadores
+from .cambio_curso import activar_curso_academico, cambiar_curso_academico, promover_matriculas
+from .cursos_academicos import curso_activo
+from .solicitudes import revisar_solicitudes
+from .versiones import agrupar_versiones
 
 class CursoAdmin(admin.ModelAdmin):
     list_display = ('name', 'area', 'tipo', 'teacher', 'class_quantity', 'curso_academico')
@@ -23,7 +30,7 @@ class CursoAdmin(admin.ModelAdmin):
                 qs = qs.filter(curso_academico__id=curso_academico_id)
             else:
                 # If no specific academic year is selected, filter by the active one
-                active_academic_year = CursoAcademico.objects.filter(activo=True).first()
+                active_academic_year = curso_activo()
                 if active_academic_year:
                     qs = qs.filter(curso_academico=active_academic_year)
                 else:
@@ -45,27 +52,17 @@ class MatriculasAdmin(admin.ModelAdmin):
     aprobar_matriculas.short_description = "Marcar matrículas seleccionadas como aprobadas"
     
     def promover_al_siguiente_curso(self, request, queryset):
-        # Solo promover matrículas aprobadas
-        aprobadas = queryset.filter(estado='A')
-        curso_actual = CursoAcademico.objects.filter(activo=True).first()
-        
+        curso_actual = curso_activo()
+
         if not curso_actual:
             self.message_user(request, "No hay un curso académico activo configurado")
             return
-            
-        contador = 0
-        for matricula in aprobadas:
-            # Crear nueva matrícula en el curso actual
-            Matriculas.objects.create(
-                student=matricula.student,
-                course=matricula.course,
-                curso_academico=curso_actual,
-                activo=True,
-                estado='P'  # Comienza como pendiente en el nuevo curso
-            )
-            contador += 1
-            
-        self.message_user(request, f"{contador} matrículas han sido promovidas al curso {curso_actual}")
+
+        # Solo se promueven las aprobadas; comienzan como pendientes en el nuevo curso
+        cursos, contador = promover_matriculas(queryset, curso_actual)
+        self.message_user(
+            request, f"{contador} matrículas han sido promovidas al curso {curso_actual} ({cursos} cursos creados)"
+        )
     promover_al_siguiente_curso.short_description = "Promover matrículas aprobadas al curso actual"
 
 admin.site.register(Matriculas, MatriculasAdmin) 
@@ -87,6 +84,13 @@ class CalificacionesAdmin(admin.ModelAdmin):
     exclude=('average',)
     inlines = [NotaIndividualInline] # Añade el inline para NotaIndividual
 
+    def save_related(self, request, form, formsets, change):
+        # Guardar las notas del inline y recalcular el promedio una sola vez
+        with transaction.atomic():
+            with contadores.en_lote(), agrupar_versiones():
+                super().save_related(request, form, formsets, change)
+            contadores.recalcular_calificacion(form.instance)
+
     def display_notas_individuales(self, obj):
         # Muestra las notas individuales como una lista en el admin
         notas = obj.notas.all().order_by('id')
@@ -99,17 +103,33 @@ class CursoAcademicoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'activo', 'archivado', 'fecha_creacion', 'ver_detalles_curso_academico')
     list_filter = ('activo', 'archivado')
     search_fields = ('nombre',)
-    actions = ['activar_curso', 'archivar_curso', 'desarchivar_curso']
-    
+    actions = ['activar_curso', 'iniciar_curso', 'archivar_curso', 'desarchivar_curso']
+
+    def _uno_seleccionado(self, request, queryset):
+        cursos = list(queryset[:2])
+        if len(cursos) != 1:
+            self.message_user(request, "Seleccione un solo curso académico", level=messages.ERROR)
+            return None
+        return cursos[0]
+
     def activar_curso(self, request, queryset):
-        # Desactivar todos los cursos primero
-        CursoAcademico.objects.all().update(activo=False)
-        # Activar solo el seleccionado
-        if queryset.count() > 0:
-            curso = queryset.first()
-            curso.activar()
+        curso = self._uno_seleccionado(request, queryset)
+        if curso:
+            activar_curso_academico(curso)
             self.message_user(request, f"El curso {curso.nombre} ha sido activado")
     activar_curso.short_description = "Activar curso seleccionado (desactiva los demás)"
+
+    def iniciar_curso(self, request, queryset):
+        curso = self._uno_seleccionado(request, queryset)
+        if curso:
+            anterior = curso_activo()
+            cursos, matriculas = cambiar_curso_academico(curso)
+            self.message_user(
+                request,
+                f"El curso {curso.nombre} ha sido activado; desde {anterior.nombre if anterior else 'ningún curso'} "
+                f"se copiaron {cursos} cursos y {matriculas} matrículas aprobadas",
+            )
+    iniciar_curso.short_description = "Iniciar curso seleccionado (activarlo y copiar cursos y matrículas aprobadas del activo)"
     
     def archivar_curso(self, request, queryset):
         # Archivar los cursos seleccionados
@@ -144,6 +164,36 @@ class CursoAcademicoAdmin(admin.ModelAdmin):
 
 admin.site.register(CursoAcademico, CursoAcademicoAdmin)
 
+class TransicionCursoAdmin(admin.ModelAdmin):
+    """Historial de solo lectura de los cambios de estado programados"""
+    list_display = ('curso', 'regla', 'estado_anterior', 'estado_nuevo', 'fecha')
+    list_filter = ('regla', 'estado_nuevo')
+    list_select_related = ('curso__curso_academico',)
+    search_fields = ('curso__name',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+admin.site.register(TransicionCurso, TransicionCursoAdmin)
+
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    """Bandeja de salida de correos, solo de consulta: el cuerpo (con códigos de verificación) no se muestra"""
+    list_display = ('asunto', 'destinatario', 'estado', 'intentos', 'proximo_intento', 'fecha_creacion', 'fecha_envio')
+    list_filter = ('estado',)
+    search_fields = ('destinatario', 'asunto')
+    exclude = ('mensaje',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+admin.site.register(CorreoPendiente, CorreoPendienteAdmin)
+
 # ADMINISTRACIÓN DE FORMULARIOS DE APLICACIÓN A CURSOS
 
 class OpcionRespuestaInline(admin.TabularInline):
@@ -351,8 +401,7 @@ class RespuestaEstudianteInline(admin.TabularInline):
     def get_opciones_seleccionadas(self, obj):
         """Muestra las opciones seleccionadas como texto"""
         if obj.pk:
-            opciones = obj.opciones_seleccionadas.all()
-            return ', '.join([opcion.texto for opcion in opciones]) if opciones else 'Sin respuesta'
+            return obj.resumen() or 'Sin respuesta'
         return 'Sin respuesta'
     get_opciones_seleccionadas.short_description = 'Respuestas'
 
@@ -387,13 +436,7 @@ class SolicitudInscripcionAdmin(admin.ModelAdmin):
     
     def aprobar_solicitudes(self, request, queryset):
         """Acción para aprobar solicitudes seleccionadas"""
-        contador = 0
-        for solicitud in queryset.filter(estado='pendiente'):
-            try:
-                solicitud.aprobar(request.user)
-                contador += 1
-            except Exception as e:
-                self.message_user(request, f"Error al aprobar solicitud de {solicitud.estudiante}: {str(e)}", level='ERROR')
+        contador = revisar_solicitudes(queryset, True, request.user)
         
         if contador > 0:
             self.message_user(request, f"{contador} solicitudes han sido aprobadas y se crearon las matrículas correspondientes")
@@ -401,10 +444,7 @@ class SolicitudInscripcionAdmin(admin.ModelAdmin):
     
     def rechazar_solicitudes(self, request, queryset):
         """Acción para rechazar solicitudes seleccionadas"""
-        contador = 0
-        for solicitud in queryset.filter(estado='pendiente'):
-            solicitud.rechazar(request.user)
-            contador += 1
+        contador = revisar_solicitudes(queryset, False, request.user)
         
         if contador > 0:
             self.message_user(request, f"{contador} solicitudes han sido rechazadas")
@@ -427,9 +467,8 @@ class RespuestaEstudianteAdmin(admin.ModelAdmin):
     pregunta_texto_corto.short_description = 'Pregunta'
     
     def get_opciones_seleccionadas(self, obj):
-        """Muestra las opciones seleccionadas"""
-        opciones = obj.opciones_seleccionadas.all()
-        return ', '.join([opcion.texto for opcion in opciones]) if opciones else 'Sin respuesta'
+        """Muestra las opciones seleccionadas o el texto escrito"""
+        return obj.resumen() or 'Sin respuesta'
     get_opciones_seleccionadas.short_description = 'Respuestas'
 
 # REGISTRAR MODELOS DE FORMULARIOS DE APLICACIÓN EN EL ADMIN
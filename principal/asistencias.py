@@ -0,0 +1,178 @@
+from array import array
+from django.db import transaction
+from django.utils.functional import cached_property
+from . import contadores
+from .historial import invalidar_historial
+from .models import Asistencia
+from .trabajos import invalidar_exportaciones
+
+
+def registrar_asistencias(course, fecha, presentes, reemplazar=False):
+    """
+    Guarda la asistencia de todo un grupo para una fecha en una sola transacción.
+
+    `presentes` es un diccionario {student_id: bool}. Las filas se insertan o
+    actualizan con un único `bulk_create(update_conflicts=True)` sobre la clave
+    única (student, date, course). Si `reemplazar` es True, además se eliminan
+    las asistencias de esa fecha de estudiantes que no vienen en `presentes`.
+
+    Devuelve un diccionario con los ids de estudiantes 'creadas', 'actualizadas',
+    'sin_cambios' y 'eliminadas'. Los contadores de Matriculas y Curso se
+    ajustan con un solo llamado a `contadores.ajustar_asistencias`.
+    """
+    cambios = {'creadas': [], 'actualizadas': [], 'sin_cambios': [], 'eliminadas': []}
+
+    with transaction.atomic():
+        anteriores = dict(
+            Asistencia.objects.select_for_update().filter(
+                course=course, date=fecha
+            ).values_list('student_id', 'presente')
+        )
+
+        for student_id, presente in presentes.items():
+            if student_id not in anteriores:
+                cambios['creadas'].append(student_id)
+            elif anteriores[student_id] != presente:
+                cambios['actualizadas'].append(student_id)
+            else:
+                cambios['sin_cambios'].append(student_id)
+
+        if reemplazar:
+            cambios['eliminadas'] = [student_id for student_id in anteriores if student_id not in presentes]
+            if cambios['eliminadas']:
+                with contadores.en_lote():
+                    Asistencia.objects.filter(
+                        course=course, date=fecha, student_id__in=cambios['eliminadas']
+                    ).delete()
+
+        por_guardar = cambios['creadas'] + cambios['actualizadas']
+        if por_guardar:
+            Asistencia.objects.bulk_create(
+                [
+                    Asistencia(course=course, student_id=student_id, date=fecha, presente=presentes[student_id])
+                    for student_id in por_guardar
+                ],
+                update_conflicts=True,
+                unique_fields=['student', 'date', 'course'],
+                update_fields=['presente'],
+            )
+            # bulk_create no envía post_save
+            invalidar_exportaciones()
+
+        deltas = {}
+        for student_id in cambios['creadas']:
+            deltas[student_id] = (1, int(presentes[student_id]))
+        for student_id in cambios['actualizadas']:
+            deltas[student_id] = (0, 1 if presentes[student_id] else -1)
+        for student_id in cambios['eliminadas']:
+            deltas[student_id] = (-1, -int(bool(anteriores[student_id])))
+        # La fecha cuenta como sesión del curso mientras tenga al menos un registro
+        quedan = len(anteriores) - len(cambios['eliminadas']) + len(cambios['creadas'])
+        sesiones = int(quedan > 0) - int(bool(anteriores))
+        contadores.ajustar_asistencias(course.pk, deltas, sesiones)
+        invalidar_historial(*deltas)
+
+    return cambios
+
+
+def eliminar_asistencias(queryset):
+    """
+    Borra las asistencias del queryset y descuenta los contadores en bloque.
+
+    En lugar de ajustar los contadores fila por fila desde las señales, suma
+    los cambios por curso y estudiante y revisa con una consulta por curso qué
+    fechas se quedaron sin registros.
+    """
+    with transaction.atomic():
+        filas = list(queryset.values_list('course_id', 'student_id', 'date', 'presente'))
+        if not filas:
+            return 0
+        with contadores.en_lote():
+            queryset.delete()
+
+        por_curso = {}
+        for course_id, student_id, dia, presente in filas:
+            deltas, fechas = por_curso.setdefault(course_id, ({}, set()))
+            registradas, presentes = deltas.get(student_id, (0, 0))
+            deltas[student_id] = (registradas - 1, presentes - int(bool(presente)))
+            fechas.add(dia)
+
+        for course_id, (deltas, fechas) in por_curso.items():
+            siguen = set(
+                Asistencia.objects.filter(course_id=course_id, date__in=fechas).values_list('date', flat=True).distinct()
+            )
+            contadores.ajustar_asistencias(course_id, deltas, -len(fechas - siguen))
+        invalidar_historial(*{student_id for _, student_id, _, _ in filas})
+    return len(filas)
+
+
+# Valores de cada celda de la matriz de asistencias
+SIN_REGISTRO, AUSENTE, PRESENTE = -1, 0, 1
+
+
+class MatrizAsistencias:
+    """
+    Matriz estudiante × fecha con las asistencias de un curso.
+
+    Se construye con una sola consulta sobre Asistencia: las celdas se guardan
+    en un `array` plano (fila = índice del estudiante en `matriculas`, columna =
+    índice de la fecha en `fechas`) y en la misma pasada se acumulan los
+    presentes y el total de cada estudiante. Si se indica `fecha`, las columnas
+    se limitan a esa fecha, pero los totales siguen cubriendo todo el curso.
+    """
+    def __init__(self, course, matriculas, fecha=None):
+        self.matriculas = list(matriculas)
+        indice = {matricula.student_id: i for i, matricula in enumerate(self.matriculas)}
+
+        registros = list(
+            Asistencia.objects.filter(course=course).values_list('student_id', 'date', 'presente')
+        )
+
+        self.fechas = sorted(
+            {dia for student_id, dia, _ in registros if student_id in indice and (fecha is None or dia == fecha)},
+            reverse=True,
+        )
+        columna = {dia: j for j, dia in enumerate(self.fechas)}
+
+        self.ancho = len(self.fechas)
+        self.celdas = array('b', [SIN_REGISTRO]) * (len(self.matriculas) * self.ancho)
+        self.presentes = array('l', [0]) * len(self.matriculas)
+        self.totales = array('l', [0]) * len(self.matriculas)
+
+        for student_id, dia, presente in registros:
+            i = indice.get(student_id)
+            if i is None:
+                continue
+            self.totales[i] += 1
+            if presente:
+                self.presentes[i] += 1
+            j = columna.get(dia)
+            if j is not None:
+                self.celdas[i * self.ancho + j] = PRESENTE if presente else AUSENTE
+
+    def celda(self, i, j):
+        """True/False si el estudiante i asistió o no en la fecha j, None si no hay registro."""
+        valor = self.celdas[i * self.ancho + j]
+        return None if valor == SIN_REGISTRO else valor == PRESENTE
+
+    def porcentaje(self, i):
+        if not self.totales[i]:
+            return None
+        return round(self.presentes[i] * 100 / self.totales[i])
+
+    @cached_property
+    def filas(self):
+        """Una fila por matrícula con sus celdas y totales, lista para la plantilla."""
+        filas = []
+        for i, matricula in enumerate(self.matriculas):
+            celdas = [self.celda(i, j) for j in range(self.ancho)]
+            filas.append({
+                'matricula': matricula,
+                'student': matricula.student,
+                'celdas': celdas,
+                'presentes': self.presentes[i],
+                'ausentes': self.totales[i] - self.presentes[i],
+                'total': self.totales[i],
+                'porcentaje': self.porcentaje(i),
+            })
+        return filas
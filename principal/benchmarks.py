@@ -0,0 +1,386 @@
+"""
+Benchmarks de las rutas de escritura y lectura más pesadas.
+
+Cada benchmark genera sus propios datos de prueba; el comando
+`manage.py benchmark <nombre>` los ejecuta dentro de una transacción que se
+revierte al terminar, así que no dejan rastro en la base de datos.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from .asistencias import MatrizAsistencias, registrar_asistencias
+from .calificaciones import guardar_grilla, importar_notas
+from .cursos_academicos import invalidar_curso_activo
+from .models import Asistencia, Calificaciones, Curso, CursoAcademico, Matriculas, NotaIndividual
+
+BENCHMARKS = {}
+
+
+def benchmark(nombre):
+    """Registra una función como benchmark disponible en el comando."""
+    def decorador(func):
+        BENCHMARKS[nombre] = func
+        return func
+    return decorador
+
+
+@contextmanager
+def medir(stdout, etiqueta):
+    """Mide el tiempo y la cantidad de consultas del bloque y lo escribe en stdout."""
+    with CaptureQueriesContext(connection) as consultas:
+        inicio = time.perf_counter()
+        yield
+        duracion = time.perf_counter() - inicio
+    stdout.write(f'{etiqueta}: {duracion * 1000:.1f} ms, {len(consultas)} consultas')
+
+
+def crear_curso_con_estudiantes(estudiantes):
+    """Crea un curso académico, un curso y `estudiantes` matrículas para los benchmarks."""
+    sufijo = uuid.uuid4().hex[:8]
+    curso_academico = CursoAcademico.objects.create(nombre=f'bench-{sufijo}')
+    profesor = User.objects.create(username=f'bench-profesor-{sufijo}')
+    curso = Curso.objects.create(
+        name=f'Curso bench {sufijo}',
+        teacher=profesor,
+        curso_academico=curso_academico,
+    )
+    alumnos = User.objects.bulk_create([
+        User(username=f'bench-{sufijo}-{i}', first_name='Estudiante', last_name=str(i))
+        for i in range(estudiantes)
+    ])
+    Matriculas.objects.bulk_create([
+        Matriculas(course=curso, student=alumno, curso_academico=curso_academico)
+        for alumno in alumnos
+    ])
+    return curso, alumnos
+
+
+@benchmark('asistencias')
+def benchmark_asistencias(stdout, estudiantes=40, fechas=20):
+    """Registra la asistencia de N estudiantes en M fechas, fila por fila y en bloque."""
+    curso, alumnos = crear_curso_con_estudiantes(estudiantes)
+    dias = [date(2025, 1, 1) + timedelta(days=i) for i in range(fechas)]
+    stdout.write(f'{estudiantes} estudiantes x {fechas} fechas')
+
+    with medir(stdout, 'get_or_create por estudiante'):
+        for dia in dias:
+            for alumno in alumnos:
+                asistencia, created = Asistencia.objects.get_or_create(
+                    student=alumno, course=curso, date=dia, defaults={'presente': True}
+                )
+                if not created:
+                    asistencia.save()
+    Asistencia.objects.filter(course=curso).delete()
+
+    with medir(stdout, 'registrar_asistencias (inserción)'):
+        for dia in dias:
+            registrar_asistencias(curso, dia, {alumno.id: True for alumno in alumnos})
+
+    with medir(stdout, 'registrar_asistencias (actualización de la mitad)'):
+        for dia in dias:
+            registrar_asistencias(curso, dia, {alumno.id: bool(i % 2) for i, alumno in enumerate(alumnos)})
+
+
+@benchmark('matriz_asistencias')
+def benchmark_matriz_asistencias(stdout, estudiantes=50, fechas=80):
+    """Construye la matriz de asistencias y renderiza la página completa del curso."""
+    from .views import AsistenciaView
+
+    curso, alumnos = crear_curso_con_estudiantes(estudiantes)
+    CursoAcademico.objects.filter(activo=True).update(activo=False)
+    CursoAcademico.objects.filter(pk=curso.curso_academico_id).update(activo=True)
+    invalidar_curso_activo()
+    Asistencia.objects.bulk_create([
+        Asistencia(course=curso, student=alumno, date=date(2025, 1, 1) + timedelta(days=j), presente=bool((i + j) % 3))
+        for j in range(fechas)
+        for i, alumno in enumerate(alumnos)
+    ])
+    stdout.write(f'{estudiantes} estudiantes x {fechas} fechas')
+
+    matriculas = Matriculas.objects.filter(course=curso).select_related('student')
+    with medir(stdout, 'MatrizAsistencias'):
+        MatrizAsistencias(curso, matriculas).filas
+
+    request = RequestFactory().get(f'/cursos/{curso.id}/asistencias/')
+    request.user = curso.teacher
+    with medir(stdout, 'AsistenciaView (render)'):
+        AsistenciaView.as_view()(request, course_id=curso.id).render()
+
+
+@benchmark('notas')
+def benchmark_notas(stdout, estudiantes=60, notas=10):
+    """Carga N columnas de notas para un curso, nota por nota y con importar_notas."""
+    curso, _ = crear_curso_con_estudiantes(estudiantes)
+    matriculas = list(Matriculas.objects.filter(course=curso))
+    stdout.write(f'{estudiantes} estudiantes x {notas} notas')
+
+    with medir(stdout, 'NotaIndividual.save() por nota'):
+        for matricula in matriculas:
+            calificacion = Calificaciones.objects.create(
+                matricula=matricula, course=curso, student_id=matricula.student_id,
+                curso_academico_id=matricula.curso_academico_id,
+            )
+            for i in range(notas):
+                NotaIndividual.objects.create(calificacion=calificacion, valor=60 + i)
+    Calificaciones.objects.filter(course=curso).delete()
+
+    with medir(stdout, 'importar_notas por columna'):
+        for i in range(notas):
+            importar_notas(curso, {matricula.pk: 60 + i for matricula in matriculas})
+
+
+@benchmark('grilla_notas')
+def benchmark_grilla_notas(stdout, estudiantes=60, notas=12):
+    """Guarda una grilla de N estudiantes x M notas: nota por nota y con guardar_grilla, y luego la corrige entera."""
+    curso, _ = crear_curso_con_estudiantes(estudiantes)
+    matriculas = list(Matriculas.objects.filter(course=curso))
+    stdout.write(f'Grilla de {estudiantes} estudiantes x {notas} notas')
+
+    with medir(stdout, 'NotaIndividual.save() por nota'):
+        for matricula in matriculas:
+            calificacion = Calificaciones.objects.create(
+                matricula=matricula, course=curso, student_id=matricula.student_id,
+                curso_academico_id=matricula.curso_academico_id,
+            )
+            for i in range(notas):
+                NotaIndividual.objects.create(calificacion=calificacion, valor=60 + i)
+    Calificaciones.objects.filter(course=curso).delete()
+
+    with medir(stdout, 'guardar_grilla (notas nuevas)'):
+        guardar_grilla(curso, {matricula.pk: [60 + i for i in range(notas)] for matricula in matriculas})
+    with medir(stdout, 'guardar_grilla (todas modificadas)'):
+        guardar_grilla(curso, {matricula.pk: [70 + i for i in range(notas)] for matricula in matriculas})
+
+
+@benchmark('cambio_curso')
+def benchmark_cambio_curso(stdout, matriculas=20000, cursos=200, por_fila=2000):
+    """Cambio de curso académico con N matrículas aprobadas: create() por matrícula y cambiar_curso_academico."""
+    from .cambio_curso import cambiar_curso_academico
+
+    sufijo = uuid.uuid4().hex[:8]
+    origen = CursoAcademico.objects.create(nombre=f'bench-{sufijo}', activo=True)
+    profesor = User.objects.create(username=f'bench-profesor-{sufijo}')
+    lista_cursos = Curso.objects.bulk_create([
+        Curso(name=f'Curso bench {sufijo} {i}', teacher=profesor, curso_academico=origen) for i in range(cursos)
+    ])
+    alumnos = User.objects.bulk_create([
+        User(username=f'bench-{sufijo}-{i}') for i in range(-(-matriculas // cursos))
+    ])
+    Matriculas.objects.bulk_create([
+        Matriculas(course=curso, student=alumno, curso_academico=origen, estado='A')
+        for curso in lista_cursos
+        for alumno in alumnos
+    ][:matriculas], batch_size=2000)
+    stdout.write(f'{matriculas} matrículas aprobadas en {cursos} cursos')
+
+    # Lo que hacía la acción del admin: una consulta por matrícula, sin copiar los cursos
+    destino = CursoAcademico.objects.create(nombre=f'bench-{sufijo}-create')
+    with medir(stdout, f'Matriculas.objects.create por matrícula ({por_fila} matrículas)'):
+        for matricula in Matriculas.objects.filter(curso_academico=origen, estado='A').select_related('student', 'course')[:por_fila]:
+            Matriculas.objects.create(
+                student=matricula.student, course=matricula.course, curso_academico=destino, activo=True, estado='P',
+            )
+
+    destino = CursoAcademico.objects.create(nombre=f'bench-{sufijo}-nuevo')
+    with medir(stdout, f'cambiar_curso_academico ({matriculas} matrículas)'):
+        cambiar_curso_academico(destino, origen)
+    with medir(stdout, 'cambiar_curso_academico repetido (sin cambios)'):
+        cambiar_curso_academico(destino, origen)
+
+
+@benchmark('respuestas')
+def benchmark_respuestas(stdout, solicitudes=5000, preguntas=30):
+    """Exporta la matriz de respuestas de un curso: prefetch por solicitud y matriz_respuestas a XLSX y CSV."""
+    import tempfile
+
+    from .exportacion import Hoja, escribir_csv, escribir_libro
+    from .models import FormularioAplicacion, OpcionRespuesta, PreguntaFormulario, RespuestaEstudiante, SolicitudInscripcion
+    from .reportes import hoja_respuestas_curso
+
+    curso, alumnos = crear_curso_con_estudiantes(solicitudes)
+    formulario = FormularioAplicacion.objects.create(curso=curso, titulo='bench')
+    tipos = ('seleccion_multiple', 'seleccion_unica', 'escritura_libre')
+    lista_preguntas = PreguntaFormulario.objects.bulk_create([
+        PreguntaFormulario(formulario=formulario, texto=f'Pregunta {i}', tipo=tipos[i % 3], orden=i) for i in range(preguntas)
+    ])
+    opciones = {
+        pregunta.pk: OpcionRespuesta.objects.bulk_create([
+            OpcionRespuesta(pregunta=pregunta, texto=f'Opción {j}', orden=j) for j in range(4)
+        ])
+        for pregunta in lista_preguntas if pregunta.tipo != 'escritura_libre'
+    }
+    lista_solicitudes = SolicitudInscripcion.objects.bulk_create([
+        SolicitudInscripcion(curso=curso, estudiante=alumno, formulario=formulario) for alumno in alumnos
+    ], batch_size=2000)
+    respuestas = RespuestaEstudiante.objects.bulk_create([
+        RespuestaEstudiante(
+            solicitud=solicitud, pregunta=pregunta,
+            texto_respuesta=f'Texto {i}' if pregunta.tipo == 'escritura_libre' else '',
+        )
+        for i, solicitud in enumerate(lista_solicitudes)
+        for pregunta in lista_preguntas
+    ], batch_size=2000)
+    Through = RespuestaEstudiante.opciones_seleccionadas.through
+    Through.objects.bulk_create([
+        Through(respuestaestudiante_id=respuesta.pk, opcionrespuesta_id=opcion.pk)
+        for i, respuesta in enumerate(respuestas)
+        if respuesta.pregunta.tipo != 'escritura_libre'
+        for opcion in opciones[respuesta.pregunta_id][: 2 if respuesta.pregunta.tipo == 'seleccion_multiple' else 1]
+    ], batch_size=2000)
+    stdout.write(f'{solicitudes} solicitudes x {preguntas} preguntas')
+
+    # Lo que hacía la exportación: prefetch de respuestas y opciones e instancias por solicitud
+    def filas_prefetch():
+        consulta = SolicitudInscripcion.objects.filter(curso=curso).select_related('estudiante').prefetch_related(
+            'respuestas__opciones_seleccionadas'
+        ).order_by('estudiante__first_name', 'estudiante__last_name')
+        for solicitud in consulta:
+            valores = {respuesta.pregunta_id: respuesta.resumen() for respuesta in solicitud.respuestas.all()}
+            yield [solicitud.estudiante.username] + [valores.get(pregunta.pk, 'Sin respuesta') for pregunta in lista_preguntas]
+
+    with tempfile.TemporaryFile() as destino:
+        with medir(stdout, 'prefetch_related por solicitud (XLSX)'):
+            columnas = [('Estudiante', 30)] + [(pregunta.texto, 20) for pregunta in lista_preguntas]
+            escribir_libro([Hoja('Respuestas', columnas, filas_prefetch())], destino)
+    with tempfile.TemporaryFile() as destino:
+        with medir(stdout, 'matriz_respuestas (XLSX)'):
+            escribir_libro([hoja_respuestas_curso(curso)], destino)
+    with tempfile.TemporaryFile() as destino:
+        with medir(stdout, 'matriz_respuestas (CSV)'):
+            escribir_csv(hoja_respuestas_curso(curso), destino)
+
+
+@benchmark('revision_solicitudes')
+def benchmark_revision_solicitudes(stdout, solicitudes=200):
+    """Aprueba N solicitudes pendientes: aprobar() y send_mail por solicitud y revisar_solicitudes."""
+    from django.conf import settings
+    from django.core.mail import send_mail
+
+    from .correos import correo_solicitud_aprobada
+    from .models import FormularioAplicacion, SolicitudInscripcion
+    from .solicitudes import revisar_solicitudes
+
+    stdout.write(f'{solicitudes} solicitudes pendientes (backend de correo: {settings.EMAIL_BACKEND})')
+    for etiqueta in ('aprobar() y send_mail por solicitud', 'revisar_solicitudes'):
+        curso, _ = crear_curso_con_estudiantes(0)
+        alumnos = User.objects.bulk_create([
+            User(username=f'{curso.name}-{i}', email=f'bench{i}@example.com') for i in range(solicitudes)
+        ])
+        formulario = FormularioAplicacion.objects.create(curso=curso, titulo='bench')
+        SolicitudInscripcion.objects.bulk_create([
+            SolicitudInscripcion(curso=curso, estudiante=alumno, formulario=formulario) for alumno in alumnos
+        ])
+        pendientes = SolicitudInscripcion.objects.filter(curso=curso, estado='pendiente')
+        with medir(stdout, etiqueta):
+            if etiqueta == 'revisar_solicitudes':
+                revisar_solicitudes(pendientes, True, curso.teacher)
+            else:
+                for solicitud in pendientes.select_related('curso', 'estudiante'):
+                    solicitud.aprobar(curso.teacher)
+                    send_mail(*correo_solicitud_aprobada(curso.name), settings.DEFAULT_FROM_EMAIL, [solicitud.estudiante.email])
+
+
+@benchmark('portada')
+def benchmark_portada(stdout, cursos=60, noticias=20, visitas=100):
+    """N visitas anónimas a la portada sin caché y con la página guardada en el caché."""
+    from django.contrib.auth.models import AnonymousUser
+    from django.core.cache import cache
+    from django.test import override_settings
+
+    from blog.models import Categoria, Noticia
+    from .views import HomeView
+
+    curso, _ = crear_curso_con_estudiantes(0)
+    CursoAcademico.objects.filter(activo=True).update(activo=False)
+    CursoAcademico.objects.filter(pk=curso.curso_academico_id).update(activo=True)
+    invalidar_curso_activo()
+    Curso.objects.bulk_create([
+        Curso(name=f'Curso {i}', teacher=curso.teacher, curso_academico=curso.curso_academico) for i in range(cursos)
+    ])
+    categoria = Categoria.objects.create(nombre=f'bench-{curso.pk}')
+    for i in range(noticias):
+        Noticia.objects.create(
+            titulo=f'Noticia {i}', resumen='Resumen', contenido='Contenido', estado='publicado',
+            categoria=categoria, autor=curso.teacher,
+        )
+
+    stdout.write(f'{visitas} visitas anónimas, {cursos} cursos y {noticias} noticias')
+    vista = HomeView.as_view()
+    peticion = RequestFactory().get('/')
+    peticion.user = AnonymousUser()
+    for etiqueta, timeout in (('sin caché', 0), ('con caché', 300)):
+        cache.clear()
+        with override_settings(PORTADA_CACHE_TIMEOUT=timeout), medir(stdout, etiqueta):
+            for _ in range(visitas):
+                respuesta = vista(peticion)
+                if hasattr(respuesta, 'render'):
+                    respuesta.render()
+
+
+@benchmark('perfil')
+def benchmark_perfil(stdout, cursos=30, solicitudes=500):
+    """Perfil de un profesor con N cursos en el año activo y M solicitudes pendientes."""
+    from django.contrib.auth.models import Group
+
+    from .models import FormularioAplicacion, SolicitudInscripcion
+    from .views import ProfileView
+
+    curso, alumnos = crear_curso_con_estudiantes(solicitudes)
+    profesor = curso.teacher
+    profesor.groups.set([Group.objects.get_or_create(name='Profesores')[0]])
+    CursoAcademico.objects.filter(activo=True).update(activo=False)
+    CursoAcademico.objects.filter(pk=curso.curso_academico_id).update(activo=True)
+    invalidar_curso_activo()
+    asignados = [curso] + Curso.objects.bulk_create([
+        Curso(name=f'{curso.name} {i}', teacher=profesor, curso_academico=curso.curso_academico) for i in range(1, cursos)
+    ])
+    formularios = FormularioAplicacion.objects.bulk_create([
+        FormularioAplicacion(curso=asignado, titulo='bench') for asignado in asignados
+    ])
+    SolicitudInscripcion.objects.bulk_create([
+        SolicitudInscripcion(curso=asignados[i % cursos], formulario=formularios[i % cursos], estudiante=alumno)
+        for i, alumno in enumerate(alumnos)
+    ])
+
+    stdout.write(f'Profesor con {cursos} cursos y {solicitudes} solicitudes pendientes')
+    peticion = RequestFactory().get('/profile/')
+    peticion.user = profesor
+    with medir(stdout, 'ProfileView'):
+        ProfileView.as_view()(peticion).render()
+
+
+@benchmark('historial')
+def benchmark_historial(stdout, anios=5, cursos=8, notas=6):
+    """Historial de un estudiante con N cursos académicos de M cursos: curso por curso, construir_historial y desde el caché."""
+    from .historial import construir_historial, historial_estudiante, invalidar_historial
+
+    curso, [estudiante] = crear_curso_con_estudiantes(1)
+    for anio in range(anios):
+        curso_academico = CursoAcademico.objects.create(nombre=f'{curso.curso_academico.nombre}-{anio}')
+        for i in range(cursos):
+            nuevo = Curso.objects.create(name=f'{curso.name} {anio}-{i}', teacher=curso.teacher, curso_academico=curso_academico)
+            matricula = Matriculas.objects.create(course=nuevo, student=estudiante, curso_academico=curso_academico)
+            for j in range(notas):
+                importar_notas(nuevo, {matricula.pk: 60 + j})
+                registrar_asistencias(nuevo, date(2025, 3, 1) + timedelta(days=j), {estudiante.pk: j % 2 == 0})
+
+    stdout.write(f'Estudiante con {anios} cursos académicos x {cursos} cursos x {notas} notas')
+    with medir(stdout, 'Notas y asistencias curso por curso'):
+        for matricula in Matriculas.objects.filter(student=estudiante):
+            matricula.course.teacher, matricula.curso_academico
+            for calificacion in Calificaciones.objects.filter(student=estudiante, course=matricula.course):
+                list(calificacion.notas.all())
+            list(Asistencia.objects.filter(student=estudiante, course=matricula.course))
+    with medir(stdout, 'construir_historial'):
+        construir_historial(estudiante.pk)
+    invalidar_historial(estudiante.pk)
+    historial_estudiante(estudiante.pk)
+    with medir(stdout, 'historial_estudiante (desde el caché)'):
+        historial_estudiante(estudiante.pk)
@@ -0,0 +1,288 @@
+import csv
+import io
+from zipfile import BadZipFile
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Prefetch, Subquery, prefetch_related_objects
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from . import contadores
+from .historial import invalidar_historial
+from .models import Calificaciones, Matriculas, NotaIndividual
+from .trabajos import invalidar_exportaciones
+
+
+NOTA_MINIMA, NOTA_MAXIMA = 0, 100
+
+
+def _calificaciones(course, matricula_ids):
+    """
+    Devuelve {matricula_id: Calificaciones} para las matrículas indicadas del
+    curso; las calificaciones que falten se crean con un `bulk_create`. Lanza
+    ValueError si alguna matrícula no pertenece al curso.
+    """
+    matriculas = Matriculas.objects.filter(course=course, pk__in=matricula_ids).only(
+        'id', 'course_id', 'student_id', 'curso_academico_id'
+    )
+    matriculas = {matricula.pk: matricula for matricula in matriculas}
+    desconocidas = set(matricula_ids) - set(matriculas)
+    if desconocidas:
+        raise ValueError(f'Matrículas que no pertenecen al curso: {sorted(desconocidas)}')
+
+    calificaciones = {
+        (calificacion.student_id, calificacion.curso_academico_id): calificacion
+        for calificacion in Calificaciones.objects.filter(
+            course=course, student_id__in=[m.student_id for m in matriculas.values()]
+        )
+    }
+    nuevas = [
+        Calificaciones(
+            matricula=matricula, course=course,
+            student_id=matricula.student_id, curso_academico_id=matricula.curso_academico_id,
+        )
+        for matricula in matriculas.values()
+        if (matricula.student_id, matricula.curso_academico_id) not in calificaciones
+    ]
+    for calificacion in Calificaciones.objects.bulk_create(nuevas):
+        calificaciones[(calificacion.student_id, calificacion.curso_academico_id)] = calificacion
+    return {
+        pk: calificaciones[(matricula.student_id, matricula.curso_academico_id)]
+        for pk, matricula in matriculas.items()
+    }
+
+
+def importar_notas(course, valores):
+    """
+    Agrega una nota a cada matrícula indicada del curso, como una columna de notas.
+
+    `valores` es un diccionario {matricula_id: valor}. Las calificaciones que
+    falten se crean con un `bulk_create`, las notas con otro y los promedios de
+    calificaciones, matrículas y curso se actualizan con un UPDATE por tabla.
+    Devuelve la lista de notas creadas.
+    """
+    with transaction.atomic():
+        calificaciones = _calificaciones(course, valores)
+
+        notas = []
+        deltas = {}
+        for matricula_id, valor in valores.items():
+            calificacion = calificaciones[matricula_id]
+            notas.append(NotaIndividual(calificacion=calificacion, valor=valor))
+            deltas[(calificacion.pk, matricula_id)] = (1, valor)
+
+        notas = NotaIndividual.objects.bulk_create(notas)
+        contadores.ajustar_notas_en_bloque(course.pk, deltas)
+        # bulk_create no envía post_save
+        invalidar_exportaciones()
+        invalidar_historial(*{calificacion.student_id for calificacion in calificaciones.values()})
+    return notas
+
+
+def validar_grilla(filas):
+    """
+    Valida en memoria una grilla de notas y la devuelve normalizada.
+
+    `filas` es {matricula_id: [nota, ...]}, o una lista de pares
+    (matricula_id, [nota, ...]), con una lista por estudiante en el orden de
+    las columnas; las celdas vacías ('' o None) quedan en None. Lanza
+    ValueError con la fila y la columna de la primera nota inválida, y si una
+    matrícula se repite.
+    """
+    grilla = {}
+    for matricula_id, notas in (filas.items() if isinstance(filas, dict) else filas):
+        try:
+            matricula_id = int(matricula_id)
+        except (TypeError, ValueError):
+            raise ValueError(f'Matrícula inválida: {matricula_id!r}')
+        if matricula_id in grilla:
+            raise ValueError(f'La matrícula {matricula_id} aparece más de una vez.')
+        # Un texto es iterable: "95" se leería como dos notas, 9 y 5
+        if not isinstance(notas, (list, tuple)):
+            raise ValueError(f'Las notas de la matrícula {matricula_id} deben ser una lista.')
+        valores = []
+        for columna, nota in enumerate(notas, start=1):
+            if nota is None or str(nota).strip() == '':
+                valores.append(None)
+                continue
+            try:
+                valor = float(str(nota).strip().replace(',', '.'))
+            except ValueError:
+                valor = None
+            if valor is None or not valor.is_integer() or not NOTA_MINIMA <= valor <= NOTA_MAXIMA:
+                raise ValueError(
+                    f'Nota inválida en la matrícula {matricula_id}, columna {columna}: {nota!r} '
+                    f'(debe ser un entero entre {NOTA_MINIMA} y {NOTA_MAXIMA}).'
+                )
+            valores.append(int(valor))
+        grilla[matricula_id] = valores
+    return grilla
+
+
+def guardar_grilla(course, filas):
+    """
+    Guarda una grilla completa de notas del curso (estudiantes x columnas).
+
+    La columna N de cada fila es la N-ésima nota de la calificación, por
+    fecha: si ya existe se cambia su valor y si no se crea. Las celdas vacías
+    no modifican nada. La grilla se valida entera antes de escribir; luego las
+    notas se crean con un `bulk_create`, las modificadas se guardan con un
+    `bulk_update` y los promedios de calificaciones, matrículas y curso se
+    ajustan con un UPDATE por tabla. Devuelve (notas creadas, notas
+    modificadas).
+    """
+    grilla = validar_grilla(filas)
+    grilla = {pk: valores for pk, valores in grilla.items() if any(v is not None for v in valores)}
+    if not grilla:
+        return 0, 0
+
+    with transaction.atomic():
+        calificaciones = _calificaciones(course, grilla)
+        existentes = {}
+        for nota in NotaIndividual.objects.filter(
+            calificacion__in=[calificacion.pk for calificacion in calificaciones.values()]
+        ).order_by('fecha_creacion', 'id').only('id', 'calificacion_id', 'valor'):
+            existentes.setdefault(nota.calificacion_id, []).append(nota)
+
+        nuevas, modificadas, deltas = [], [], {}
+        for matricula_id, valores in grilla.items():
+            calificacion = calificaciones[matricula_id]
+            notas = existentes.get(calificacion.pk, [])
+            cantidad = suma = 0
+            for posicion, valor in enumerate(valores):
+                if valor is None:
+                    continue
+                if posicion < len(notas):
+                    nota = notas[posicion]
+                    if nota.valor != valor:
+                        suma += valor - nota.valor
+                        nota.valor = valor
+                        modificadas.append(nota)
+                else:
+                    nuevas.append(NotaIndividual(calificacion=calificacion, valor=valor))
+                    cantidad += 1
+                    suma += valor
+            if cantidad or suma:
+                deltas[(calificacion.pk, matricula_id)] = (cantidad, suma)
+
+        NotaIndividual.objects.bulk_create(nuevas)
+        NotaIndividual.objects.bulk_update(modificadas, ['valor'])
+        contadores.ajustar_notas_en_bloque(course.pk, deltas)
+        # bulk_create y bulk_update no envían post_save
+        invalidar_exportaciones()
+        invalidar_historial(*{calificacion.student_id for calificacion in calificaciones.values()})
+    return len(nuevas), len(modificadas)
+
+
+def _filas_xlsx(archivo):
+    """Filas de la hoja activa de un XLSX; ValueError si el archivo está dañado."""
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError) as error:
+        raise ValueError('El archivo no es un XLSX válido o está dañado.') from error
+    try:
+        return list(libro.active.iter_rows(values_only=True))
+    finally:
+        # En modo read_only el libro mantiene abierto el archivo hasta cerrarlo
+        libro.close()
+
+
+def _filas_csv(archivo):
+    """Filas de un CSV en UTF-8; ValueError si el archivo está dañado."""
+    try:
+        return list(csv.reader(io.TextIOWrapper(archivo, encoding='utf-8-sig')))
+    except (csv.Error, UnicodeDecodeError) as error:
+        raise ValueError('El archivo no es un CSV válido en UTF-8 o está dañado.') from error
+
+
+def leer_grilla(archivo):
+    """
+    Lee una grilla de notas de un archivo XLSX o CSV subido.
+
+    La primera fila es el encabezado: la columna 'matricula_id' identifica a
+    cada estudiante y las columnas cuyo título empieza por 'Nota' son las
+    notas, en orden; las demás (como el nombre) se ignoran. Devuelve
+    {matricula_id: [nota, ...]} sin validar.
+    """
+    nombre = (archivo.name or '').lower()
+    if nombre.endswith('.xlsx'):
+        filas = iter(_filas_xlsx(archivo))
+    elif nombre.endswith('.csv'):
+        filas = iter(_filas_csv(archivo))
+    else:
+        raise ValueError('El archivo debe ser XLSX o CSV.')
+
+    encabezado = [str(titulo or '').strip() for titulo in next(filas, [])]
+    if 'matricula_id' not in encabezado:
+        raise ValueError("Falta la columna 'matricula_id' en el encabezado.")
+    id_columna = encabezado.index('matricula_id')
+    columnas_notas = [i for i, titulo in enumerate(encabezado) if titulo.lower().startswith('nota')]
+
+    grilla = {}
+    for fila in filas:
+        fila = list(fila)
+        if id_columna >= len(fila) or fila[id_columna] in (None, ''):
+            continue
+        if fila[id_columna] in grilla:
+            raise ValueError(f'La matrícula {fila[id_columna]} aparece más de una vez.')
+        grilla[fila[id_columna]] = [fila[i] if i < len(fila) else None for i in columnas_notas]
+    return grilla
+
+
+def con_calificacion(matriculas):
+    """
+    Anota en cada matrícula del queryset el id (`calificacion_id`) y el
+    promedio (`promedio`) de su calificación, buscada como siempre por curso,
+    estudiante y curso académico, sin consultas adicionales.
+    """
+    calificacion = Calificaciones.objects.filter(
+        course=OuterRef('course'), student=OuterRef('student'), curso_academico=OuterRef('curso_academico'),
+    )
+    return matriculas.annotate(
+        calificacion_id=Subquery(calificacion.values('pk')[:1]),
+        promedio=Subquery(calificacion.values('average')[:1]),
+    )
+
+
+def libro_notas(course, curso_academico):
+    """Matrículas activas del curso en el curso académico, listas para `filas_libro`."""
+    return con_calificacion(
+        Matriculas.objects.filter(course=course, activo=True, curso_academico=curso_academico)
+    ).select_related('student', 'course').order_by('id')
+
+
+def columnas_notas(matriculas):
+    """Cantidad de columnas de notas del libro: la mayor cantidad de notas de una matrícula."""
+    return matriculas.aggregate(maximo=Max('cantidad_notas'))['maximo'] or 0
+
+
+def filas_libro(matriculas, columnas=0):
+    """
+    Filas del libro de notas para una página de matrículas anotadas con
+    `con_calificacion` (y con `student` y `course` cargados).
+
+    Las notas de todas las calificaciones de la página se traen con una sola
+    consulta, ordenadas por fecha. Todas las filas tienen la misma cantidad de
+    notas, al menos `columnas`; las que faltan quedan en None.
+    """
+    matriculas = list(matriculas)
+    calificaciones = [Calificaciones(pk=m.calificacion_id) for m in matriculas if m.calificacion_id]
+    prefetch_related_objects(
+        calificaciones, Prefetch('notas', queryset=NotaIndividual.objects.order_by('fecha_creacion', 'id')),
+    )
+    notas = {calificacion.pk: [nota.valor for nota in calificacion.notas.all()] for calificacion in calificaciones}
+    columnas = max(columnas, *map(len, notas.values()), 0)
+
+    filas = []
+    for matricula in matriculas:
+        valores = notas.get(matricula.calificacion_id, [])
+        filas.append({
+            'calificacion_id': matricula.calificacion_id,
+            'name': matricula.student.get_full_name(),
+            'course_name': matricula.course.name,
+            'notas': valores + [None] * (columnas - len(valores)),
+            'average': matricula.promedio,
+            'matricula_id': matricula.id,
+            'student_id': matricula.student_id,
+        })
+    return filas
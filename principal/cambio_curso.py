@@ -0,0 +1,126 @@
+"""
+Cambio de curso académico.
+
+`cambiar_curso_academico` activa el nuevo curso académico, archiva los
+anteriores y copia al nuevo año los cursos y las matrículas aprobadas del año
+que estaba activo, todo dentro de una transacción. Las copias se hacen con
+`bulk_create` por lotes: los cursos se buscan primero en el año de destino
+(mismo nombre y profesor) y las matrículas usan `ignore_conflicts` sobre la
+restricción única (student, course, curso_academico), de modo que repetir el
+proceso no duplica nada.
+
+Los UPDATE y `bulk_create` no envían señales, así que al final se invalidan a
+mano el caché del curso activo, la portada, los historiales y las exportaciones.
+"""
+from itertools import batched
+
+from django.db import transaction
+
+from .cursos_academicos import curso_activo, invalidar_curso_activo
+from .historial import invalidar_historial
+from .models import Curso, CursoAcademico, Matriculas
+from .portada import invalidar_portada
+from .trabajos import invalidar_exportaciones
+
+TAMANO_LOTE = 2000
+
+# Campos que se copian al crear el curso en el nuevo año; el estado vuelve a
+# inscripción y las fechas y contadores empiezan vacíos
+CAMPOS_CURSO = ('image', 'name', 'description', 'area', 'tipo', 'teacher_id', 'class_quantity')
+
+
+def activar_curso_academico(curso_academico):
+    """Activa el curso académico y archiva los que estaban activos, con dos UPDATE."""
+    with transaction.atomic():
+        # Primero los demás: la restricción única no admite dos activos ni por un momento
+        CursoAcademico.objects.filter(activo=True).exclude(pk=curso_academico.pk).update(activo=False, archivado=True)
+        CursoAcademico.objects.filter(pk=curso_academico.pk).update(activo=True, archivado=False)
+        invalidar_curso_activo()
+        invalidar_exportaciones()
+    curso_academico.activo = True
+    curso_academico.archivado = False
+
+
+def clonar_cursos(cursos, destino):
+    """
+    Garantiza que cada curso del queryset tenga su equivalente en `destino`.
+
+    Devuelve ({id del curso: id del curso en destino}, cantidad de cursos
+    creados). Los cursos que ya son de `destino` se corresponden consigo
+    mismos y los que ya tienen un curso con el mismo nombre y profesor en
+    `destino` se corresponden con ese.
+    """
+    existentes = {
+        (nombre, profesor): pk
+        for pk, nombre, profesor in Curso.objects.filter(curso_academico=destino).values_list('pk', 'name', 'teacher_id')
+    }
+    mapa, por_crear = {}, {}
+    for curso in cursos.only('pk', 'curso_academico_id', *CAMPOS_CURSO):
+        clave = (curso.name, curso.teacher_id)
+        if curso.curso_academico_id == destino.pk:
+            mapa[curso.pk] = curso.pk
+        elif clave in existentes:
+            mapa[curso.pk] = existentes[clave]
+        else:
+            nuevo = por_crear.setdefault(clave, (
+                Curso(curso_academico=destino, **{campo: getattr(curso, campo) for campo in CAMPOS_CURSO}), []
+            ))
+            nuevo[1].append(curso.pk)
+
+    creados = Curso.objects.bulk_create([nuevo for nuevo, _ in por_crear.values()], batch_size=TAMANO_LOTE)
+    if creados:
+        invalidar_portada()
+    for nuevo, (_, originales) in zip(creados, por_crear.values()):
+        for pk in originales:
+            mapa[pk] = nuevo.pk
+    return mapa, len(creados)
+
+
+def promover_matriculas(matriculas, destino, progreso=None):
+    """
+    Copia a `destino` las matrículas aprobadas del queryset como pendientes.
+
+    Los cursos se llevan a `destino` con `clonar_cursos`. `progreso(hechas,
+    total)` se llama después de cada lote. Devuelve (cursos creados,
+    matrículas creadas); las que ya existían en `destino` se ignoran.
+    """
+    with transaction.atomic():
+        aprobadas = list(
+            matriculas.filter(estado='A').exclude(curso_academico=destino).order_by('pk').values_list('student_id', 'course_id')
+        )
+        if not aprobadas:
+            return 0, 0
+        mapa, cursos_creados = clonar_cursos(Curso.objects.filter(pk__in={curso for _, curso in aprobadas}), destino)
+
+        en_destino = Matriculas.objects.filter(curso_academico=destino)
+        antes = en_destino.count()
+        hechas = 0
+        for lote in batched(aprobadas, TAMANO_LOTE):
+            Matriculas.objects.bulk_create(
+                [
+                    Matriculas(student_id=student_id, course_id=mapa[course_id], curso_academico=destino, estado='P')
+                    for student_id, course_id in lote
+                ],
+                ignore_conflicts=True,
+            )
+            hechas += len(lote)
+            if progreso:
+                progreso(hechas, len(aprobadas))
+        creadas = en_destino.count() - antes
+        invalidar_exportaciones()
+        invalidar_historial(*{student_id for student_id, _ in aprobadas})
+    return cursos_creados, creadas
+
+
+def cambiar_curso_academico(destino, origen=None, progreso=None):
+    """
+    Activa `destino` y le copia los cursos y matrículas aprobadas de `origen`
+    (por defecto, el curso académico activo hasta ahora). Devuelve (cursos
+    creados, matrículas creadas).
+    """
+    with transaction.atomic():
+        origen = origen or curso_activo()
+        activar_curso_academico(destino)
+        if origen is None or origen.pk == destino.pk:
+            return 0, 0
+        return promover_matriculas(Matriculas.objects.filter(curso_academico=origen), destino, progreso)
@@ -0,0 +1,41 @@
+from django.db.models import BooleanField, CharField, Count, Exists, OuterRef, Subquery, Value
+from .models import Curso, Matriculas, SolicitudInscripcion
+
+
+def cursos_catalogo(curso_academico, estudiante=None):
+    """
+    Devuelve los cursos de un curso académico listos para el catálogo.
+
+    Cada curso viene anotado con `enrollment_count`, `is_enrolled`,
+    `solicitud_estado`, `tiene_solicitud_pendiente` y `tiene_solicitud_rechazada`,
+    y con `teacher` y `formulario_aplicacion` ya cargados, de modo que el listado
+    completo se resuelve en una sola consulta sin importar cuántos cursos haya.
+    """
+    if curso_academico is None:
+        return Curso.objects.none()
+
+    cursos = Curso.objects.filter(
+        curso_academico=curso_academico
+    ).select_related(
+        'teacher', 'formulario_aplicacion'
+    ).annotate(
+        enrollment_count=Count('matriculas')
+    )
+
+    if estudiante is not None and estudiante.is_authenticated:
+        solicitudes = SolicitudInscripcion.objects.filter(curso=OuterRef('pk'), estudiante=estudiante)
+        cursos = cursos.annotate(
+            is_enrolled=Exists(Matriculas.objects.filter(course=OuterRef('pk'), student=estudiante)),
+            solicitud_estado=Subquery(solicitudes.values('estado')[:1]),
+            tiene_solicitud_pendiente=Exists(solicitudes.filter(estado='pendiente')),
+            tiene_solicitud_rechazada=Exists(solicitudes.filter(estado='rechazada')),
+        )
+    else:
+        cursos = cursos.annotate(
+            is_enrolled=Value(False, output_field=BooleanField()),
+            solicitud_estado=Value(None, output_field=CharField()),
+            tiene_solicitud_pendiente=Value(False, output_field=BooleanField()),
+            tiene_solicitud_rechazada=Value(False, output_field=BooleanField()),
+        )
+
+    return cursos.order_by('id')
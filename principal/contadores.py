@@ -0,0 +1,281 @@
+"""
+Contadores desnormalizados de asistencia y notas en Matriculas, Curso y
+Calificaciones.
+
+Las señales de Asistencia y NotaIndividual (ver signals.py) y
+`registrar_asistencias` llaman a las funciones `ajustar_*`, que suman o restan
+con expresiones F() en un solo UPDATE, sin leer la fila antes. El porcentaje y
+el promedio se recalculan en ese mismo UPDATE a partir de los valores
+anteriores más el incremento (en PostgreSQL el lado derecho del SET siempre ve
+los valores previos de la fila).
+
+`recalcular_contadores` y `verificar_contadores` reconstruyen y comparan los
+contadores a partir de las tablas de origen; se usan desde el comando
+`manage.py contadores`.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Func, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+_estado = threading.local()
+
+
+@contextmanager
+def en_lote():
+    """
+    Desactiva los ajustes que hacen las señales mientras dura el bloque.
+
+    Lo usan las operaciones masivas, que borran o guardan muchas filas y luego
+    aplican el total de los cambios con una sola llamada a `ajustar_*`.
+    """
+    anterior = getattr(_estado, 'en_lote', False)
+    _estado.en_lote = True
+    try:
+        yield
+    finally:
+        _estado.en_lote = anterior
+
+
+def activo():
+    """False dentro de `en_lote()`: las señales no deben tocar los contadores."""
+    return not getattr(_estado, 'en_lote', False)
+
+
+def _porcentaje(presentes, registradas):
+    return Round(Cast(presentes, FloatField()) * 100 / NullIf(registradas, Value(0)), 2)
+
+
+def _promedio(suma, cantidad, decimales=2):
+    return Round(Cast(suma, FloatField()) / NullIf(cantidad, Value(0)), decimales)
+
+
+def _incremento(deltas, campo='student_id'):
+    """
+    Expresión que suma a cada fila el delta que le corresponde.
+
+    `deltas` es {valor de `campo`: entero}; las filas se agrupan por delta para
+    que el CASE tenga una rama por delta distinto y no una por fila.
+    """
+    por_valor = {}
+    for clave, delta in deltas.items():
+        if delta:
+            por_valor.setdefault(delta, []).append(clave)
+    if not por_valor:
+        return Value(0)
+    return Case(
+        *[When(**{f'{campo}__in': claves}, then=Value(delta)) for delta, claves in por_valor.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def ajustar_asistencias(course_id, deltas, sesiones=0):
+    """
+    Aplica cambios de asistencia a las matrículas del curso y al propio curso.
+
+    `deltas` es {student_id: (registradas, presentes)} con los incrementos de
+    cada estudiante; `sesiones` es el cambio en la cantidad de fechas
+    distintas con asistencia en el curso.
+    """
+    from .models import Curso, Matriculas
+
+    registradas = sum(r for r, _ in deltas.values())
+    presentes = sum(p for _, p in deltas.values())
+
+    if registradas or presentes:
+        delta_registradas = _incremento({s: r for s, (r, _) in deltas.items()})
+        delta_presentes = _incremento({s: p for s, (_, p) in deltas.items()})
+        Matriculas.objects.filter(course_id=course_id, student_id__in=deltas).update(
+            asistencias_registradas=F('asistencias_registradas') + delta_registradas,
+            asistencias_presentes=F('asistencias_presentes') + delta_presentes,
+            porcentaje_asistencia=_porcentaje(
+                F('asistencias_presentes') + delta_presentes,
+                F('asistencias_registradas') + delta_registradas,
+            ),
+        )
+
+    if registradas or presentes or sesiones:
+        Curso.objects.filter(pk=course_id).update(
+            sesiones_registradas=F('sesiones_registradas') + sesiones,
+            asistencias_registradas=F('asistencias_registradas') + registradas,
+            asistencias_presentes=F('asistencias_presentes') + presentes,
+            porcentaje_asistencia=_porcentaje(
+                F('asistencias_presentes') + presentes,
+                F('asistencias_registradas') + registradas,
+            ),
+        )
+
+
+def _sumar_notas(queryset, cantidad, suma, decimales=2, promedio='promedio_notas'):
+    queryset.update(**{
+        'cantidad_notas': F('cantidad_notas') + cantidad,
+        'suma_notas': F('suma_notas') + suma,
+        promedio: _promedio(F('suma_notas') + suma, F('cantidad_notas') + cantidad, decimales),
+    })
+
+
+def ajustar_notas(calificacion, cantidad, suma):
+    """Suma `cantidad` notas y `suma` puntos a la calificación, su matrícula y su curso."""
+    from .models import Calificaciones, Curso, Matriculas
+
+    if not (cantidad or suma):
+        return
+    if calificacion.matricula_id:
+        matriculas = Matriculas.objects.filter(pk=calificacion.matricula_id)
+    else:
+        matriculas = Matriculas.objects.filter(
+            course_id=calificacion.course_id,
+            student_id=calificacion.student_id,
+            curso_academico_id=calificacion.curso_academico_id,
+        )
+    _sumar_notas(Calificaciones.objects.filter(pk=calificacion.pk), cantidad, suma, 1, 'average')
+    _sumar_notas(matriculas, cantidad, suma)
+    _sumar_notas(Curso.objects.filter(pk=calificacion.course_id), cantidad, suma)
+
+
+def ajustar_notas_en_bloque(course_id, deltas):
+    """
+    Aplica de una vez cambios de notas de muchas calificaciones de un curso.
+
+    `deltas` es {(calificacion_id, matricula_id): (cantidad, suma)}; se hace un
+    UPDATE por tabla con un CASE por pk en lugar de tres por calificación.
+    """
+    from .models import Calificaciones, Curso, Matriculas
+
+    if not deltas:
+        return
+    por_tabla = (
+        (Calificaciones, 0, 1, 'average'),
+        (Matriculas, 1, 2, 'promedio_notas'),
+    )
+    for modelo, posicion, decimales, promedio in por_tabla:
+        cantidad = _incremento({clave[posicion]: c for clave, (c, _) in deltas.items()}, 'pk')
+        suma = _incremento({clave[posicion]: s for clave, (_, s) in deltas.items()}, 'pk')
+        ids = [clave[posicion] for clave in deltas]
+        _sumar_notas(modelo.objects.filter(pk__in=ids), cantidad, suma, decimales, promedio)
+    _sumar_notas(
+        Curso.objects.filter(pk=course_id),
+        sum(c for c, _ in deltas.values()),
+        sum(s for _, s in deltas.values()),
+    )
+
+
+def recalcular_calificacion(calificacion):
+    """
+    Vuelve a contar las notas de una calificación y aplica la diferencia.
+
+    Se usa después de guardar un formset dentro de `en_lote()`: en lugar de un
+    ajuste por nota, una lectura de la suma guardada, un agregado sobre las
+    notas y un UPDATE por tabla.
+    """
+    from .models import Calificaciones
+
+    with transaction.atomic():
+        cantidad, suma = Calificaciones.objects.select_for_update().values_list(
+            'cantidad_notas', 'suma_notas'
+        ).get(pk=calificacion.pk)
+        totales = calificacion.notas.aggregate(cantidad=Count('id'), suma=Sum('valor'))
+        ajustar_notas(calificacion, totales['cantidad'] - cantidad, (totales['suma'] or 0) - suma)
+
+
+def _agregado(queryset, campo, funcion='COUNT', distinct=False):
+    """Subconsulta escalar con COUNT/SUM de `campo` (0 si no hay filas)."""
+    template = '%(function)s(DISTINCT %(expressions)s)' if distinct else '%(function)s(%(expressions)s)'
+    total = Func(F(campo), function=funcion, template=template, output_field=IntegerField())
+    return Coalesce(Subquery(queryset.order_by().annotate(total=total).values('total')), 0)
+
+
+MODELOS = ('Matriculas', 'Curso', 'Calificaciones')
+
+
+def _esperados(apps, modelo):
+    """Expresiones con el valor correcto de los conteos y sumas de `modelo`."""
+    Asistencia = apps.get_model('principal', 'Asistencia')
+    NotaIndividual = apps.get_model('principal', 'NotaIndividual')
+
+    if modelo == 'Calificaciones':
+        notas = NotaIndividual.objects.filter(calificacion=OuterRef('pk'))
+        return {
+            'cantidad_notas': _agregado(notas, 'id'),
+            'suma_notas': _agregado(notas, 'valor', 'SUM'),
+        }
+
+    if modelo == 'Matriculas':
+        asistencias = Asistencia.objects.filter(course=OuterRef('course'), student=OuterRef('student'))
+        # Una calificación se asocia a la matrícula directamente o por curso, estudiante y curso académico
+        notas = NotaIndividual.objects.filter(
+            Q(calificacion__matricula=OuterRef('pk'))
+            | Q(
+                calificacion__matricula__isnull=True,
+                calificacion__course=OuterRef('course'),
+                calificacion__student=OuterRef('student'),
+                calificacion__curso_academico=OuterRef('curso_academico'),
+            )
+        )
+        esperados = {}
+    else:
+        asistencias = Asistencia.objects.filter(course=OuterRef('pk'))
+        notas = NotaIndividual.objects.filter(calificacion__course=OuterRef('pk'))
+        esperados = {'sesiones_registradas': _agregado(asistencias, 'date', distinct=True)}
+
+    esperados.update({
+        'asistencias_registradas': _agregado(asistencias, 'id'),
+        'asistencias_presentes': _agregado(asistencias.filter(presente=True), 'id'),
+        'cantidad_notas': _agregado(notas, 'id'),
+        'suma_notas': _agregado(notas, 'valor', 'SUM'),
+    })
+    return esperados
+
+
+def _derivados(modelo, valor):
+    """
+    Porcentaje y promedio de `modelo` calculados a partir de `valor(campo)`,
+    que devuelve F(campo) o la expresión esperada del campo.
+    """
+    if modelo == 'Calificaciones':
+        return {'average': _promedio(valor('suma_notas'), valor('cantidad_notas'), 1)}
+    return {
+        'porcentaje_asistencia': _porcentaje(valor('asistencias_presentes'), valor('asistencias_registradas')),
+        'promedio_notas': _promedio(valor('suma_notas'), valor('cantidad_notas')),
+    }
+
+
+def recalcular_contadores(apps=global_apps, modelos=MODELOS):
+    """
+    Reconstruye los contadores con dos UPDATE por tabla: primero los conteos y
+    sumas desde las tablas de origen, luego porcentaje y promedio.
+    """
+    for modelo in modelos:
+        queryset = apps.get_model('principal', modelo).objects
+        queryset.update(**_esperados(apps, modelo))
+        queryset.update(**_derivados(modelo, F))
+
+
+def verificar_contadores(apps=global_apps, modelos=MODELOS):
+    """
+    Compara los contadores guardados con los valores esperados.
+
+    Devuelve una lista de tuplas (modelo, pk, campo, guardado, esperado) con
+    cada diferencia encontrada; una lista vacía significa que todo cuadra.
+    """
+    diferencias = []
+
+    for modelo in modelos:
+        esperados = _esperados(apps, modelo)
+        esperados.update(_derivados(modelo, esperados.__getitem__))
+        anotados = {f'esperado_{campo}': expresion for campo, expresion in esperados.items()}
+        filas = apps.get_model('principal', modelo).objects.annotate(**anotados).values('pk', *esperados, *anotados)
+        for fila in filas.iterator():
+            for campo in esperados:
+                guardado, esperado = fila[campo], fila[f'esperado_{campo}']
+                if esperado is not None and guardado is not None:
+                    iguales = round(float(guardado), 2) == round(float(esperado), 2)
+                else:
+                    iguales = guardado == esperado
+                if not iguales:
+                    diferencias.append((modelo, fila['pk'], campo, guardado, esperado))
+    return diferencias
@@ -0,0 +1,139 @@
+"""
+Bandeja de salida de correos.
+
+`encolar_correos` guarda los correos como CorreoPendiente con un
+`bulk_create`, dentro de la transacción de quien los genera: si la operación
+se revierte, los correos tampoco salen. El worker `manage.py enviar_correos`
+los toma de a lotes con `tomar_lote` y los envía con `enviar_lote` por una
+sola conexión SMTP. Cada correo guarda su estado: los que fallan vuelven a
+intentarse con esperas crecientes y, agotados los intentos, quedan en 'error'.
+
+Los mensajes llevan códigos de verificación y de recuperación de contraseña:
+el cuerpo se borra en cuanto el correo se envía o se da por perdido, así que en
+la tabla solo quedan los pendientes.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CorreoPendiente
+
+logger = logging.getLogger(__name__)
+
+# Tiempo que un lote tomado queda reservado para su worker. Si el worker muere
+# antes de guardar el resultado, otro vuelve a tomar esos correos al vencer.
+RESERVA_LOTE = timedelta(minutes=15)
+
+FIRMA = 'Saludos cordiales,\nCentro Fray Bartolomé de las Casas'
+
+
+def encolar_correos(correos):
+    """Encola una lista de (destinatario, asunto, mensaje); se omiten los que no tienen destinatario."""
+    return CorreoPendiente.objects.bulk_create([
+        CorreoPendiente(destinatario=destinatario, asunto=asunto, mensaje=mensaje)
+        for destinatario, asunto, mensaje in correos
+        if destinatario
+    ])
+
+
+def correo_solicitud_aprobada(nombre_curso):
+    return (
+        f'¡Enhorabuena! Su aplicación al curso {nombre_curso} ha sido aprobada',
+        f'¡Enhorabuena! Su aplicación al curso "{nombre_curso}" ha sido aprobada.\n\n'
+        f'Ya puede acceder al curso y comenzar con las actividades académicas.\n\n{FIRMA}',
+    )
+
+
+def correo_solicitud_rechazada(nombre_curso):
+    return (
+        f'Su aplicación al curso {nombre_curso} ha sido denegada',
+        f'Lo sentimos! Su aplicación al curso "{nombre_curso}" ha sido denegada.\n\n'
+        f'Le recomendamos revisar los requisitos del curso y considerar aplicar en futuras convocatorias.\n\n'
+        f'Si tiene alguna pregunta, no dude en contactarnos.\n\n{FIRMA}',
+    )
+
+
+def tomar_lote():
+    """Reserva hasta CORREOS_LOTE correos listos para enviar y los devuelve, contando el intento."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        listos = CorreoPendiente.objects.filter(estado='pendiente', proximo_intento__lte=ahora).order_by('proximo_intento', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            # Varios workers pueden tomar lotes a la vez sin esperarse
+            listos = listos.select_for_update(skip_locked=True)
+        lote = list(listos[:getattr(settings, 'CORREOS_LOTE', 50)])
+        if lote:
+            CorreoPendiente.objects.filter(pk__in=[correo.pk for correo in lote]).update(
+                intentos=F('intentos') + 1, proximo_intento=ahora + RESERVA_LOTE,
+            )
+    for correo in lote:
+        correo.intentos += 1
+    return lote
+
+
+def _fallo(correo, error):
+    correo.error = str(error)
+    if correo.intentos >= getattr(settings, 'CORREOS_MAX_INTENTOS', 5):
+        correo.estado = 'error'
+        correo.mensaje = ''
+    else:
+        # Espera exponencial: CORREOS_REINTENTO, el doble, el cuádruple...
+        espera = getattr(settings, 'CORREOS_REINTENTO', 60) * 2 ** (correo.intentos - 1)
+        correo.proximo_intento = timezone.now() + timedelta(seconds=espera)
+
+
+def _abrir(conexion):
+    try:
+        conexion.open()
+    except Exception as error:
+        logger.exception('No se pudo abrir la conexión de correo')
+        return error
+    return None
+
+
+def enviar_lote(lote):
+    """
+    Envía un lote tomado con `tomar_lote` por una sola conexión y guarda el
+    estado de cada correo con un `bulk_update`. Devuelve cuántos se enviaron.
+    """
+    enviados = 0
+    conexion = get_connection(backend=getattr(settings, 'CORREOS_BACKEND', None))
+    # Abierta aquí, la conexión se reutiliza en cada send() en lugar de abrirse por mensaje
+    error_conexion = _abrir(conexion)
+    for correo in lote:
+        if error_conexion is not None:
+            _fallo(correo, error_conexion)
+            continue
+        mensaje = EmailMessage(
+            correo.asunto, correo.mensaje, settings.DEFAULT_FROM_EMAIL, [correo.destinatario], connection=conexion,
+        )
+        try:
+            mensaje.send()
+        except Exception as error:
+            logger.warning('Error al enviar el correo %s (intento %s): %s', correo.pk, correo.intentos, error)
+            _fallo(correo, error)
+            # El servidor pudo cerrar la conexión; se abre otra para el resto del lote
+            conexion.close()
+            error_conexion = _abrir(conexion)
+        else:
+            correo.estado = 'enviado'
+            correo.error = ''
+            correo.mensaje = ''
+            correo.fecha_envio = timezone.now()
+            enviados += 1
+    conexion.close()
+    CorreoPendiente.objects.bulk_update(lote, ['estado', 'error', 'mensaje', 'proximo_intento', 'fecha_envio'])
+    return enviados
+
+
+def enviar_pendientes():
+    """Envía por lotes todos los correos listos para enviar; devuelve cuántos se enviaron."""
+    enviados = 0
+    while lote := tomar_lote():
+        enviados += enviar_lote(lote)
+    return enviados
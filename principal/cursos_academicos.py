@@ -0,0 +1,73 @@
+"""
+Curso académico activo resuelto con caché.
+
+Casi todas las vistas necesitan el curso académico activo. `curso_activo()`
+lo busca primero en una copia local del proceso (válida durante
+CURSO_ACTIVO_CACHE_TIMEOUT segundos) y solo si venció consulta la base de
+datos. Las señales de CursoAcademico llaman a `invalidar_curso_activo` en cada
+alta, cambio o baja, lo que vacía la copia del proceso que hizo el cambio; los
+demás procesos ven el cambio cuando vence la suya, por eso dura pocos segundos.
+
+Con un caché de Django compartido por todos los procesos (Redis, Memcached),
+CURSO_ACTIVO_CACHE_COMPARTIDO agrega un segundo nivel entre la copia local y la
+base de datos, que `invalidar_curso_activo` vacía para todos. Con el LocMem por
+defecto ese nivel sería también local a cada proceso y mantendría el año viejo
+en los demás workers, así que viene desactivado.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CLAVE_CACHE = 'cursos_academicos:activo'
+
+# Valor guardado en el caché cuando no hay curso activo (None significa "no está en caché")
+SIN_CURSO_ACTIVO = 'ninguno'
+
+# (curso académico o SIN_CURSO_ACTIVO, momento en que vence) del proceso actual
+_local = None
+
+
+def curso_activo():
+    """Devuelve el CursoAcademico activo o None, normalmente sin consultar la base de datos."""
+    global _local
+
+    timeout = getattr(settings, 'CURSO_ACTIVO_CACHE_TIMEOUT', 0)
+    if not timeout:
+        from .models import CursoAcademico
+        return CursoAcademico.objects.filter(activo=True).first()
+
+    local = _local
+    if local is not None and local[1] > time.monotonic():
+        valor = local[0]
+    else:
+        compartido = getattr(settings, 'CURSO_ACTIVO_CACHE_COMPARTIDO', 0)
+        valor = cache.get(CLAVE_CACHE) if compartido else None
+        if valor is None:
+            from .models import CursoAcademico
+            valor = CursoAcademico.objects.filter(activo=True).first() or SIN_CURSO_ACTIVO
+            if compartido:
+                cache.set(CLAVE_CACHE, valor, compartido)
+        _local = (valor, time.monotonic() + timeout)
+
+    if valor == SIN_CURSO_ACTIVO:
+        return None
+    # Copia para que quien lo modifique no altere la instancia compartida
+    return copy.copy(valor)
+
+
+def _vaciar():
+    global _local
+    _local = None
+    cache.delete(CLAVE_CACHE)
+
+
+def invalidar_curso_activo():
+    """
+    Descarta el curso activo guardado. Se vacía ahora y otra vez al confirmar
+    la transacción, por si otra petición lo volvió a leer antes del commit.
+    """
+    _vaciar()
+    transaction.on_commit(_vaciar)
@@ -0,0 +1,48 @@
+"""
+Esquema compilado de los formularios de aplicación.
+
+Cuando abre la inscripción muchos estudiantes cargan el mismo formulario a la
+vez. `preguntas_formulario` guarda en el caché las preguntas del formulario
+con sus opciones ya cargadas, así que construir los RespuestaEstudianteForm
+no consulta la base de datos. La clave incluye `fecha_modificacion`: las
+señales de PreguntaFormulario y OpcionRespuesta la renuevan con
+`formulario_modificado`, y la próxima lectura arma el esquema otra vez. Las
+versiones viejas vencen solas con FORMULARIOS_CACHE_TIMEOUT.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import FormularioAplicacion, OpcionRespuesta, PreguntaFormulario
+
+
+def clave_esquema(formulario):
+    return f'formularios:esquema:{formulario.pk}:{formulario.fecha_modificacion.timestamp()}'
+
+
+def _cargar_preguntas(formulario):
+    # Sin pasar por formulario.preguntas para no guardar el formulario dentro de cada pregunta
+    return list(
+        PreguntaFormulario.objects.filter(formulario_id=formulario.pk).order_by('orden').prefetch_related(
+            Prefetch('opciones', queryset=OpcionRespuesta.objects.order_by('orden'))
+        )
+    )
+
+
+def preguntas_formulario(formulario):
+    """Preguntas del formulario, ordenadas y con `opciones` precargadas."""
+    timeout = getattr(settings, 'FORMULARIOS_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return _cargar_preguntas(formulario)
+    clave = clave_esquema(formulario)
+    preguntas = cache.get(clave)
+    if preguntas is None:
+        preguntas = _cargar_preguntas(formulario)
+        cache.set(clave, preguntas, timeout)
+    return preguntas
+
+
+def formulario_modificado(**filtros):
+    """Renueva la fecha de modificación de los formularios que cumplen `filtros` con un UPDATE."""
+    FormularioAplicacion.objects.filter(**filtros).update(fecha_modificacion=timezone.now())
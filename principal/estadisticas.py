@@ -0,0 +1,62 @@
+"""
+Estadísticas de las solicitudes de inscripción por estado.
+
+Cada ámbito se resuelve con una sola consulta de agregación condicional
+(`Count(filter=Q(estado=...))`): `estadisticas_solicitudes` sobre un queryset
+de solicitudes y `con_estadisticas` como anotaciones de un queryset de
+cursos. `resumen_curso_academico` guarda en el caché los totales de un curso
+académico; las señales de SolicitudInscripcion lo invalidan con
+`invalidar_resumen` al confirmarse cada alta, cambio de estado o baja. Los
+UPDATE en bloque no envían señales y deben llamarla a mano.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import SolicitudInscripcion
+
+# Nombre de cada total: estado que cuenta (None para todas las solicitudes)
+TOTALES = {
+    'total_solicitudes': None,
+    'solicitudes_pendientes': 'pendiente',
+    'solicitudes_aprobadas': 'aprobada',
+    'solicitudes_rechazadas': 'rechazada',
+}
+
+
+def _conteos(prefijo=''):
+    return {
+        nombre: Count(
+            f'{prefijo}pk',
+            filter=Q(**{f'{prefijo}estado': estado}) if estado else None,
+            distinct=bool(prefijo),
+        )
+        for nombre, estado in TOTALES.items()
+    }
+
+
+def estadisticas_solicitudes(solicitudes):
+    """Totales por estado de un queryset de SolicitudInscripcion, en una consulta."""
+    return solicitudes.order_by().aggregate(**_conteos())
+
+
+def con_estadisticas(cursos):
+    """Anota en cada curso del queryset los totales de sus solicitudes por estado."""
+    return cursos.annotate(**_conteos('solicitudes__'))
+
+
+def clave_resumen(curso_academico_id):
+    return f'estadisticas:solicitudes:{curso_academico_id}'
+
+
+def resumen_curso_academico(curso_academico):
+    """Totales por estado de las solicitudes a cursos del curso académico, desde el caché."""
+    timeout = getattr(settings, 'ESTADISTICAS_CACHE_TIMEOUT', 0)
+    solicitudes = SolicitudInscripcion.objects.filter(curso__curso_academico=curso_academico)
+    if not timeout:
+        return estadisticas_solicitudes(solicitudes)
+    return cache.get_or_set(clave_resumen(curso_academico.pk), lambda: estadisticas_solicitudes(solicitudes), timeout)
+
+
+def invalidar_resumen(*cursos_academicos_ids):
+    cache.delete_many([clave_resumen(pk) for pk in cursos_academicos_ids])
@@ -0,0 +1,259 @@
+"""
+Exportación de reportes a Excel (y CSV) en modo streaming.
+
+Los libros se escriben con openpyxl en modo write-only: cada hoja se vuelca a
+disco fila por fila, así que la memoria no crece con la cantidad de filas. Los
+anchos de columna se fijan de antemano (en write-only no se pueden calcular
+después de escribir) y las filas salen de querysets con `select_related` /
+`prefetch_related` recorridos con `iterator()`. El archivo terminado se envía
+con `FileResponse`, que lo transmite por bloques y lo borra al cerrarse.
+`escribir_csv` vuelca una hoja con columnas a CSV de la misma forma.
+"""
+import csv
+import io
+import tempfile
+from itertools import chain
+
+from django.contrib.auth.models import Group
+from django.db.models import Max, OuterRef, Prefetch, Subquery
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from .models import NotaIndividual
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Filas que se leen de la base de datos en cada bloque del iterador
+TAMANO_BLOQUE = 2000
+
+
+def _estilos():
+    borde = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+    encabezado = NamedStyle(name='encabezado')
+    encabezado.font = Font(name='Arial', bold=True, color='FFFFFF')
+    encabezado.fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
+    encabezado.alignment = Alignment(horizontal='center', vertical='center')
+    encabezado.border = borde
+    celda = NamedStyle(name='celda')
+    celda.border = borde
+    return encabezado, celda
+
+
+class Hoja:
+    """
+    Una hoja del libro: título, columnas como pares (encabezado, ancho) y un
+    iterable de filas. Si `columnas` es None la hoja no lleva encabezado ni
+    bordes. Las hojas con `opcional=True` se omiten cuando no tienen filas.
+    Con `bordes=False` solo el encabezado lleva estilo: en hojas muy anchas
+    el borde de cada celda duplica el tiempo de escritura.
+    """
+    def __init__(self, titulo, columnas, filas, opcional=True, bordes=True):
+        self.titulo = titulo
+        self.columnas = columnas
+        self.filas = filas
+        self.opcional = opcional
+        self.bordes = bordes
+
+
+def escribir_libro(hojas, destino, progreso=None):
+    """
+    Escribe las hojas en `destino` (ruta o archivo) sin cargar el libro en
+    memoria. Si se indica, `progreso(fraccion)` se llama al terminar cada hoja.
+    """
+    libro = Workbook(write_only=True)
+    estilo_encabezado, estilo_celda = _estilos()
+    libro.add_named_style(estilo_encabezado)
+    libro.add_named_style(estilo_celda)
+
+    def celdas(ws, valores, estilo):
+        fila = []
+        for valor in valores:
+            celda = WriteOnlyCell(ws, value=valor)
+            celda.style = estilo
+            fila.append(celda)
+        return fila
+
+    for numero_hoja, hoja in enumerate(hojas, 1):
+        if progreso and numero_hoja > 1:
+            progreso((numero_hoja - 1) / len(hojas))
+        filas = iter(hoja.filas)
+        primera = next(filas, None)
+        if primera is None and hoja.opcional:
+            continue
+        filas = chain([primera], filas) if primera is not None else filas
+
+        ws = libro.create_sheet(title=hoja.titulo)
+        if hoja.columnas is None:
+            for fila in filas:
+                ws.append(fila)
+            continue
+
+        for numero, (_, ancho) in enumerate(hoja.columnas, 1):
+            ws.column_dimensions[get_column_letter(numero)].width = ancho
+        ws.append(celdas(ws, [encabezado for encabezado, _ in hoja.columnas], 'encabezado'))
+        for fila in filas:
+            ws.append(celdas(ws, fila, 'celda') if hoja.bordes else fila)
+
+    if not libro.worksheets:
+        # Un libro sin hojas no se puede guardar
+        libro.create_sheet(title='Hoja1')
+    libro.save(destino)
+
+
+def escribir_csv(hoja, destino):
+    """
+    Escribe el encabezado y las filas de la hoja en `destino` (archivo
+    binario) como CSV en UTF-8 con BOM, para que Excel reconozca los acentos.
+    """
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    escritor = csv.writer(texto)
+    escritor.writerow([encabezado for encabezado, _ in hoja.columnas])
+    escritor.writerows(hoja.filas)
+    texto.flush()
+    # Sin detach, al liberar el wrapper se cerraría también `destino`
+    texto.detach()
+
+
+def respuesta_xlsx(hojas, nombre_archivo):
+    """
+    Genera el libro en un archivo temporal y lo devuelve como descarga.
+
+    FileResponse es un StreamingHttpResponse: envía el archivo por bloques y
+    lo cierra (y el archivo temporal se borra) al terminar la respuesta.
+    """
+    archivo = tempfile.TemporaryFile(suffix='.xlsx')
+    escribir_libro(hojas, archivo)
+    archivo.seek(0)
+    return FileResponse(archivo, as_attachment=True, filename=nombre_archivo, content_type=CONTENT_TYPE_XLSX)
+
+
+# Hojas de los reportes
+
+def _nombre(usuario):
+    return usuario.get_full_name() or usuario.username
+
+
+def hoja_informacion(curso_academico):
+    return Hoja('Información General', None, [
+        [f"Curso Académico: {curso_academico.nombre}"],
+        [f"Activo: {'Sí' if curso_academico.activo else 'No'}"],
+        [f"Archivado: {'Sí' if curso_academico.archivado else 'No'}"],
+        [f"Fecha de Creación: {curso_academico.fecha_creacion}"],
+    ], opcional=False)
+
+
+def hoja_cursos(cursos):
+    filas = (
+        [curso.name, _nombre(curso.teacher), curso.get_status_display()]
+        for curso in cursos.select_related('teacher').iterator(chunk_size=TAMANO_BLOQUE)
+    )
+    return Hoja('Cursos', [('Nombre del Curso', 40), ('Profesor', 30), ('Estado', 32)], filas)
+
+
+def hoja_matriculas(matriculas):
+    filas = (
+        [
+            _nombre(matricula.student),
+            matricula.course.curso_academico.nombre if matricula.course.curso_academico else 'N/A',
+            matricula.course.name,
+            matricula.fecha_matricula.strftime('%d/%m/%Y') if matricula.fecha_matricula else 'N/A',
+            matricula.get_estado_display(),
+        ]
+        for matricula in matriculas.select_related('student', 'course__curso_academico').iterator(chunk_size=TAMANO_BLOQUE)
+    )
+    columnas = [('Estudiante', 30), ('Curso Académico', 18), ('Curso', 40), ('Fecha Matrícula', 16), ('Estado Matrícula', 18)]
+    return Hoja('Matrículas', columnas, filas)
+
+
+def hoja_calificaciones(calificaciones):
+    # El máximo de notas sale del contador de cada calificación, sin contar fila por fila
+    max_notas = calificaciones.aggregate(maximo=Max('cantidad_notas'))['maximo'] or 0
+    notas_ordenadas = Prefetch('notas', queryset=NotaIndividual.objects.order_by('fecha_creacion', 'id'))
+
+    def filas():
+        queryset = calificaciones.select_related('student', 'course').prefetch_related(notas_ordenadas)
+        for calificacion in queryset.iterator(chunk_size=TAMANO_BLOQUE):
+            notas = [nota.valor for nota in calificacion.notas.all()]
+            yield (
+                [_nombre(calificacion.student), calificacion.course.name]
+                + notas + ['N/A'] * (max_notas - len(notas))
+                + [calificacion.average if calificacion.average is not None else 'N/A']
+            )
+
+    columnas = [('Estudiante', 30), ('Curso', 40)]
+    columnas += [(f'Nota {i}', 10) for i in range(1, max_notas + 1)]
+    columnas.append(('Promedio', 10))
+    return Hoja('Calificaciones', columnas, filas())
+
+
+def hoja_usuarios(registros):
+    # Primer grupo de cada usuario (el mismo que devolvía user.groups.first())
+    primer_grupo = Group.objects.filter(user=OuterRef('user')).order_by('pk').values('name')[:1]
+    queryset = registros.select_related('user').annotate(grupo=Subquery(primer_grupo))
+    filas = (
+        [
+            registro.user.first_name,
+            registro.user.last_name,
+            registro.user.email,
+            registro.nacionalidad,
+            registro.carnet,
+            'Sí' if registro.foto_carnet else 'No',
+            registro.sexo,
+            registro.address,
+            registro.location,
+            registro.provincia,
+            registro.movil,
+            registro.get_grado_display(),
+            registro.get_ocupacion_display(),
+            registro.titulo,
+            'Sí' if registro.foto_titulo else 'No',
+            registro.grupo or '',
+            registro.user.date_joined.strftime('%d/%m/%Y'),
+        ]
+        for registro in queryset.iterator(chunk_size=TAMANO_BLOQUE)
+    )
+    columnas = [
+        ('Nombre', 20), ('Apellidos', 25), ('Email', 32), ('Nacionalidad', 15), ('Carnet ID', 14),
+        ('Carnet Disponible', 18), ('Sexo', 6), ('Dirección', 35), ('Municipio', 20), ('Provincia', 20),
+        ('Movil', 15), ('Grado Académico', 17), ('Ocupación', 30), ('Título', 30), ('Título Disponible', 18),
+        ('Grupo', 15), ('Fecha de Registro', 18),
+    ]
+    return Hoja('Usuarios Registrados', columnas, filas)
+
+
+def hoja_asistencias(asistencias):
+    filas = (
+        [
+            _nombre(asistencia.student),
+            asistencia.course.name,
+            asistencia.date.strftime('%d/%m/%Y') if asistencia.date else 'N/A',
+            'Sí' if asistencia.presente else 'No',
+        ]
+        for asistencia in asistencias.select_related('student', 'course').iterator(chunk_size=TAMANO_BLOQUE)
+    )
+    return Hoja('Asistencias', [('Estudiante', 30), ('Curso', 40), ('Fecha', 12), ('Presente', 10)], filas)
+
+
+def hojas_reporte(contexto):
+    """
+    Hojas del reporte a partir del mismo contexto que usan las vistas
+    (`curso_academico`, `cursos`, `matriculas`, `calificaciones`, `registros`
+    y `asistencias`, todos opcionales; los listados deben ser querysets).
+    """
+    hojas = []
+    if contexto.get('curso_academico'):
+        hojas.append(hoja_informacion(contexto['curso_academico']))
+    constructores = [
+        ('cursos', hoja_cursos),
+        ('matriculas', hoja_matriculas),
+        ('calificaciones', hoja_calificaciones),
+        ('registros', hoja_usuarios),
+        ('asistencias', hoja_asistencias),
+    ]
+    for clave, construir in constructores:
+        if contexto.get(clave) is not None:
+            hojas.append(construir(contexto[clave]))
+    return hojas
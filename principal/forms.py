@@ -145,6 +145,7 @@ class CustomUserCreationForm(UserCreationForm):
  #formulario de creacion de cursos 
 
 from .models import CursoAcademico
+from .cursos_academicos import curso_activo
 
 class CourseForm(forms.ModelForm):
     teacher = forms.ModelChoiceField(queryset=User.objects.filter(groups__name = 'Profesores'), label = 'Profesor')
@@ -162,7 +163,7 @@ class CourseForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Obtener el CursoAcademico activo y establecerlo como valor inicial
-        active_academic_course = CursoAcademico.objects.filter(activo=True).first()
+        active_academic_course = curso_activo()
         if active_academic_course:
             self.fields['curso_academico'].initial = active_academic_course
             self.fields['curso_academico'].widget = forms.HiddenInput() # Ocultar el campo si se asigna automáticamente
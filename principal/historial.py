@@ -0,0 +1,114 @@
+"""
+Historial académico de un estudiante en todos los cursos académicos.
+
+`historial_estudiante` arma, con dos consultas, las matrículas del
+estudiante (con curso, profesor, estado y los contadores de notas y
+asistencia que mantiene `principal.contadores`) y todas sus notas, y
+calcula los totales de cada curso académico y del historial completo a
+partir de esos contadores. Con HISTORIAL_CACHE_TIMEOUT el resultado se guarda
+en el caché por estudiante; las señales de NotaIndividual, Calificaciones,
+Asistencia y Matriculas lo invalidan con `invalidar_historial`. Las
+operaciones en bloque (`importar_notas`, `guardar_grilla`,
+`registrar_asistencias`, ...) no envían señales y la llaman a mano.
+
+La invalidación solo llega al caché de quien hizo el cambio, así que el caché
+sirve únicamente con un backend compartido por todos los procesos; el worker de
+exportaciones arma el historial siempre con `construir_historial`.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Matriculas, NotaIndividual
+
+
+def _promedio(suma, cantidad):
+    return round(Decimal(suma) / cantidad, 2) if cantidad else None
+
+
+def _porcentaje(presentes, registradas):
+    return round(Decimal(presentes) * 100 / registradas, 2) if registradas else None
+
+
+def _totales(filas):
+    """Promedio de notas y porcentaje de asistencia ponderados de un grupo de filas."""
+    return {
+        'promedio': _promedio(sum(f['suma_notas'] for f in filas), sum(f['cantidad_notas'] for f in filas)),
+        'porcentaje_asistencia': _porcentaje(
+            sum(f['asistencias_presentes'] for f in filas), sum(f['asistencias_registradas'] for f in filas),
+        ),
+        'aprobados': sum(f['estado'] == 'A' for f in filas),
+        'cantidad_cursos': len(filas),
+    }
+
+
+def construir_historial(student_id):
+    """Historial del estudiante sin pasar por el caché: dos consultas."""
+    matriculas = Matriculas.objects.filter(student_id=student_id).select_related(
+        'course__teacher', 'curso_academico',
+    ).order_by(
+        F('curso_academico__fecha_creacion').asc(nulls_last=True), 'curso_academico__nombre', 'course__name', 'id',
+    )
+    # Una calificación se asocia a la matrícula directamente o por curso y curso académico
+    notas = {}
+    for matricula_id, curso_id, curso_academico_id, valor in NotaIndividual.objects.filter(
+        calificacion__student_id=student_id,
+    ).order_by('fecha_creacion', 'id').values_list(
+        'calificacion__matricula_id', 'calificacion__course_id', 'calificacion__curso_academico_id', 'valor',
+    ):
+        notas.setdefault(matricula_id or (curso_id, curso_academico_id), []).append(valor)
+
+    anios = {}
+    for matricula in matriculas:
+        profesor = matricula.course.teacher
+        fila = {
+            'matricula_id': matricula.pk,
+            'curso_id': matricula.course_id,
+            'curso': matricula.course.name,
+            'profesor': (profesor.get_full_name() or profesor.username) if profesor else '',
+            'estado': matricula.estado,
+            'estado_display': matricula.get_estado_display(),
+            'notas': notas.get(matricula.pk) or notas.get((matricula.course_id, matricula.curso_academico_id), []),
+            'promedio': matricula.promedio_notas,
+            'cantidad_notas': matricula.cantidad_notas,
+            'suma_notas': matricula.suma_notas,
+            'asistencias_registradas': matricula.asistencias_registradas,
+            'asistencias_presentes': matricula.asistencias_presentes,
+            'porcentaje_asistencia': matricula.porcentaje_asistencia,
+        }
+        nombre = matricula.curso_academico.nombre if matricula.curso_academico else 'Sin curso académico'
+        anios.setdefault(nombre, []).append(fila)
+
+    filas = [fila for cursos in anios.values() for fila in cursos]
+    return {
+        'anios': [{'curso_academico': nombre, 'cursos': cursos, **_totales(cursos)} for nombre, cursos in anios.items()],
+        **_totales(filas),
+    }
+
+
+def clave_historial(student_id):
+    return f'historial:{student_id}'
+
+
+def historial_estudiante(student_id):
+    """Historial del estudiante desde el caché (durante HISTORIAL_CACHE_TIMEOUT segundos)."""
+    timeout = getattr(settings, 'HISTORIAL_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return construir_historial(student_id)
+    return cache.get_or_set(clave_historial(student_id), lambda: construir_historial(student_id), timeout)
+
+
+def invalidar_historial(*student_ids):
+    """
+    Borra el historial guardado de los estudiantes. Se borra ahora y otra vez
+    al confirmar la transacción, por si otra petición lo volvió a guardar antes
+    del commit.
+    """
+    if not student_ids:
+        return
+    claves = [clave_historial(pk) for pk in student_ids]
+    cache.delete_many(claves)
+    transaction.on_commit(lambda: cache.delete_many(claves))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from principal.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta un benchmark con datos generados dentro de una transacción que se revierte al terminar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('nombre', choices=sorted(BENCHMARKS), help='Benchmark a ejecutar')
+        parser.add_argument(
+            '-o', '--opcion', action='append', default=[], metavar='CLAVE=VALOR',
+            help='Parámetro entero del benchmark, por ejemplo -o estudiantes=40 -o fechas=20',
+        )
+
+    def handle(self, *args, **options):
+        parametros = {}
+        for opcion in options['opcion']:
+            clave, _, valor = opcion.partition('=')
+            try:
+                parametros[clave] = int(valor)
+            except ValueError:
+                raise CommandError(f'Valor inválido para {clave}: {valor!r}')
+
+        with transaction.atomic():
+            BENCHMARKS[options['nombre']](self.stdout, **parametros)
+            transaction.set_rollback(True)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from principal.contadores import recalcular_contadores, verificar_contadores
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los contadores de asistencia y notas de Matriculas y Curso, o verifica que estén al día'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Solo compara los contadores con los datos y termina con error si hay diferencias',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verificar']:
+            with transaction.atomic():
+                recalcular_contadores()
+            self.stdout.write(self.style.SUCCESS('Contadores recalculados'))
+
+        diferencias = verificar_contadores()
+        for modelo, pk, campo, guardado, esperado in diferencias:
+            self.stdout.write(f'{modelo} {pk}: {campo} = {guardado}, debería ser {esperado}')
+        if diferencias:
+            raise CommandError(f'{len(diferencias)} contadores no coinciden; ejecute el comando sin --verificar')
+        self.stdout.write(self.style.SUCCESS('Todos los contadores coinciden'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from principal.correos import enviar_lote, tomar_lote
+
+
+class Command(BaseCommand):
+    help = 'Worker de la bandeja de salida: envía por lotes los correos de notificaciones, registro, etc.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Envía los correos pendientes y termina en lugar de quedarse esperando',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera entre consultas cuando la bandeja está vacía (por defecto 2)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            lote = tomar_lote()
+            if not lote:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+            enviados = enviar_lote(lote)
+            self.stdout.write(self.style.SUCCESS(f'{enviados} de {len(lote)} correos enviados'))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from principal.trabajos import limpiar_exportaciones, procesar, tomar_siguiente
+
+
+class Command(BaseCommand):
+    help = 'Worker de la cola de exportaciones: genera los PDF y Excel pedidos desde las vistas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help='Procesa los trabajos pendientes y termina en lugar de quedarse esperando',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera entre consultas cuando la cola está vacía (por defecto 2)',
+        )
+        parser.add_argument(
+            '--limpieza', type=float, default=3600.0,
+            help='Segundos mínimos entre dos limpiezas de exportaciones vencidas, hechas con la cola vacía (por defecto 3600)',
+        )
+
+    def limpiar(self):
+        borrados = limpiar_exportaciones()
+        if borrados:
+            self.stdout.write(f'{borrados} exportaciones vencidas eliminadas')
+        return time.monotonic()
+
+    def handle(self, *args, **options):
+        ultima_limpieza = self.limpiar()
+
+        while True:
+            trabajo = tomar_siguiente()
+            if trabajo is None:
+                if options['una_vez']:
+                    break
+                # Un worker que no se reinicia también borra los archivos vencidos
+                if time.monotonic() - ultima_limpieza >= options['limpieza']:
+                    ultima_limpieza = self.limpiar()
+                time.sleep(options['intervalo'])
+                continue
+            procesar(trabajo)
+            if trabajo.estado == 'completado':
+                self.stdout.write(self.style.SUCCESS(f'Exportación {trabajo.pk} ({trabajo.tipo}) completada'))
+            else:
+                self.stdout.write(self.style.ERROR(f'Exportación {trabajo.pk} ({trabajo.tipo}): {trabajo.error}'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from principal.cambio_curso import cambiar_curso_academico
+from principal.models import CursoAcademico
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea (si no existe) y activa un curso académico, archiva los anteriores y copia los cursos '
+        'y las matrículas aprobadas del curso activo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('nombre', help='Nombre del nuevo curso académico, por ejemplo 2025-2026')
+        parser.add_argument(
+            '--desde', metavar='NOMBRE',
+            help='Curso académico de donde se copian cursos y matrículas (por defecto, el activo)',
+        )
+
+    def handle(self, *args, **options):
+        origen = None
+        if options['desde']:
+            try:
+                origen = CursoAcademico.objects.get(nombre=options['desde'])
+            except CursoAcademico.DoesNotExist:
+                raise CommandError(f"No existe el curso académico {options['desde']}")
+
+        destino, creado = CursoAcademico.objects.get_or_create(nombre=options['nombre'])
+        if creado:
+            self.stdout.write(f'Curso académico {destino.nombre} creado')
+
+        def progreso(hechas, total):
+            self.stdout.write(f'Matrículas procesadas: {hechas}/{total}')
+
+        cursos, matriculas = cambiar_curso_academico(destino, origen, progreso)
+        self.stdout.write(self.style.SUCCESS(
+            f'{destino.nombre} activado: {cursos} cursos y {matriculas} matrículas copiados'
+        ))
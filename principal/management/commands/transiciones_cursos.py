@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from principal.transiciones import aplicar_transiciones
+
+
+class Command(BaseCommand):
+    help = 'Aplica los cambios de estado vencidos de los cursos (inscripción terminada, curso iniciado)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=float, default=0,
+            help='Segundos entre ejecuciones; sin este argumento se ejecuta una sola vez (para cron)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for regla, cantidad in aplicar_transiciones().items():
+                if cantidad:
+                    self.stdout.write(self.style.SUCCESS(f'{regla}: {cantidad} cursos'))
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,137 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:40
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Func, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+
+# Copia del cálculo de principal/contadores.py tal como era al crear estos
+# campos: la migración no debe depender de cómo cambie ese módulo después.
+
+def _agregado(queryset, campo, funcion='COUNT', distinct=False):
+    """Subconsulta escalar con COUNT/SUM de `campo` (0 si no hay filas)."""
+    template = '%(function)s(DISTINCT %(expressions)s)' if distinct else '%(function)s(%(expressions)s)'
+    total = Func(F(campo), function=funcion, template=template, output_field=IntegerField())
+    return Coalesce(Subquery(queryset.order_by().annotate(total=total).values('total')), 0)
+
+
+def _derivados():
+    return {
+        'porcentaje_asistencia': Round(
+            Cast(F('asistencias_presentes'), FloatField()) * 100 / NullIf(F('asistencias_registradas'), Value(0)), 2,
+        ),
+        'promedio_notas': Round(Cast(F('suma_notas'), FloatField()) / NullIf(F('cantidad_notas'), Value(0)), 2),
+    }
+
+
+def calcular_contadores(apps, schema_editor):
+    Asistencia = apps.get_model('principal', 'Asistencia')
+    NotaIndividual = apps.get_model('principal', 'NotaIndividual')
+    Curso = apps.get_model('principal', 'Curso')
+    Matriculas = apps.get_model('principal', 'Matriculas')
+
+    asistencias = Asistencia.objects.filter(course=OuterRef('course'), student=OuterRef('student'))
+    # Una calificación se asocia a la matrícula directamente o por curso, estudiante y curso académico
+    notas = NotaIndividual.objects.filter(
+        Q(calificacion__matricula=OuterRef('pk'))
+        | Q(
+            calificacion__matricula__isnull=True,
+            calificacion__course=OuterRef('course'),
+            calificacion__student=OuterRef('student'),
+            calificacion__curso_academico=OuterRef('curso_academico'),
+        )
+    )
+    Matriculas.objects.update(
+        asistencias_registradas=_agregado(asistencias, 'id'),
+        asistencias_presentes=_agregado(asistencias.filter(presente=True), 'id'),
+        cantidad_notas=_agregado(notas, 'id'),
+        suma_notas=_agregado(notas, 'valor', 'SUM'),
+    )
+    Matriculas.objects.update(**_derivados())
+
+    asistencias = Asistencia.objects.filter(course=OuterRef('pk'))
+    notas = NotaIndividual.objects.filter(calificacion__course=OuterRef('pk'))
+    Curso.objects.update(
+        sesiones_registradas=_agregado(asistencias, 'date', distinct=True),
+        asistencias_registradas=_agregado(asistencias, 'id'),
+        asistencias_presentes=_agregado(asistencias.filter(presente=True), 'id'),
+        cantidad_notas=_agregado(notas, 'id'),
+        suma_notas=_agregado(notas, 'valor', 'SUM'),
+    )
+    Curso.objects.update(**_derivados())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0015_alter_preguntaformulario_tipo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='curso',
+            name='asistencias_presentes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Asistencias presentes'),
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='asistencias_registradas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Asistencias registradas'),
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='cantidad_notas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Cantidad de notas'),
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='porcentaje_asistencia',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True, verbose_name='Porcentaje de asistencia'),
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='promedio_notas',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True, verbose_name='Promedio de notas'),
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='sesiones_registradas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Sesiones registradas'),
+        ),
+        migrations.AddField(
+            model_name='curso',
+            name='suma_notas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de notas'),
+        ),
+        migrations.AddField(
+            model_name='matriculas',
+            name='asistencias_presentes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Asistencias presentes'),
+        ),
+        migrations.AddField(
+            model_name='matriculas',
+            name='asistencias_registradas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Asistencias registradas'),
+        ),
+        migrations.AddField(
+            model_name='matriculas',
+            name='cantidad_notas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Cantidad de notas'),
+        ),
+        migrations.AddField(
+            model_name='matriculas',
+            name='porcentaje_asistencia',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True, verbose_name='Porcentaje de asistencia'),
+        ),
+        migrations.AddField(
+            model_name='matriculas',
+            name='promedio_notas',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True, verbose_name='Promedio de notas'),
+        ),
+        migrations.AddField(
+            model_name='matriculas',
+            name='suma_notas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de notas'),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
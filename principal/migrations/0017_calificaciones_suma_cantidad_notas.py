@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:45
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+
+# Copia del cálculo de principal/contadores.py tal como era al crear estos
+# campos: la migración no debe depender de cómo cambie ese módulo después.
+
+def _agregado(queryset, campo, funcion='COUNT'):
+    """Subconsulta escalar con COUNT/SUM de `campo` (0 si no hay filas)."""
+    total = Func(F(campo), function=funcion, output_field=IntegerField())
+    return Coalesce(Subquery(queryset.order_by().annotate(total=total).values('total')), 0)
+
+
+def calcular_sumas(apps, schema_editor):
+    Calificaciones = apps.get_model('principal', 'Calificaciones')
+    NotaIndividual = apps.get_model('principal', 'NotaIndividual')
+
+    notas = NotaIndividual.objects.filter(calificacion=OuterRef('pk'))
+    Calificaciones.objects.update(cantidad_notas=_agregado(notas, 'id'), suma_notas=_agregado(notas, 'valor', 'SUM'))
+    Calificaciones.objects.update(
+        average=Round(Cast(F('suma_notas'), FloatField()) / NullIf(F('cantidad_notas'), Value(0)), 1),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0016_contadores_asistencia_notas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calificaciones',
+            name='cantidad_notas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Cantidad de notas'),
+        ),
+        migrations.AddField(
+            model_name='calificaciones',
+            name='suma_notas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de notas'),
+        ),
+        migrations.AlterField(
+            model_name='calificaciones',
+            name='average',
+            field=models.DecimalField(blank=True, decimal_places=1, editable=False, max_digits=4, null=True, verbose_name='Promedio'),
+        ),
+        migrations.RunPython(calcular_sumas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0017_calificaciones_suma_cantidad_notas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoExportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=30, verbose_name='Tipo de reporte')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parámetros')),
+                ('clave', models.CharField(db_index=True, max_length=64, verbose_name='Clave')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=10, verbose_name='Estado')),
+                ('progreso', models.PositiveSmallIntegerField(default=0, verbose_name='Progreso (%)')),
+                ('archivo', models.FileField(blank=True, upload_to='exportaciones/', verbose_name='Archivo')),
+                ('nombre_archivo', models.CharField(blank=True, max_length=255, verbose_name='Nombre de descarga')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='exportaciones', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de exportación',
+                'verbose_name_plural': 'Trabajos de exportación',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='principal_t_estado_8fe4e4_idx')],
+            },
+        ),
+    ]
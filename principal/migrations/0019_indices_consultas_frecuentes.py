@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def dejar_un_solo_activo(apps, schema_editor):
+    # Antes de la restricción única: si quedó más de un curso académico activo, se conserva el más reciente
+    CursoAcademico = apps.get_model('principal', 'CursoAcademico')
+    activos = CursoAcademico.objects.filter(activo=True).order_by('-fecha_creacion', '-pk')
+    ultimo = activos.first()
+    if ultimo:
+        activos.exclude(pk=ultimo.pk).update(activo=False, archivado=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0018_trabajoexportacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['course', 'date'], name='asistencia_curso_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='curso',
+            index=models.Index(fields=['curso_academico', 'status'], name='curso_academico_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matriculas',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['course', 'curso_academico'], name='matricula_activa_curso_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudinscripcion',
+            index=models.Index(fields=['estudiante', 'estado'], name='solicitud_estudiante_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudinscripcion',
+            index=models.Index(condition=models.Q(('estado', 'pendiente')), fields=['curso', '-fecha_solicitud'], name='solicitud_pendiente_curso_idx'),
+        ),
+        migrations.RunPython(dejar_un_solo_activo, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cursoacademico',
+            constraint=models.UniqueConstraint(condition=models.Q(('activo', True)), fields=('activo',), name='unico_curso_academico_activo'),
+        ),
+    ]
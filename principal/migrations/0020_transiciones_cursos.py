@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0019_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionCurso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('regla', models.CharField(max_length=30, verbose_name='Regla')),
+                ('estado_anterior', models.CharField(choices=[('I', 'En etapa de inscripción'), ('IT', 'Plazo de Inscripción Terminado'), ('P', 'En progreso'), ('F', 'Finalizado')], max_length=15, verbose_name='Estado anterior')),
+                ('estado_nuevo', models.CharField(choices=[('I', 'En etapa de inscripción'), ('IT', 'Plazo de Inscripción Terminado'), ('P', 'En progreso'), ('F', 'Finalizado')], max_length=15, verbose_name='Estado nuevo')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('curso', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transiciones', to='principal.curso', verbose_name='Curso')),
+            ],
+            options={
+                'verbose_name': 'Transición de curso',
+                'verbose_name_plural': 'Transiciones de cursos',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:06
+
+from itertools import batched
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+TAMANO_LOTE = 1000
+
+
+def mover_textos_a_respuestas(apps, schema_editor):
+    # Cada respuesta de escritura libre había creado una OpcionRespuesta con el texto
+    RespuestaEstudiante = apps.get_model('principal', 'RespuestaEstudiante')
+    OpcionRespuesta = apps.get_model('principal', 'OpcionRespuesta')
+    Through = RespuestaEstudiante.opciones_seleccionadas.through
+
+    respuestas = RespuestaEstudiante.objects.filter(pregunta__tipo='escritura_libre').order_by('pk')
+    ultima = 0
+    while lote := list(respuestas.filter(pk__gt=ultima).values_list('pk', flat=True)[:TAMANO_LOTE]):
+        ultima = lote[-1]
+        textos = {}
+        filas = Through.objects.filter(respuestaestudiante_id__in=lote).order_by('pk').values_list(
+            'respuestaestudiante_id', 'opcionrespuesta__texto',
+        )
+        for respuesta_id, texto in filas:
+            textos.setdefault(respuesta_id, []).append(texto)
+        RespuestaEstudiante.objects.bulk_update(
+            [RespuestaEstudiante(pk=pk, texto_respuesta='\n'.join(partes)) for pk, partes in textos.items()],
+            ['texto_respuesta'],
+        )
+
+    # Cada opción creada para un texto quedó en una sola respuesta, de escritura
+    # libre. Las opciones que diseñó la secretaría y se eligieron en otras
+    # respuestas, o en varias (aunque la pregunta cambiara luego de tipo), se
+    # conservan.
+    opciones = Through.objects.values('opcionrespuesta_id').annotate(
+        usos=Count('pk'), libres=Count('pk', filter=Q(respuestaestudiante__pregunta__tipo='escritura_libre')),
+    ).filter(usos=1, libres=1).order_by('opcionrespuesta_id')
+    ultima = 0
+    while lote := [fila['opcionrespuesta_id'] for fila in opciones.filter(opcionrespuesta_id__gt=ultima)[:TAMANO_LOTE]]:
+        ultima = lote[-1]
+        # Al borrar las opciones se borran también sus filas en la tabla intermedia
+        OpcionRespuesta.objects.filter(pk__in=lote).delete()
+
+
+def mover_textos_a_opciones(apps, schema_editor):
+    RespuestaEstudiante = apps.get_model('principal', 'RespuestaEstudiante')
+    OpcionRespuesta = apps.get_model('principal', 'OpcionRespuesta')
+    Through = RespuestaEstudiante.opciones_seleccionadas.through
+
+    respuestas = RespuestaEstudiante.objects.exclude(texto_respuesta='').values_list('pk', 'pregunta_id', 'texto_respuesta')
+    for lote in batched(respuestas.iterator(), TAMANO_LOTE):
+        opciones = OpcionRespuesta.objects.bulk_create([
+            OpcionRespuesta(pregunta_id=pregunta_id, texto=texto[:255], orden=0) for _, pregunta_id, texto in lote
+        ])
+        Through.objects.bulk_create([
+            Through(respuestaestudiante_id=pk, opcionrespuesta_id=opcion.pk)
+            for (pk, _, _), opcion in zip(lote, opciones)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0020_transiciones_cursos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='respuestaestudiante',
+            name='texto_respuesta',
+            field=models.TextField(blank=True, default='', verbose_name='Respuesta escrita'),
+        ),
+        migrations.RunPython(mover_textos_a_respuestas, mover_textos_a_opciones),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0021_respuestas_texto_libre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.EmailField(max_length=254, verbose_name='Destinatario')),
+                ('asunto', models.CharField(max_length=255, verbose_name='Asunto')),
+                ('mensaje', models.TextField(verbose_name='Mensaje')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('error', 'Error')], default='pendiente', max_length=10, verbose_name='Estado')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de envío')),
+            ],
+            options={
+                'verbose_name': 'Correo pendiente',
+                'verbose_name_plural': 'Correos pendientes',
+                'ordering': ['fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='principal_c_estado_c555a6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0022_correos_pendientes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='correopendiente',
+            name='principal_c_estado_c555a6_idx',
+        ),
+        migrations.AddField(
+            model_name='correopendiente',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Intentos'),
+        ),
+        migrations.AddField(
+            model_name='correopendiente',
+            name='proximo_intento',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento'),
+        ),
+        migrations.AddIndex(
+            model_name='correopendiente',
+            index=models.Index(fields=['estado', 'proximo_intento'], name='correo_pendiente_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('principal', '0023_correos_reintentos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDatos',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Nombre')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Versión')),
+            ],
+            options={
+                'verbose_name': 'Versión de datos',
+                'verbose_name_plural': 'Versiones de datos',
+            },
+        ),
+    ]
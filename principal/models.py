@@ -2,10 +2,7 @@ from django.utils import timezone
 from django.db import models
 from django.contrib.auth.models import User
 from accounts.models import Registro
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
 from datetime import date
-from decimal import Decimal
 import json
 
 # Create your models here.
@@ -45,6 +42,14 @@ class Curso(models.Model):
     curso_academico = models.ForeignKey('CursoAcademico', on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Curso Académico')
     enrollment_deadline = models.DateField(verbose_name='Fecha límite de inscripción', null=True, blank=True)
     start_date = models.DateField(verbose_name='Fecha de inicio del curso', null=True, blank=True)
+    # Contadores desnormalizados, mantenidos por principal.contadores
+    sesiones_registradas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Sesiones registradas')
+    asistencias_registradas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Asistencias registradas')
+    asistencias_presentes = models.PositiveIntegerField(default=0, editable=False, verbose_name='Asistencias presentes')
+    porcentaje_asistencia = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Porcentaje de asistencia')
+    cantidad_notas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Cantidad de notas')
+    suma_notas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de notas')
+    promedio_notas = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Promedio de notas')
 
     def __str__(self):
         if self.curso_academico:
@@ -54,6 +59,7 @@ class Curso(models.Model):
     class Meta:
         verbose_name = 'Curso'
         verbose_name_plural = 'Cursos'
+        indexes = [models.Index(fields=['curso_academico', 'status'], name='curso_academico_status_idx')]
 
         
 # Curso y cambio de curso escolar
@@ -77,21 +83,9 @@ class CursoAcademico(models.Model):
         return True
     
     def activar(self):
-        """Activa este curso y desactiva todos los demás"""
-         # Primero, obtener y actualizar todos los cursos activos anteriores
-        cursos_activos = CursoAcademico.objects.filter(activo=True)
-        for curso in cursos_activos:
-            if curso != self:
-                curso.activo = False
-                curso.archivado = True
-                curso.save()
-
-
-
-        # Activar este curso
-        self.activo = True
-        self.archivado = False  # Si estaba archivado, lo desarchivamos
-        self.save()
+        """Activa este curso y archiva los demás activos (ver principal/cambio_curso.py)"""
+        from .cambio_curso import activar_curso_academico
+        activar_curso_academico(self)
         return True
 
 
@@ -120,6 +114,12 @@ class CursoAcademico(models.Model):
             estado = "(Archivado)"
         return f"{self.nombre} {estado}"
 
+    class Meta:
+        constraints = [
+            # Solo puede haber un curso académico activo; el índice también resuelve filter(activo=True)
+            models.UniqueConstraint(fields=['activo'], condition=models.Q(activo=True), name='unico_curso_academico_activo'),
+        ]
+
 # MATRICULAS
 
 class Matriculas(models.Model):
@@ -136,6 +136,13 @@ class Matriculas(models.Model):
     curso_academico = models.ForeignKey(CursoAcademico, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Curso Académico')
     fecha_matricula = models.DateField(auto_now_add=True, verbose_name='Fecha de Matrícula')
     estado = models.CharField(max_length=1, choices=ESTADO_CHOICES, default='P', verbose_name='Estado')
+    # Contadores desnormalizados, mantenidos por principal.contadores
+    asistencias_registradas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Asistencias registradas')
+    asistencias_presentes = models.PositiveIntegerField(default=0, editable=False, verbose_name='Asistencias presentes')
+    porcentaje_asistencia = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Porcentaje de asistencia')
+    cantidad_notas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Cantidad de notas')
+    suma_notas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de notas')
+    promedio_notas = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Promedio de notas')
     
     @property
     def esta_aprobado(self):
@@ -149,6 +156,11 @@ class Matriculas(models.Model):
         verbose_name = 'Matricula'
         verbose_name_plural = 'Matriculas'
         unique_together = [['student', 'course', 'curso_academico']]
+        indexes = [
+            models.Index(
+                fields=['course', 'curso_academico'], condition=models.Q(activo=True), name='matricula_activa_curso_idx',
+            ),
+        ]
 
 
 # ASISTENCIAS    
@@ -166,6 +178,8 @@ class Asistencia(models.Model):
         verbose_name = 'Asistencia'
         verbose_name_plural = 'Asistencias'
         unique_together = ('student', 'date', 'course')
+        # La restricción única empieza por student; las vistas filtran por curso y fecha
+        indexes = [models.Index(fields=['course', 'date'], name='asistencia_curso_fecha_idx')]
 
 
 # CALIFICACIONES
@@ -175,8 +189,14 @@ class Calificaciones(models.Model):
     course = models.ForeignKey(Curso, on_delete=models.CASCADE, verbose_name="Curso")
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'groups__name': 'Estudiantes'}, verbose_name='Estudiante') 
     curso_academico = models.ForeignKey(CursoAcademico, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Curso Académico')
-    # Las notas individuales ahora se manejarán a través del modelo NotaIndividual
-    average = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True, verbose_name='Promedio', editable=False)
+    # Las notas individuales ahora se manejarán a través del modelo NotaIndividual.
+    # La suma y la cantidad se mantienen con F() desde principal.contadores y el
+    # promedio se recalcula en el mismo UPDATE, sin leer las notas.
+    suma_notas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de notas')
+    cantidad_notas = models.PositiveIntegerField(default=0, editable=False, verbose_name='Cantidad de notas')
+    average = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True, verbose_name='Promedio', editable=False)
+
+    CAMPOS_PROMEDIO = ('suma_notas', 'cantidad_notas', 'average')
 
 
     def __str__(self):
@@ -194,20 +214,14 @@ class Calificaciones(models.Model):
 
 
     def save(self, *args, **kwargs):
-        # Save the instance first to ensure it has a primary key
+        # Los campos del promedio solo se escriben con F(); guardar una instancia
+        # cargada antes de agregar notas no debe pisarlos con valores viejos
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.CAMPOS_PROMEDIO
+            ]
         super().save(*args, **kwargs)
-        
-        # Now that the instance has a PK, calculate the average
-        calculated_average = self.calcular_promedio()
-        if calculated_average is not None:
-            new_average = Decimal(str(calculated_average))
-        else:
-            new_average = None
-        
-        # Only update if the average has changed
-        if self.average != new_average:
-            self.average = new_average
-            super().save(update_fields=['average'])
 
     class Meta:
         verbose_name= 'Calificacion'
@@ -228,12 +242,6 @@ class NotaIndividual(models.Model):
         verbose_name_plural = 'Notas Individuales'
         ordering = ['fecha_creacion'] # Opcional: ordenar notas por fecha
 
-@receiver(post_save, sender=NotaIndividual)
-@receiver(post_delete, sender=NotaIndividual)
-def update_calificaciones_average(sender, instance, **kwargs):
-    calificacion = instance.calificacion
-    calificacion.save() # This will trigger the calcular_promedio and update the average
-
 # FORMULARIOS DE APLICACIÓN A CURSOS
 
 class FormularioAplicacion(models.Model):
@@ -326,6 +334,14 @@ class SolicitudInscripcion(models.Model):
         verbose_name_plural = '📝 Solicitudes de Inscripción'
         ordering = ['-fecha_solicitud']
         unique_together = [['estudiante', 'curso']]
+        indexes = [
+            models.Index(fields=['estudiante', 'estado'], name='solicitud_estudiante_idx'),
+            # Bandeja de pendientes del profesor: cursos del profesor, ordenadas por fecha
+            models.Index(
+                fields=['curso', '-fecha_solicitud'], condition=models.Q(estado='pendiente'),
+                name='solicitud_pendiente_curso_idx',
+            ),
+        ]
     
     def aprobar(self, usuario):
         """
@@ -366,11 +382,135 @@ class RespuestaEstudiante(models.Model):
     solicitud = models.ForeignKey(SolicitudInscripcion, on_delete=models.CASCADE, related_name='respuestas', verbose_name='Solicitud')
     pregunta = models.ForeignKey(PreguntaFormulario, on_delete=models.CASCADE, related_name='respuestas', verbose_name='Pregunta')
     opciones_seleccionadas = models.ManyToManyField(OpcionRespuesta, related_name='respuestas', verbose_name='Opciones seleccionadas')
+    # Las preguntas de escritura libre guardan aquí el texto, no como opciones de la pregunta
+    texto_respuesta = models.TextField(blank=True, default='', verbose_name='Respuesta escrita')
     
     def __str__(self):
         return f"Respuesta a {self.pregunta.texto} por {self.solicitud.estudiante.username}"
+
+    def resumen(self):
+        """Texto de la respuesta: lo escrito o las opciones seleccionadas separadas por comas."""
+        if self.texto_respuesta:
+            return self.texto_respuesta
+        return ', '.join(opcion.texto for opcion in self.opciones_seleccionadas.all())
     
     class Meta:
         verbose_name = '💬 Respuesta de Estudiante'
         verbose_name_plural = '💬 Respuestas de Estudiantes'
         unique_together = [['solicitud', 'pregunta']]
+
+
+# EXPORTACIONES EN SEGUNDO PLANO
+
+class TrabajoExportacion(models.Model):
+    """
+    Exportación de un reporte a PDF o Excel procesada por el worker
+    (`manage.py exportaciones`). La `clave` resume el tipo, los filtros y la
+    versión de los datos: dos pedidos iguales sin cambios de por medio
+    comparten el mismo archivo.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=30, verbose_name='Tipo de reporte')
+    parametros = models.JSONField(default=dict, blank=True, verbose_name='Parámetros')
+    clave = models.CharField(max_length=64, db_index=True, verbose_name='Clave')
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='pendiente', verbose_name='Estado')
+    progreso = models.PositiveSmallIntegerField(default=0, verbose_name='Progreso (%)')
+    archivo = models.FileField(upload_to='exportaciones/', blank=True, verbose_name='Archivo')
+    nombre_archivo = models.CharField(max_length=255, blank=True, verbose_name='Nombre de descarga')
+    error = models.TextField(blank=True, verbose_name='Error')
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='exportaciones', verbose_name='Solicitado por')
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name='Inicio')
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name='Fin')
+
+    def __str__(self):
+        return f"{self.tipo} ({self.get_estado_display()})"
+
+    class Meta:
+        verbose_name = 'Trabajo de exportación'
+        verbose_name_plural = 'Trabajos de exportación'
+        ordering = ['-fecha_creacion']
+        indexes = [models.Index(fields=['estado', 'fecha_creacion'])]
+
+
+class VersionDatos(models.Model):
+    """
+    Contador que se incrementa cada vez que cambian los datos de un grupo de
+    cachés (por ejemplo, las exportaciones). Vive en la base de datos para que
+    todos los procesos vean el mismo valor aunque el caché de Django sea local
+    a cada uno.
+    """
+    nombre = models.CharField(max_length=50, primary_key=True, verbose_name='Nombre')
+    version = models.PositiveBigIntegerField(default=0, verbose_name='Versión')
+
+    def __str__(self):
+        return f"{self.nombre} (v{self.version})"
+
+    class Meta:
+        verbose_name = 'Versión de datos'
+        verbose_name_plural = 'Versiones de datos'
+
+
+# TRANSICIONES DE ESTADO DE LOS CURSOS
+
+class TransicionCurso(models.Model):
+    """
+    Registro de cada cambio de estado aplicado por `principal.transiciones`
+    (comando `manage.py transiciones_cursos`).
+    """
+    curso = models.ForeignKey(Curso, on_delete=models.CASCADE, related_name='transiciones', verbose_name='Curso')
+    regla = models.CharField(max_length=30, verbose_name='Regla')
+    estado_anterior = models.CharField(max_length=15, choices=Curso.STATUS_CHOICES, verbose_name='Estado anterior')
+    estado_nuevo = models.CharField(max_length=15, choices=Curso.STATUS_CHOICES, verbose_name='Estado nuevo')
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name='Fecha')
+
+    def __str__(self):
+        return f"{self.curso_id}: {self.estado_anterior} → {self.estado_nuevo}"
+
+    class Meta:
+        verbose_name = 'Transición de curso'
+        verbose_name_plural = 'Transiciones de cursos'
+        ordering = ['-fecha']
+
+
+# CORREOS PENDIENTES DE ENVÍO
+
+class CorreoPendiente(models.Model):
+    """
+    Correo en la bandeja de salida. Las vistas lo encolan con
+    `principal.correos.encolar_correos` y el comando `manage.py enviar_correos`
+    lo envía por lotes, de modo que ninguna petición espera al servidor SMTP.
+    Si el envío falla se reintenta en `proximo_intento`, con esperas cada vez
+    más largas, hasta CORREOS_MAX_INTENTOS intentos. El `mensaje` se vacía al
+    enviarse o al agotar los intentos.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviado', 'Enviado'),
+        ('error', 'Error'),
+    ]
+
+    destinatario = models.EmailField(verbose_name='Destinatario')
+    asunto = models.CharField(max_length=255, verbose_name='Asunto')
+    mensaje = models.TextField(verbose_name='Mensaje')
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='pendiente', verbose_name='Estado')
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    proximo_intento = models.DateTimeField(default=timezone.now, verbose_name='Próximo intento')
+    error = models.TextField(blank=True, verbose_name='Error')
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')
+    fecha_envio = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de envío')
+
+    def __str__(self):
+        return f"{self.asunto} → {self.destinatario} ({self.get_estado_display()})"
+
+    class Meta:
+        verbose_name = 'Correo pendiente'
+        verbose_name_plural = 'Correos pendientes'
+        ordering = ['fecha_creacion']
+        indexes = [models.Index(fields=['estado', 'proximo_intento'], name='correo_pendiente_idx')]
@@ -0,0 +1,81 @@
+"""
+Datos del panel de cada rol en la página de perfil.
+
+`datos_perfil(user, grupo)` llama al cargador del grupo principal del usuario
+y devuelve el contexto que usan las plantillas de `templates/profile/`. Cada
+cargador resuelve todo lo que su plantilla muestra (conteos, solicitudes,
+estudiantes, revisores) con un número fijo de consultas, sin importar cuántos
+cursos o solicitudes haya.
+"""
+from django.db.models import Count
+
+from .cursos_academicos import curso_activo
+from .models import Curso, SolicitudInscripcion
+
+
+def datos_profesor(user):
+    """Cursos del año activo con su cantidad de matrículas y solicitudes pendientes: 2 consultas."""
+    curso_academico = curso_activo()
+    if curso_academico:
+        cursos = Curso.objects.filter(teacher=user, curso_academico=curso_academico).annotate(
+            enrollment_count=Count('matriculas'),
+        ).order_by('id')
+    else:
+        cursos = Curso.objects.none()
+    pendientes = SolicitudInscripcion.objects.filter(
+        curso__teacher=user, estado='pendiente',
+    ).select_related('curso', 'estudiante').order_by('-fecha_solicitud')
+    return {'assigned_courses': list(cursos), 'pending_solicitudes': list(pendientes)}
+
+
+def datos_estudiante(user):
+    """
+    Cursos del año activo en los que está matriculado, separados en
+    inscritos y pendientes de aprobación según su solicitud: 2 consultas.
+    """
+    curso_academico = curso_activo()
+    if not curso_academico:
+        return {'enrolled_courses': [], 'pending_courses': []}
+
+    cursos = list(Curso.objects.filter(matriculas__student=user, curso_academico=curso_academico).order_by('id'))
+    solicitudes = {
+        solicitud.curso_id: solicitud
+        for solicitud in SolicitudInscripcion.objects.filter(
+            estudiante=user, curso__in=[curso.pk for curso in cursos],
+        ).select_related('revisado_por')
+    } if cursos else {}
+
+    inscritos, pendientes = [], []
+    for curso in cursos:
+        solicitud = solicitudes.get(curso.pk)
+        curso.solicitud_estado = solicitud.estado if solicitud else None
+        curso.fecha_revision = solicitud.fecha_revision if solicitud else None
+        curso.revisado_por = solicitud.revisado_por if solicitud else None
+        # Solo los cursos en inscripción con la solicitud sin revisar quedan como pendientes
+        if solicitud and curso.status in ('I', 'IT') and solicitud.estado == 'pendiente':
+            pendientes.append(curso)
+        else:
+            inscritos.append(curso)
+    return {'enrolled_courses': inscritos, 'pending_courses': pendientes}
+
+
+def datos_gestion(user):
+    """Cursos del año activo con su profesor; la consulta solo se hace si la plantilla los usa."""
+    curso_academico = curso_activo()
+    if not curso_academico:
+        return {'all_courses': Curso.objects.none()}
+    return {'all_courses': Curso.objects.filter(curso_academico=curso_academico).select_related('teacher')}
+
+
+CARGADORES = {
+    'Profesores': datos_profesor,
+    'Estudiantes': datos_estudiante,
+    'Administracion': datos_gestion,
+    'Secretaria': datos_gestion,
+}
+
+
+def datos_perfil(user, grupo):
+    """Contexto del panel del grupo `grupo` para `user` (vacío si el grupo no tiene panel)."""
+    cargador = CARGADORES.get(grupo)
+    return cargador(user) if cargador else {}
@@ -0,0 +1,82 @@
+"""
+Planes de ejecución de las consultas frecuentes.
+
+`CONSULTAS_FRECUENTES` reúne las consultas de las vistas que dependen de un
+índice (ver los `Meta.indexes` de los modelos) junto con las tablas que no
+deben recorrerse completas. `recorridos_secuenciales` ejecuta EXPLAIN y
+devuelve cuáles de esas tablas aparecen recorridas sin índice; la prueba
+`IndicesConsultasFrecuentesTest` lo comprueba sobre datos de ejemplo.
+
+En PostgreSQL se apaga `enable_seqscan` durante el EXPLAIN: con pocas filas el
+planificador elige un Seq Scan aunque haya índice, pero con la opción apagada
+solo lo usa cuando no tiene otro camino. En SQLite un recorrido completo
+aparece como `SCAN <tabla>` sin `USING INDEX`.
+"""
+import re
+
+from django.db import connections, transaction
+
+from blog.models import Noticia
+from .models import Asistencia, Curso, CursoAcademico, Matriculas, SolicitudInscripcion
+
+
+def _tablas_recorridas(vendor, plan):
+    if vendor == 'postgresql':
+        return set(re.findall(r'Seq Scan on (\w+)', plan))
+    if vendor == 'sqlite':
+        return set(re.findall(r'\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)\b', plan))
+    raise NotImplementedError(f'No se sabe leer el plan de {vendor}')
+
+
+def recorridos_secuenciales(queryset, modelos):
+    """Tablas de `modelos` que el plan de `queryset` recorre completas."""
+    connection = connections[queryset.db]
+    with transaction.atomic(using=queryset.db):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+    tablas = {modelo._meta.db_table for modelo in modelos}
+    return sorted(tablas & _tablas_recorridas(connection.vendor, plan))
+
+
+# Consulta: (función que arma el queryset a partir de los datos de ejemplo, modelos que deben usar índice).
+# Los datos son un diccionario con 'curso_academico', 'curso', 'profesor', 'estudiante' y 'fecha'.
+CONSULTAS_FRECUENTES = {
+    'curso_academico_activo': (
+        lambda datos: CursoAcademico.objects.filter(activo=True),
+        [CursoAcademico],
+    ),
+    'cursos_por_estado': (
+        lambda datos: Curso.objects.filter(curso_academico=datos['curso_academico'], status='I'),
+        [Curso],
+    ),
+    'matriculas_activas_del_curso': (
+        lambda datos: Matriculas.objects.filter(
+            course=datos['curso'], activo=True, curso_academico=datos['curso_academico'],
+        ),
+        [Matriculas],
+    ),
+    'solicitudes_del_estudiante': (
+        lambda datos: SolicitudInscripcion.objects.filter(estudiante=datos['estudiante'], estado='pendiente'),
+        [SolicitudInscripcion],
+    ),
+    'solicitudes_pendientes_del_profesor': (
+        lambda datos: SolicitudInscripcion.objects.filter(
+            curso__teacher=datos['profesor'], estado='pendiente',
+        ).order_by('-fecha_solicitud'),
+        [SolicitudInscripcion, Curso],
+    ),
+    'asistencias_del_dia': (
+        lambda datos: Asistencia.objects.filter(course=datos['curso'], date=datos['fecha']),
+        [Asistencia],
+    ),
+    'noticias_publicadas': (
+        lambda datos: Noticia.objects.filter(estado='publicado')[:6],
+        [Noticia],
+    ),
+    'noticias_destacadas': (
+        lambda datos: Noticia.objects.filter(estado='publicado', destacada=True)[:5],
+        [Noticia],
+    ),
+}
@@ -0,0 +1,83 @@
+"""
+Caché de la página de inicio.
+
+Los carruseles de cursos y noticias son iguales para todos los visitantes:
+`carruseles()` los renderiza una vez y guarda el HTML en el caché. A los
+visitantes anónimos se les sirve además la página completa desde el caché con
+`pagina_anonima`; los usuarios autenticados reciben los carruseles guardados y
+la vista solo calcula su estado en cada curso.
+
+Las claves llevan el curso académico activo y la versión de la portada, un
+contador en la base de datos (ver versiones.py) que las señales de Curso,
+Noticia y FormularioAplicacion renuevan con `invalidar_portada` en cada alta,
+cambio o baja. Al estar en la base de datos todos los procesos ven la versión
+nueva, aunque cada uno guarde las páginas en su propio caché. Los
+`bulk_create` y UPDATE no envían señales y deben llamarla a mano.
+"""
+from itertools import batched
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from blog.models import Noticia
+from .cursos_academicos import curso_activo
+from .models import Curso
+from .versiones import renovar_version, version
+
+VERSION = 'portada'
+
+
+def _timeout():
+    return getattr(settings, 'PORTADA_CACHE_TIMEOUT', 0)
+
+
+def _sufijo():
+    """Curso académico activo y versión de la portada, para armar las claves."""
+    curso_academico = curso_activo()
+    return f'{curso_academico.pk if curso_academico else 0}:{version(VERSION)}'
+
+
+def _renderizar_carruseles():
+    curso_academico = curso_activo()
+    cursos = Curso.objects.filter(curso_academico=curso_academico).only(
+        'image', 'name', 'description',
+    ).order_by('id') if curso_academico else []
+    noticias = Noticia.objects.filter(estado='publicado').only(
+        'titulo', 'slug', 'resumen', 'imagen_principal', 'fecha_publicacion',
+    ).order_by('-fecha_publicacion')[:8]
+    return {
+        'carrusel_cursos': render_to_string('portada/carrusel_cursos.html', {'grouped_courses': list(batched(cursos, 4))}),
+        'carrusel_noticias': render_to_string('portada/carrusel_noticias.html', {'grouped_noticias': list(batched(noticias, 4))}),
+    }
+
+
+def carruseles():
+    """HTML de los carruseles de cursos y noticias de la portada, desde el caché."""
+    timeout = _timeout()
+    if not timeout:
+        return _renderizar_carruseles()
+    return cache.get_or_set(f'portada:carruseles:{_sufijo()}', _renderizar_carruseles, timeout)
+
+
+def pagina_anonima(generar):
+    """
+    Devuelve la portada de los visitantes anónimos desde el caché. `generar()`
+    devuelve la respuesta de la vista cuando no está guardada.
+    """
+    timeout = _timeout()
+    if not timeout:
+        return generar()
+    clave = f'portada:anonima:{_sufijo()}'
+    contenido = cache.get(clave)
+    if contenido is not None:
+        return HttpResponse(contenido)
+    response = generar().render()
+    cache.set(clave, response.content, timeout)
+    return response
+
+
+def invalidar_portada():
+    """Renueva la versión de la portada; las claves viejas vencen solas."""
+    renovar_version(VERSION)
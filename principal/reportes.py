@@ -0,0 +1,287 @@
+"""
+Reportes exportables a PDF y Excel.
+
+Cada reporte se identifica por un tipo y se genera a partir de un diccionario
+de parámetros (los mismos filtros GET de las vistas), de modo que se puede
+producir tanto desde una petición como desde el worker de exportaciones.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Max, Prefetch, Q
+from django.shortcuts import get_object_or_404
+from django.template.loader import get_template
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from accounts.models import Registro
+from .cursos_academicos import curso_activo
+from .estadisticas import con_estadisticas
+from .exportacion import TAMANO_BLOQUE, Hoja, escribir_csv, escribir_libro, hojas_reporte
+from .historial import construir_historial
+from .models import (
+    Asistencia, Calificaciones, Curso, CursoAcademico, Matriculas, NotaIndividual, PreguntaFormulario,
+    RespuestaEstudiante, SolicitudInscripcion,
+)
+
+
+class ErrorReporte(Exception):
+    """El reporte no se pudo generar (por ejemplo, xhtml2pdf devolvió errores)."""
+
+
+# Filtros compartidos por las vistas y los reportes
+
+def matriculas_filtradas(parametros):
+    matriculas = Matriculas.objects.all()
+    if parametros.get('curso_academico'):
+        matriculas = matriculas.filter(course__curso_academico__id=parametros['curso_academico'])
+    if parametros.get('curso'):
+        matriculas = matriculas.filter(course__id=parametros['curso'])
+    if parametros.get('student'):
+        matriculas = matriculas.filter(student__id=parametros['student'])
+    return matriculas
+
+
+def registros_filtrados(parametros):
+    registros = Registro.objects.filter(user__groups__name='Estudiantes')
+    search_query = parametros.get('search', '')
+    if search_query:
+        registros = registros.filter(
+            Q(user__first_name__icontains=search_query) |
+            Q(user__last_name__icontains=search_query) |
+            Q(user__email__icontains=search_query) |
+            Q(carnet__icontains=search_query)
+        ).distinct()
+    return registros
+
+
+def contexto_curso_academico(curso_academico, parametros):
+    """Cursos, matrículas, calificaciones y asistencias del curso académico con los filtros aplicados."""
+    curso_id = parametros.get('curso')
+    estudiante_id = parametros.get('estudiante')
+
+    # Cursos con matrículas en el curso académico, como subconsulta IN en lugar de JOIN + DISTINCT
+    cursos_del_curso_academico = Matriculas.objects.filter(curso_academico=curso_academico).values('course_id')
+
+    cursos = Curso.objects.filter(pk__in=cursos_del_curso_academico)
+    if curso_id:
+        cursos = cursos.filter(id=curso_id)
+
+    matriculas = Matriculas.objects.filter(curso_academico=curso_academico)
+    if curso_id:
+        matriculas = matriculas.filter(course_id=curso_id)
+    if estudiante_id:
+        matriculas = matriculas.filter(student_id=estudiante_id)
+
+    calificaciones = Calificaciones.objects.filter(curso_academico=curso_academico)
+    if curso_id:
+        calificaciones = calificaciones.filter(course_id=curso_id)
+    if estudiante_id:
+        calificaciones = calificaciones.filter(student_id=estudiante_id)
+
+    asistencias = Asistencia.objects.filter(course_id__in=cursos_del_curso_academico)
+    if curso_id:
+        asistencias = asistencias.filter(course_id=curso_id)
+    if estudiante_id:
+        asistencias = asistencias.filter(student_id=estudiante_id)
+
+    return {
+        'curso_academico': curso_academico,
+        'cursos': cursos,
+        'matriculas': matriculas,
+        'calificaciones': calificaciones,
+        'asistencias': asistencias,
+    }
+
+
+# Generadores
+
+def escribir_pdf(template_src, contexto, destino, progreso=None):
+    html = get_template(template_src).render(contexto)
+    if progreso:
+        # Las consultas y la plantilla ya están; falta la conversión a PDF
+        progreso(0.5)
+    resultado = pisa.CreatePDF(html, dest=destino, encoding='UTF-8')
+    if resultado.err:
+        raise ErrorReporte(f'No se pudo generar el PDF a partir de {template_src}')
+
+
+def _curso_academico(parametros):
+    return get_object_or_404(CursoAcademico, pk=parametros['pk'])
+
+
+def _matriculas_pdf(parametros, destino, progreso):
+    curso_academico_id = parametros.get('curso_academico')
+    escribir_pdf('matriculas_pdf.html', {
+        'matriculas': matriculas_filtradas(parametros).select_related('student', 'course'),
+        'curso_academico': CursoAcademico.objects.get(id=curso_academico_id) if curso_academico_id else None,
+    }, destino, progreso)
+
+
+def _matriculas_excel(parametros, destino, progreso):
+    curso_academico_id = parametros.get('curso_academico')
+    escribir_libro(hojas_reporte({
+        'matriculas': matriculas_filtradas(parametros),
+        'curso_academico': CursoAcademico.objects.get(id=curso_academico_id) if curso_academico_id else None,
+    }), destino, progreso)
+
+
+def _usuarios_excel(parametros, destino, progreso):
+    escribir_libro(hojas_reporte({'registros': registros_filtrados(parametros)}), destino, progreso)
+
+
+def _curso_academico_pdf(parametros, destino, progreso):
+    contexto = contexto_curso_academico(_curso_academico(parametros), parametros)
+    contexto['cursos'] = contexto['cursos'].select_related('teacher')
+    contexto['matriculas'] = contexto['matriculas'].select_related('student', 'course')
+    contexto['calificaciones'] = contexto['calificaciones'].select_related('student', 'course').prefetch_related(
+        Prefetch('notas', queryset=NotaIndividual.objects.order_by('fecha_creacion', 'id'))
+    )
+    contexto['asistencias'] = contexto['asistencias'].select_related('student', 'course')
+    contexto['max_notas'] = contexto['calificaciones'].aggregate(maximo=Max('cantidad_notas'))['maximo'] or 0
+    contexto['now'] = timezone.now()
+    escribir_pdf('curso_academico_pdf.html', contexto, destino, progreso)
+
+
+def _curso_academico_excel(parametros, destino, progreso):
+    escribir_libro(hojas_reporte(contexto_curso_academico(_curso_academico(parametros), parametros)), destino, progreso)
+
+
+def _historial_pdf(parametros, destino, progreso):
+    escribir_pdf('historial_pdf.html', {
+        'estudiante': get_object_or_404(User, pk=parametros['estudiante']),
+        # Sin el caché: el del worker no lo invalidan las señales de los procesos web
+        'historial': construir_historial(parametros['estudiante']),
+        'now': timezone.now(),
+    }, destino, progreso)
+
+
+def _respuestas_excel(parametros, destino, progreso):
+    if parametros.get('curso_id'):
+        curso = get_object_or_404(Curso, id=parametros['curso_id'])
+        hojas = [hoja_respuestas_curso(curso)]
+    else:
+        hojas = [hoja_resumen_respuestas(curso_activo())]
+    escribir_libro(hojas, destino, progreso)
+
+
+def _respuestas_csv(parametros, destino, progreso):
+    escribir_csv(hoja_respuestas_curso(get_object_or_404(Curso, id=parametros['curso_id'])), destino)
+
+
+def matriz_respuestas(curso):
+    """
+    Columnas y filas de la matriz de respuestas del curso: una fila por
+    solicitud y una columna por pregunta del formulario.
+
+    Las respuestas se leen como tuplas (solicitud, pregunta, texto escrito,
+    opción seleccionada) con un solo `values_list`, ordenadas igual que las
+    solicitudes; las filas se arman en una pasada recorriendo ambos
+    iteradores a la par, sin instanciar modelos ni guardar el curso entero en
+    memoria.
+    """
+    preguntas = list(
+        PreguntaFormulario.objects.filter(formulario__curso=curso).order_by('orden', 'pk').values_list('pk', 'texto')
+    )
+    estados = dict(SolicitudInscripcion.ESTADO_CHOICES)
+    orden = ('estudiante__first_name', 'estudiante__last_name', 'pk')
+    solicitudes = SolicitudInscripcion.objects.filter(curso=curso).order_by(*orden).values_list(
+        'pk', 'estudiante__first_name', 'estudiante__last_name', 'estudiante__username', 'estudiante__email',
+        'estado', 'fecha_solicitud',
+    )
+    respuestas = RespuestaEstudiante.objects.filter(solicitud__curso=curso).order_by(
+        *(f'solicitud__{campo}' for campo in orden), 'pregunta_id',
+        'opciones_seleccionadas__orden', 'opciones_seleccionadas__pk',
+    ).values_list('solicitud_id', 'pregunta_id', 'texto_respuesta', 'opciones_seleccionadas__texto')
+
+    def filas():
+        tuplas = respuestas.iterator(chunk_size=TAMANO_BLOQUE)
+        actual = next(tuplas, None)
+        for pk, nombre, apellidos, usuario, email, estado, fecha in solicitudes.iterator(chunk_size=TAMANO_BLOQUE):
+            valores = {}
+            while actual is not None and actual[0] == pk:
+                _, pregunta_id, texto, opcion = actual
+                if opcion is None:
+                    valores[pregunta_id] = texto
+                elif pregunta_id in valores:
+                    valores[pregunta_id] = f'{valores[pregunta_id]}, {opcion}'
+                else:
+                    valores[pregunta_id] = opcion
+                actual = next(tuplas, None)
+            yield [
+                f'{nombre} {apellidos}'.strip() or usuario, email, estados.get(estado, estado),
+                fecha.strftime('%d/%m/%Y %H:%M'),
+            ] + [valores.get(pregunta_id) or 'Sin respuesta' for pregunta_id, _ in preguntas]
+
+    columnas = [('Estudiante', 30), ('Email', 30), ('Estado', 12), ('Fecha Solicitud', 17)]
+    columnas += [(texto, min(len(texto) + 2, 50)) for _, texto in preguntas]
+    return columnas, filas()
+
+
+def hoja_respuestas_curso(curso):
+    """Hoja con la matriz de respuestas del curso (ver `matriz_respuestas`)."""
+    columnas, filas = matriz_respuestas(curso)
+    # Excel no admite títulos de hoja de más de 31 caracteres
+    return Hoja(f'Respuestas {curso.name}'[:31], columnas, filas, opcional=False, bordes=False)
+
+
+def hoja_resumen_respuestas(curso_academico):
+    """Totales de solicitudes por estado de cada curso con formulario del curso académico."""
+    cursos = con_estadisticas(Curso.objects.filter(
+        formulario_aplicacion__isnull=False,
+        curso_academico=curso_academico,
+    ).select_related('teacher')).filter(total_solicitudes__gt=0)
+    filas = (
+        [
+            curso.name, curso.teacher.get_full_name() or curso.teacher.username,
+            curso.total_solicitudes, curso.solicitudes_pendientes,
+            curso.solicitudes_aprobadas, curso.solicitudes_rechazadas,
+        ]
+        for curso in cursos
+    )
+    columnas = [
+        ('Curso', 40), ('Profesor', 30), ('Total Solicitudes', 18),
+        ('Pendientes', 12), ('Aprobadas', 12), ('Rechazadas', 12),
+    ]
+    return Hoja('Resumen General', columnas, filas, opcional=False)
+
+
+class Reporte:
+    """
+    Tipo de reporte exportable: extensión del archivo, función que arma el
+    nombre de descarga a partir de los parámetros y función
+    `generar(parametros, destino, progreso)` que escribe el archivo.
+    """
+    def __init__(self, extension, nombre_archivo, generar):
+        self.extension = extension
+        self.nombre_archivo = nombre_archivo
+        self.generar = generar
+
+
+def _nombre_curso_academico(prefijo, extension):
+    def nombre(parametros):
+        return f'{prefijo}_{_curso_academico(parametros).nombre}.{extension}'
+    return nombre
+
+
+def _nombre_historial(parametros):
+    return f"historial_{get_object_or_404(User, pk=parametros['estudiante']).username}.pdf"
+
+
+def _nombre_respuestas(extension):
+    def nombre(parametros):
+        if parametros.get('curso_id'):
+            curso = get_object_or_404(Curso, id=parametros['curso_id'])
+            return f"respuestas_{curso.name.replace(' ', '_')}.{extension}"
+        return f'resumen_respuestas_general.{extension}'
+    return nombre
+
+
+REPORTES = {
+    'matriculas_pdf': Reporte('pdf', lambda parametros: 'matriculas.pdf', _matriculas_pdf),
+    'matriculas_excel': Reporte('xlsx', lambda parametros: 'matriculas.xlsx', _matriculas_excel),
+    'usuarios_excel': Reporte('xlsx', lambda parametros: 'usuarios_registrados.xlsx', _usuarios_excel),
+    'respuestas_excel': Reporte('xlsx', _nombre_respuestas('xlsx'), _respuestas_excel),
+    'respuestas_csv': Reporte('csv', _nombre_respuestas('csv'), _respuestas_csv),
+    'curso_academico_pdf': Reporte('pdf', _nombre_curso_academico('curso_academico', 'pdf'), _curso_academico_pdf),
+    'curso_academico_excel': Reporte('xlsx', _nombre_curso_academico('curso_academico', 'xlsx'), _curso_academico_excel),
+    'historial_pdf': Reporte('pdf', _nombre_historial, _historial_pdf),
+}
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.cache import cache
+
+# Atributo donde se guardan los grupos ya resueltos sobre la instancia del usuario
+ATRIBUTO_GRUPOS = '_cfbc_grupos'
+
+
+def clave_cache_grupos(user_id):
+    return f'roles:usuario:{user_id}'
+
+
+def grupos_usuario(user):
+    """
+    Devuelve una tupla con los nombres de los grupos del usuario, ordenados por id.
+
+    El resultado se guarda sobre la instancia del usuario (`request.user`), así
+    que dentro de una misma petición los mixins, decoradores y el contexto
+    `group_name` comparten una sola consulta. Si el setting ROLES_CACHE_TIMEOUT
+    es mayor que cero, además se guarda en el caché de Django entre peticiones;
+    las señales de `User.groups` se encargan de invalidarlo.
+    """
+    if user is None or not user.is_authenticated:
+        return ()
+
+    grupos = getattr(user, ATRIBUTO_GRUPOS, None)
+    if grupos is not None:
+        return grupos
+
+    timeout = getattr(settings, 'ROLES_CACHE_TIMEOUT', 0)
+    if timeout:
+        grupos = cache.get(clave_cache_grupos(user.pk))
+    if grupos is None:
+        grupos = tuple(user.groups.order_by('id').values_list('name', flat=True))
+        if timeout:
+            cache.set(clave_cache_grupos(user.pk), grupos, timeout)
+
+    setattr(user, ATRIBUTO_GRUPOS, grupos)
+    return grupos
+
+
+def grupo_principal(user):
+    """Nombre del primer grupo del usuario (el que se usa como `group_name`) o None."""
+    grupos = grupos_usuario(user)
+    return grupos[0] if grupos else None
+
+
+def pertenece_a(user, *nombres):
+    """Indica si el usuario pertenece a alguno de los grupos indicados."""
+    return any(nombre in grupos_usuario(user) for nombre in nombres)
+
+
+def invalidar_grupos(*user_ids):
+    """Elimina del caché los grupos guardados de los usuarios indicados."""
+    if user_ids:
+        cache.delete_many([clave_cache_grupos(user_id) for user_id in user_ids])
@@ -0,0 +1,117 @@
+"""
+Secciones del detalle de un curso académico con paginación por cursor.
+
+La página del curso académico se muestra sin las tablas grandes y cada
+sección (matrículas, calificaciones, asistencias) se carga por separado desde
+`CursoAcademicoSeccionView`. Las páginas se piden por cursor (keyset): el
+cursor lleva los valores de orden de la última fila enviada y la siguiente
+página se obtiene con un WHERE sobre esos valores, así que el costo no crece
+con el número de página como con OFFSET. Los datos de toda la sección que
+necesitan las filas (como la cantidad de columnas de notas) se calculan con la
+primera página y viajan firmados dentro del cursor.
+"""
+from django.core import signing
+from django.db.models import Max, Prefetch, Q
+
+from .models import NotaIndividual
+
+TAMANO_PAGINA = 50
+
+SAL_CURSOR = 'principal.secciones.cursor'
+
+
+def _despues_de(orden, valores):
+    """Condición de las filas que siguen a `valores` en el orden indicado."""
+    condicion = Q()
+    iguales = {}
+    for (campo, descendente), valor in zip(orden, valores):
+        condicion |= Q(**iguales, **{f"{campo}__{'lt' if descendente else 'gt'}": valor})
+        iguales[campo] = valor
+    return condicion
+
+
+def _valor_cursor(valor):
+    return valor.isoformat() if hasattr(valor, 'isoformat') else valor
+
+
+def _leer_cursor(cursor):
+    contenido = signing.loads(cursor, salt=SAL_CURSOR)
+    if not isinstance(contenido, dict):
+        raise signing.BadSignature('Cursor sin el formato esperado')
+    return contenido
+
+
+def datos_cursor(cursor):
+    """Datos que `paginar` guardó en el cursor. Un cursor alterado lanza `signing.BadSignature`."""
+    return _leer_cursor(cursor).get('datos')
+
+
+def paginar(queryset, orden, cursor=None, tamano=None, datos=None):
+    """
+    Devuelve (filas, siguiente) con la página que empieza después de `cursor`.
+
+    `orden` es una secuencia de pares (campo, descendente) que debe terminar
+    en un campo único (normalmente 'id'). `siguiente` es el cursor de la
+    página siguiente o None si no hay más filas; lleva también `datos`
+    (serializables en JSON), que se recuperan con `datos_cursor`. Un cursor
+    alterado lanza `signing.BadSignature`.
+    """
+    tamano = tamano or TAMANO_PAGINA
+    if cursor:
+        queryset = queryset.filter(_despues_de(orden, _leer_cursor(cursor)['valores']))
+    queryset = queryset.order_by(*[f"{'-' if descendente else ''}{campo}" for campo, descendente in orden])
+
+    filas = list(queryset[:tamano + 1])
+    if len(filas) <= tamano:
+        return filas, None
+    filas = filas[:tamano]
+    valores = [_valor_cursor(getattr(filas[-1], campo)) for campo, _ in orden]
+    return filas, signing.dumps({'valores': valores, 'datos': datos}, salt=SAL_CURSOR)
+
+
+class Seccion:
+    """
+    Sección cargable del detalle: clave del contexto de
+    `reportes.contexto_curso_academico` de donde sale el queryset, función
+    que lo optimiza, orden de paginación y plantilla de las filas. Opcionales:
+    función que agrega datos al contexto de la plantilla y plantilla del
+    encabezado, para las tablas cuyas columnas dependen de los datos.
+    """
+    def __init__(self, clave, preparar, orden, plantilla, extra=None, encabezado=None):
+        self.clave = clave
+        self.preparar = preparar
+        self.orden = orden
+        self.plantilla = plantilla
+        self.extra = extra
+        self.encabezado = encabezado
+
+
+def _max_notas(calificaciones):
+    # Las columnas de notas se fijan para todo el listado con el contador de cada calificación
+    return {'max_notas': calificaciones.aggregate(maximo=Max('cantidad_notas'))['maximo'] or 0}
+
+
+SECCIONES = {
+    'matriculas': Seccion(
+        'matriculas',
+        lambda matriculas: matriculas.select_related('student', 'course'),
+        (('id', False),),
+        'curso_academico/filas_matriculas.html',
+    ),
+    'calificaciones': Seccion(
+        'calificaciones',
+        lambda calificaciones: calificaciones.select_related('student', 'course').prefetch_related(
+            Prefetch('notas', queryset=NotaIndividual.objects.order_by('fecha_creacion', 'id'))
+        ),
+        (('id', False),),
+        'curso_academico/filas_calificaciones.html',
+        _max_notas,
+        'curso_academico/encabezado_calificaciones.html',
+    ),
+    'asistencias': Seccion(
+        'asistencias',
+        lambda asistencias: asistencias.select_related('student', 'course'),
+        (('date', True), ('id', True)),
+        'curso_academico/filas_asistencias.html',
+    ),
+}
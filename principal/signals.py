@@ -18,20 +18,270 @@ from .models import Matriculas , Calificaciones
 #         )
 
 from django.db.models.signals import pre_save
-from django.utils import timezone
 from .models import Curso
+from .transiciones import estado_debido
 
 @receiver(pre_save, sender=Curso)
-def update_course_status_enrollment(sender, instance, **kwargs):
-    if instance.enrollment_deadline:
-        if instance.enrollment_deadline < timezone.now().date() and instance.status == 'I':
-            instance.status = 'IT'
+def update_course_status(sender, instance, **kwargs):
+    # Las mismas reglas que aplica `manage.py transiciones_cursos` a todos los cursos
+    instance.status = estado_debido(instance)
 
 
-@receiver(pre_save, sender=Curso)
-def update_course_status_start(sender, instance, **kwargs):
-    if instance.start_date:
-        if instance.start_date <= timezone.now().date() and instance.status == 'IT':
-            instance.status = 'P'
 
 
+# Invalidar el caché de grupos cuando cambian los grupos de un usuario
+
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, pre_delete
+from .roles import ATRIBUTO_GRUPOS, invalidar_grupos
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_grupos_usuario(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        # user.groups.add(...): el usuario es la instancia
+        instance.__dict__.pop(ATRIBUTO_GRUPOS, None)
+        invalidar_grupos(instance.pk)
+    elif action == 'pre_clear':
+        # group.user_set.clear(): hay que leer los usuarios antes de borrar la relación
+        invalidar_grupos(*instance.user_set.values_list('pk', flat=True))
+    elif pk_set:
+        # group.user_set.add(...): los usuarios afectados vienen en pk_set
+        invalidar_grupos(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidar_grupos_por_cambio_de_grupo(sender, instance, created=False, **kwargs):
+    # Un grupo recién creado todavía no tiene usuarios
+    if not created:
+        invalidar_grupos(*User.objects.filter(groups=instance).values_list('pk', flat=True))
+
+
+
+# Contadores desnormalizados de asistencia y notas (ver principal/contadores.py)
+
+from django.db.models.signals import post_delete, post_init
+from . import contadores
+from .models import Asistencia, NotaIndividual
+
+
+def _clave_asistencia(asistencia):
+    return (asistencia.course_id, asistencia.student_id, asistencia.date, bool(asistencia.presente))
+
+
+def _cambiar_asistencia(course_id, student_id, dia, presente, signo):
+    """Suma (signo=1) o resta (signo=-1) una asistencia guardada y ajusta las sesiones del curso."""
+    otras = Asistencia.objects.filter(course_id=course_id, date=dia).exclude(student_id=student_id)
+    # La fecha aparece o desaparece solo si este estudiante es el único registrado en ella
+    sesiones = 0 if otras.exists() else signo
+    contadores.ajustar_asistencias(course_id, {student_id: (signo, signo * presente)}, sesiones)
+
+
+@receiver(post_init, sender=Asistencia)
+def recordar_asistencia(sender, instance, **kwargs):
+    # Con campos diferidos leerlos dispararía otra consulta por instancia
+    if instance.pk and not instance.get_deferred_fields():
+        instance._contador_original = _clave_asistencia(instance)
+    else:
+        instance._contador_original = None
+
+
+@receiver(post_save, sender=Asistencia)
+def contar_asistencia(sender, instance, created, raw=False, **kwargs):
+    actual = _clave_asistencia(instance)
+    anterior = instance._contador_original
+    instance._contador_original = actual
+    if raw or not contadores.activo() or anterior == actual:
+        return
+    if not created and anterior and anterior[:3] == actual[:3]:
+        # Solo cambió `presente`
+        course_id, student_id, _, presente = actual
+        contadores.ajustar_asistencias(course_id, {student_id: (0, 1 if presente else -1)})
+        return
+    if not created and anterior:
+        _cambiar_asistencia(*anterior, signo=-1)
+    _cambiar_asistencia(*actual, signo=1)
+
+
+@receiver(post_delete, sender=Asistencia)
+def descontar_asistencia(sender, instance, origin=None, **kwargs):
+    if not contadores.activo() or not instance._contador_original:
+        return
+    course_id, student_id, dia, presente = instance._contador_original
+    # En un borrado de varias filas todas se eliminan antes de enviar las
+    # señales, así que cada fecha vacía se descuenta una sola vez por borrado
+    descontadas = getattr(origin, '_fechas_descontadas', None)
+    if descontadas is None:
+        descontadas = set()
+        if origin is not None:
+            origin._fechas_descontadas = descontadas
+    sesiones = 0
+    if (course_id, dia) not in descontadas and not Asistencia.objects.filter(course_id=course_id, date=dia).exists():
+        descontadas.add((course_id, dia))
+        sesiones = -1
+    contadores.ajustar_asistencias(course_id, {student_id: (-1, -presente)}, sesiones)
+
+
+@receiver(post_init, sender=NotaIndividual)
+def recordar_nota(sender, instance, **kwargs):
+    if instance.pk and not instance.get_deferred_fields():
+        instance._contador_original = (instance.calificacion_id, instance.valor)
+    else:
+        instance._contador_original = None
+
+
+@receiver(post_save, sender=NotaIndividual)
+def contar_nota(sender, instance, created, raw=False, **kwargs):
+    anterior = instance._contador_original
+    instance._contador_original = (instance.calificacion_id, instance.valor)
+    if raw or not contadores.activo() or anterior == instance._contador_original:
+        return
+    if created or not anterior:
+        contadores.ajustar_notas(instance.calificacion, 1, instance.valor)
+    elif anterior[0] == instance.calificacion_id:
+        contadores.ajustar_notas(instance.calificacion, 0, instance.valor - anterior[1])
+    else:
+        contadores.ajustar_notas(Calificaciones.objects.get(pk=anterior[0]), -1, -anterior[1])
+        contadores.ajustar_notas(instance.calificacion, 1, instance.valor)
+
+
+@receiver(post_delete, sender=NotaIndividual)
+def descontar_nota(sender, instance, **kwargs):
+    if contadores.activo() and instance._contador_original:
+        calificacion_id, valor = instance._contador_original
+        calificacion = Calificaciones.objects.filter(pk=calificacion_id).first()
+        if calificacion:
+            contadores.ajustar_notas(calificacion, -1, -valor)
+
+
+
+# Versión de los datos de las exportaciones (ver principal/trabajos.py)
+
+from accounts.models import Registro
+from .models import (
+    CursoAcademico, FormularioAplicacion, OpcionRespuesta, PreguntaFormulario, RespuestaEstudiante,
+    SolicitudInscripcion,
+)
+from .trabajos import invalidar_exportaciones
+
+MODELOS_EXPORTADOS = (
+    Curso, CursoAcademico, Matriculas, Asistencia, Calificaciones, NotaIndividual, FormularioAplicacion,
+    PreguntaFormulario, OpcionRespuesta, SolicitudInscripcion, RespuestaEstudiante, Registro, User,
+)
+
+
+def invalidar_exportaciones_por_cambio(sender, raw=False, update_fields=None, **kwargs):
+    # Cada inicio de sesión guarda User.last_login, que no aparece en los reportes
+    if raw or update_fields == frozenset({'last_login'}):
+        return
+    invalidar_exportaciones()
+
+
+for modelo in MODELOS_EXPORTADOS:
+    post_save.connect(invalidar_exportaciones_por_cambio, sender=modelo, dispatch_uid=f'exportaciones_save_{modelo.__name__}')
+    post_delete.connect(invalidar_exportaciones_por_cambio, sender=modelo, dispatch_uid=f'exportaciones_delete_{modelo.__name__}')
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=RespuestaEstudiante.opciones_seleccionadas.through)
+def invalidar_exportaciones_por_relacion(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_exportaciones()
+
+
+
+# Caché del curso académico activo (ver principal/cursos_academicos.py)
+
+from .cursos_academicos import invalidar_curso_activo
+
+
+@receiver(post_save, sender=CursoAcademico)
+@receiver(post_delete, sender=CursoAcademico)
+def invalidar_curso_activo_por_cambio(sender, **kwargs):
+    invalidar_curso_activo()
+
+
+# Esquema de los formularios de aplicación (ver principal/esquemas.py)
+
+from .esquemas import formulario_modificado
+
+
+@receiver(post_save, sender=PreguntaFormulario)
+@receiver(post_delete, sender=PreguntaFormulario)
+def renovar_esquema_por_pregunta(sender, instance, raw=False, **kwargs):
+    if not raw:
+        formulario_modificado(pk=instance.formulario_id)
+
+
+@receiver(post_save, sender=OpcionRespuesta)
+@receiver(post_delete, sender=OpcionRespuesta)
+def renovar_esquema_por_opcion(sender, instance, raw=False, **kwargs):
+    if not raw:
+        formulario_modificado(preguntas=instance.pregunta_id)
+
+
+# Totales de solicitudes por curso académico (ver principal/estadisticas.py)
+
+from django.db import transaction
+from .estadisticas import invalidar_resumen
+
+
+@receiver(post_save, sender=SolicitudInscripcion)
+@receiver(post_delete, sender=SolicitudInscripcion)
+def invalidar_resumen_solicitudes(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if SolicitudInscripcion.curso.is_cached(instance):
+        ids = [instance.curso.curso_academico_id]
+    else:
+        # El curso puede estar borrándose en cascada: se lee solo su curso académico
+        ids = list(Curso.objects.filter(pk=instance.curso_id).values_list('curso_academico_id', flat=True))
+    # Al confirmar: antes, otra petición podría volver a guardar los totales sin el cambio
+    transaction.on_commit(lambda: invalidar_resumen(*ids))
+
+
+# Caché de la página de inicio (ver principal/portada.py)
+
+from blog.models import Noticia
+from .portada import invalidar_portada
+
+
+@receiver(post_save, sender=Curso)
+@receiver(post_delete, sender=Curso)
+@receiver(post_save, sender=Noticia)
+@receiver(post_delete, sender=Noticia)
+@receiver(post_save, sender=FormularioAplicacion)
+@receiver(post_delete, sender=FormularioAplicacion)
+def invalidar_portada_por_cambio(sender, raw=False, **kwargs):
+    if not raw:
+        invalidar_portada()
+
+
+# Historial académico de cada estudiante (ver principal/historial.py)
+
+from .historial import invalidar_historial
+
+
+@receiver(post_save, sender=Matriculas)
+@receiver(post_delete, sender=Matriculas)
+@receiver(post_save, sender=Calificaciones)
+@receiver(post_delete, sender=Calificaciones)
+@receiver(post_save, sender=Asistencia)
+@receiver(post_delete, sender=Asistencia)
+def invalidar_historial_por_cambio(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidar_historial(instance.student_id)
+
+
+@receiver(post_save, sender=NotaIndividual)
+@receiver(post_delete, sender=NotaIndividual)
+def invalidar_historial_por_nota(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if NotaIndividual.calificacion.is_cached(instance):
+        invalidar_historial(instance.calificacion.student_id)
+    else:
+        # La calificación puede estar borrándose en cascada, y entonces su propia señal invalida el historial
+        invalidar_historial(*Calificaciones.objects.filter(pk=instance.calificacion_id).values_list('student_id', flat=True))
@@ -0,0 +1,131 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .correos import correo_solicitud_aprobada, correo_solicitud_rechazada, encolar_correos
+from .estadisticas import invalidar_resumen
+from .historial import invalidar_historial
+from .models import Matriculas, OpcionRespuesta, RespuestaEstudiante, SolicitudInscripcion
+from .trabajos import invalidar_exportaciones
+from .versiones import agrupar_versiones
+
+
+def _ids_opciones(valores):
+    try:
+        # dict.fromkeys quita repetidos sin perder el orden
+        return list(dict.fromkeys(int(valor) for valor in valores if valor != ''))
+    except (TypeError, ValueError):
+        raise ValueError('Alguna de las opciones enviadas no es válida.')
+
+
+def enviar_solicitud(curso, estudiante, formulario, preguntas, datos):
+    """
+    Crea la solicitud de inscripción de `estudiante` con sus respuestas.
+
+    `preguntas` son las preguntas del formulario y `datos` el POST con un
+    campo `pregunta_<id>` por pregunta. Las opciones enviadas se validan con
+    una sola consulta contra las preguntas del formulario; las respuestas (con
+    el texto de las preguntas de escritura libre) y las opciones seleccionadas
+    se crean con un `bulk_create` cada una, todo en una transacción. Si alguna
+    opción no es válida se lanza ValueError y no se guarda nada. Devuelve la
+    solicitud creada.
+    """
+    seleccion = {}
+    textos = {}
+    for pregunta in preguntas:
+        campo = f'pregunta_{pregunta.id}'
+        if pregunta.tipo == 'seleccion_multiple':
+            seleccion[pregunta.id] = _ids_opciones(datos.getlist(campo))
+        elif pregunta.tipo == 'seleccion_unica':
+            seleccion[pregunta.id] = _ids_opciones([datos.get(campo, '')])
+        elif pregunta.tipo == 'escritura_libre':
+            texto = datos.get(campo, '').strip()
+            if texto:
+                textos[pregunta.id] = texto
+
+    enviadas = {opcion_id for ids in seleccion.values() for opcion_id in ids}
+    validas = dict(
+        OpcionRespuesta.objects.filter(pk__in=enviadas, pregunta__formulario=formulario).values_list('pk', 'pregunta_id')
+    ) if enviadas else {}
+    for pregunta_id, ids in seleccion.items():
+        if any(validas.get(opcion_id) != pregunta_id for opcion_id in ids):
+            raise ValueError('Alguna de las opciones enviadas no pertenece a su pregunta.')
+
+    try:
+        with transaction.atomic(), agrupar_versiones():
+            solicitud = SolicitudInscripcion.objects.create(
+                curso=curso, estudiante=estudiante, formulario=formulario, estado='pendiente',
+            )
+            respuestas = RespuestaEstudiante.objects.bulk_create([
+                RespuestaEstudiante(solicitud=solicitud, pregunta=pregunta, texto_respuesta=textos.get(pregunta.id, ''))
+                for pregunta in preguntas
+            ])
+            respuestas = {respuesta.pregunta_id: respuesta for respuesta in respuestas}
+            elegidas = [
+                (respuestas[pregunta_id].pk, opcion_id)
+                for pregunta_id, ids in seleccion.items()
+                for opcion_id in ids
+            ]
+
+            Through = RespuestaEstudiante.opciones_seleccionadas.through
+            Through.objects.bulk_create([
+                Through(respuestaestudiante_id=respuesta_id, opcionrespuesta_id=opcion_id)
+                for respuesta_id, opcion_id in elegidas
+            ])
+            # bulk_create no envía post_save ni m2m_changed
+            invalidar_exportaciones()
+    except IntegrityError:
+        raise ValueError('Ya has aplicado a este curso.')
+    return solicitud
+
+
+def revisar_solicitudes(solicitudes, aprobar, revisor):
+    """
+    Aprueba (o rechaza, con `aprobar=False`) las solicitudes pendientes del
+    queryset en una transacción.
+
+    El estado se cambia con un UPDATE, las matrículas de las aprobadas se
+    crean con un `bulk_create` (las que ya existían se conservan, como hacía
+    `SolicitudInscripcion.aprobar`) y las notificaciones quedan en la bandeja
+    de salida en lugar de enviarse aquí. Devuelve la cantidad de solicitudes
+    revisadas.
+    """
+    with transaction.atomic():
+        # Se bloquean las pendientes para que dos revisiones simultáneas no las procesen dos veces
+        ids = list(solicitudes.filter(estado='pendiente').select_for_update().values_list('pk', flat=True))
+        if not ids:
+            return 0
+        filas = list(
+            SolicitudInscripcion.objects.filter(pk__in=ids).values_list(
+                'estudiante_id', 'curso_id', 'curso__curso_academico_id', 'curso__name', 'estudiante__email',
+            )
+        )
+        SolicitudInscripcion.objects.filter(pk__in=ids).update(
+            estado='aprobada' if aprobar else 'rechazada', fecha_revision=timezone.now(), revisado_por=revisor,
+        )
+
+        if aprobar:
+            existentes = set(
+                Matriculas.objects.filter(
+                    student_id__in={fila[0] for fila in filas}, course_id__in={fila[1] for fila in filas},
+                ).values_list('student_id', 'course_id', 'curso_academico_id')
+            )
+            Matriculas.objects.bulk_create(
+                [
+                    Matriculas(student_id=estudiante, course_id=curso, curso_academico_id=curso_academico, activo=True, estado='P')
+                    for estudiante, curso, curso_academico, _, _ in filas
+                    if (estudiante, curso, curso_academico) not in existentes
+                ],
+                ignore_conflicts=True,
+            )
+
+        correo = correo_solicitud_aprobada if aprobar else correo_solicitud_rechazada
+        encolar_correos([(email, *correo(nombre_curso)) for _, _, _, nombre_curso, email in filas])
+        # UPDATE y bulk_create no envían señales
+        invalidar_exportaciones()
+        # Los cachés se vacían al confirmar, para que nadie los vuelva a llenar con los datos anteriores
+        cursos_academicos = {fila[2] for fila in filas}
+        transaction.on_commit(lambda: invalidar_resumen(*cursos_academicos))
+        if aprobar:
+            estudiantes = {fila[0] for fila in filas}
+            transaction.on_commit(lambda: invalidar_historial(*estudiantes))
+    return len(ids)
@@ -2,36 +2,10 @@ from django import template
 
 register = template.Library()
 
-@register.filter
-def filter_present_for_course(queryset, curso):
-    return queryset.filter(presente=True, course=curso).count()
-
-@register.filter
-def filter_total_for_course(queryset, curso):
-    return queryset.filter(course=curso).count()
-
 @register.filter
 def subtract(value, arg):
     return value - arg
 
-from django.contrib.auth import get_user_model
-from principal.models import Curso
-from datetime import datetime
-
-User = get_user_model()
-
-@register.filter
-def filter_asistencia(queryset, student_id):
-    try:
-        student = User.objects.get(id=student_id)
-        return queryset.filter(student=student)
-    except User.DoesNotExist:
-        return queryset.none() # Return an empty queryset if student not found
-
-@register.filter
-def filter_by_date(queryset, date):
-    return queryset.filter(date=date).first()
-
 @register.filter
 def join_strings(value, arg):
     return str(value) + str(arg)
@@ -48,10 +22,6 @@ def get_range(value, start=0):
 def map_max_notas(calificaciones):
     """
     Retorna el número máximo de notas entre todas las calificaciones
+    (según el contador cantidad_notas, sin una consulta por calificación)
     """
-    max_notas = 0
-    for calificacion in calificaciones:
-        num_notas = calificacion.notas.count()
-        if num_notas > max_notas:
-            max_notas = num_notas
-    return max_notas
\ No newline at end of file
+    return max((calificacion.cantidad_notas for calificacion in calificaciones), default=0)
\ No newline at end of file
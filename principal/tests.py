@@ -1,3 +1,1637 @@
-from django.test import TestCase
+from django.contrib import messages
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import json
+import tempfile
+from unittest.mock import patch
+
+import openpyxl
+
+from blog.models import Categoria, Noticia
+from .asistencias import MatrizAsistencias, eliminar_asistencias, registrar_asistencias
+from .calificaciones import importar_notas
+from .cambio_curso import cambiar_curso_academico
+from .contadores import recalcular_contadores, verificar_contadores
+from .correos import encolar_correos, enviar_pendientes
+from .exportacion import escribir_csv
+from .cursos_academicos import curso_activo
+from .historial import clave_historial, construir_historial, historial_estudiante
+from .models import (
+    Asistencia, Calificaciones, Curso, CursoAcademico, FormularioAplicacion, Matriculas, NotaIndividual,
+    CorreoPendiente, OpcionRespuesta, PreguntaFormulario, RespuestaEstudiante, SolicitudInscripcion, TrabajoExportacion, TransicionCurso,
+)
+from .planes import CONSULTAS_FRECUENTES, recorridos_secuenciales
+from .roles import grupos_usuario, pertenece_a
+from .reportes import REPORTES, hoja_respuestas_curso, matriz_respuestas
+from .solicitudes import enviar_solicitud
+from .trabajos import RESERVA_TRABAJO, clave_exportacion, procesar_pendientes, tomar_siguiente
+from .transiciones import aplicar_transiciones
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0)
+class CatalogoCursosQueriesTest(TestCase):
+    """
+    Las vistas del catálogo deben resolver los cursos con un número fijo de
+    consultas, sin importar cuántos cursos tenga el curso académico activo.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.profesor = User.objects.create_user(username='profesor', password='clave-segura-123')
+        cls.profesor.groups.add(Group.objects.get_or_create(name='Profesores')[0])
+        # El registro del usuario lo agrega automáticamente al grupo Estudiantes
+        cls.estudiante = User.objects.create_user(username='estudiante', password='clave-segura-123')
+        cls.otro_estudiante = User.objects.create_user(username='otro', password='clave-segura-123')
+
+    def crear_cursos(self, cantidad):
+        # Las versiones de la portada y las exportaciones se renuevan al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(cantidad):
+                curso = Curso.objects.create(
+                    name=f'Curso {Curso.objects.count()}',
+                    teacher=self.profesor,
+                    curso_academico=self.curso_academico,
+                )
+                FormularioAplicacion.objects.create(curso=curso, titulo=f'Formulario {curso.name}')
+                Matriculas.objects.create(course=curso, student=self.otro_estudiante, curso_academico=self.curso_academico)
+                if i % 2:
+                    Matriculas.objects.create(course=curso, student=self.estudiante, curso_academico=self.curso_academico)
+                else:
+                    SolicitudInscripcion.objects.create(
+                        curso=curso, estudiante=self.estudiante,
+                        formulario=curso.formulario_aplicacion, estado='pendiente',
+                    )
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(consultas), response
+
+    def assertConsultasConstantes(self, url_name):
+        self.client.force_login(self.estudiante)
+        url = reverse(f'principal:{url_name}')
+
+        self.crear_cursos(2)
+        pocas, _ = self.contar_consultas(url)
+        self.crear_cursos(20)
+        muchas, response = self.contar_consultas(url)
+
+        self.assertEqual(pocas, muchas)
+        courses = response.context['courses']
+        self.assertEqual(len(courses), 22)
+        for course in courses:
+            self.assertEqual(course.enrollment_count, 2 if course.is_enrolled else 1)
+            self.assertEqual(course.tiene_solicitud_pendiente, not course.is_enrolled)
+            self.assertEqual(course.formulario_aplicacion.curso_id, course.id)
+
+    def test_home_view(self):
+        # La portada solo muestra los carruseles, sin el estado del estudiante en cada curso
+        self.client.force_login(self.estudiante)
+        self.crear_cursos(2)
+        pocas, _ = self.contar_consultas(reverse('principal:home'))
+        self.crear_cursos(20)
+        muchas, response = self.contar_consultas(reverse('principal:home'))
+        self.assertEqual(pocas, muchas)
+        self.assertNotIn('courses', response.context)
+        self.assertContains(response, 'Curso 21')
+
+    def test_listado_cursos_view(self):
+        self.assertConsultasConstantes('listado_cursos')
+
+    def test_courses_view(self):
+        self.assertConsultasConstantes('cursos')
+
+    def test_anonimo_sin_estado_de_estudiante(self):
+        self.crear_cursos(3)
+        _, response = self.contar_consultas(reverse('principal:cursos'))
+        for course in response.context['courses']:
+            self.assertFalse(course.is_enrolled)
+            self.assertIsNone(course.solicitud_estado)
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=300)
+class RolesCacheTest(TestCase):
+    """
+    Los grupos del usuario se resuelven una sola vez por petición y el caché
+    entre peticiones se invalida al cambiar `User.groups`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.secretaria = Group.objects.create(name='Secretaria')
+        cls.profesores = Group.objects.create(name='Profesores')
+        cls.usuario = User.objects.create_user(username='usuario', password='clave-segura-123')
+
+    def consultas_de_grupos(self, consultas):
+        return [q for q in consultas.captured_queries if 'auth_user_groups' in q['sql']]
+
+    def test_una_consulta_de_grupos_por_peticion(self):
+        self.usuario.groups.add(self.profesores)
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('principal:login_redirect'))
+        self.assertRedirects(response, reverse('principal:profile'), fetch_redirect_response=False)
+        self.assertLessEqual(len(self.consultas_de_grupos(consultas)), 1)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('principal:profile'))
+        self.assertEqual(response.context['group_name'], 'Profesores')
+        self.assertLessEqual(len(self.consultas_de_grupos(consultas)), 1)
+
+    def test_invalidacion_al_cambiar_grupos(self):
+        usuario = User.objects.get(pk=self.usuario.pk)
+        self.assertFalse(pertenece_a(usuario, 'Secretaria'))
+
+        usuario.groups.add(self.secretaria)
+        self.assertTrue(pertenece_a(usuario, 'Secretaria'))
+        # Una instancia nueva del mismo usuario no debe leer datos viejos del caché
+        self.assertIn('Secretaria', grupos_usuario(User.objects.get(pk=self.usuario.pk)))
+
+        self.secretaria.user_set.remove(usuario)
+        self.assertNotIn('Secretaria', grupos_usuario(User.objects.get(pk=self.usuario.pk)))
+
+
+@override_settings(CURSO_ACTIVO_CACHE_TIMEOUT=60, CURSO_ACTIVO_CACHE_COMPARTIDO=300)
+class CursoActivoTest(TestCase):
+    """El curso académico activo se lee de la base de datos una vez y se invalida al cambiar."""
+
+    def test_cache_e_invalidacion(self):
+        anterior = CursoAcademico.objects.create(nombre='2024-2025', activo=True)
+        with self.assertNumQueries(1):
+            self.assertEqual(curso_activo(), anterior)
+        with self.assertNumQueries(0):
+            self.assertEqual(curso_activo(), anterior)
+
+        # Cualquier cambio en CursoAcademico descarta el valor guardado
+        nuevo = CursoAcademico.objects.create(nombre='2025-2026')
+        with self.assertNumQueries(1):
+            self.assertEqual(curso_activo(), anterior)
+        nuevo.activar()
+        self.assertEqual(curso_activo(), nuevo)
+
+        nuevo.archivar()
+        self.assertIsNone(curso_activo())
+        with self.assertNumQueries(0):
+            self.assertIsNone(curso_activo())
+
+        anterior.activar()
+        anterior.delete()
+        self.assertIsNone(curso_activo())
+
+
+class RegistrarAsistenciasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        profesor = User.objects.create_user(username='profesor')
+        cls.curso = Curso.objects.create(name='Inglés', teacher=profesor)
+        cls.alumnos = [User.objects.create_user(username=f'alumno{i}') for i in range(3)]
+
+    def test_upsert_devuelve_los_cambios(self):
+        a, b, c = (alumno.id for alumno in self.alumnos)
+        dia = date(2025, 3, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cambios = registrar_asistencias(self.curso, dia, {a: True, b: False})
+        self.assertEqual((cambios['creadas'], cambios['actualizadas']), ([a, b], []))
+
+        # Lectura con bloqueo, inserción, un UPDATE de contadores por tabla y, al confirmar, la versión de las exportaciones
+        with self.assertNumQueries(7), self.captureOnCommitCallbacks(execute=True):
+            cambios = registrar_asistencias(self.curso, dia, {a: True, b: True, c: False})
+        self.assertEqual(cambios['creadas'], [c])
+        self.assertEqual(cambios['actualizadas'], [b])
+        self.assertEqual(cambios['sin_cambios'], [a])
+        self.assertTrue(Asistencia.objects.get(course=self.curso, date=dia, student_id=b).presente)
+
+        cambios = registrar_asistencias(self.curso, dia, {a: False}, reemplazar=True)
+        self.assertEqual(sorted(cambios['eliminadas']), [b, c])
+        self.assertEqual(Asistencia.objects.filter(course=self.curso, date=dia).count(), 1)
+
+
+class MatrizAsistenciasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        profesor = User.objects.create_user(username='profesor')
+        cls.curso = Curso.objects.create(name='Inglés', teacher=profesor, curso_academico=cls.curso_academico)
+        cls.alumnos = [User.objects.create_user(username=f'alumno{i}') for i in range(3)]
+        for alumno in cls.alumnos:
+            Matriculas.objects.create(course=cls.curso, student=alumno, curso_academico=cls.curso_academico)
+        a, b, c = cls.alumnos
+        registrar_asistencias(cls.curso, date(2025, 3, 1), {a.id: True, b.id: False})
+        registrar_asistencias(cls.curso, date(2025, 3, 2), {a.id: True, b.id: True})
+
+    def test_celdas_y_totales(self):
+        matriculas = Matriculas.objects.filter(course=self.curso).select_related('student').order_by('id')
+        with self.assertNumQueries(2):
+            matriz = MatrizAsistencias(self.curso, matriculas)
+        self.assertEqual(matriz.fechas, [date(2025, 3, 2), date(2025, 3, 1)])
+        a, b, c = matriz.filas
+        self.assertEqual(a['celdas'], [True, True])
+        self.assertEqual((b['celdas'], b['presentes'], b['ausentes'], b['porcentaje']), ([True, False], 1, 1, 50))
+        self.assertEqual((c['celdas'], c['porcentaje']), ([None, None], None))
+
+        filtrada = MatrizAsistencias(self.curso, matriculas, fecha=date(2025, 3, 1))
+        self.assertEqual(filtrada.fechas, [date(2025, 3, 1)])
+        # Las celdas se limitan a la fecha, los totales cubren todo el curso
+        _, b, c = filtrada.filas
+        self.assertEqual((b['celdas'], b['total'], b['porcentaje']), ([False], 2, 50))
+        self.assertEqual((c['celdas'], c['total']), ([None], 0))
+
+    @override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0)
+    def test_vista_en_consultas_constantes(self):
+        self.client.force_login(self.curso.teacher)
+        url = reverse('principal:asistencias', args=[self.curso.id])
+        with CaptureQueriesContext(connection) as pocas:
+            self.client.get(url)
+        for dia in range(3, 20):
+            registrar_asistencias(self.curso, date(2025, 3, dia), {alumno.id: True for alumno in self.alumnos})
+        with CaptureQueriesContext(connection) as muchas:
+            response = self.client.get(url)
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertContains(response, '✓ Presente')
+
+
+class ContadoresTest(TestCase):
+    """
+    Los contadores de Matriculas y Curso se mantienen al día con cada escritura
+    y coinciden con lo que reconstruye `recalcular_contadores`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        profesor = User.objects.create_user(username='profesor')
+        cls.curso = Curso.objects.create(name='Inglés', teacher=profesor, curso_academico=cls.curso_academico)
+        cls.alumnos = [User.objects.create_user(username=f'alumno{i}') for i in range(3)]
+        cls.matriculas = [
+            Matriculas.objects.create(course=cls.curso, student=alumno, curso_academico=cls.curso_academico)
+            for alumno in cls.alumnos
+        ]
+
+    def matricula(self, i):
+        return Matriculas.objects.get(pk=self.matriculas[i].pk)
+
+    def assertContadoresCorrectos(self):
+        self.assertEqual(verificar_contadores(), [])
+
+    def test_asistencias(self):
+        a, b, c = (alumno.id for alumno in self.alumnos)
+        registrar_asistencias(self.curso, date(2025, 3, 1), {a: True, b: False, c: True})
+        registrar_asistencias(self.curso, date(2025, 3, 2), {a: True, b: True})
+        registrar_asistencias(self.curso, date(2025, 3, 2), {a: False, b: True}, reemplazar=True)
+
+        matricula = self.matricula(0)
+        self.assertEqual((matricula.asistencias_registradas, matricula.asistencias_presentes), (2, 1))
+        self.assertEqual(float(matricula.porcentaje_asistencia), 50)
+        curso = Curso.objects.get(pk=self.curso.pk)
+        self.assertEqual((curso.sesiones_registradas, curso.asistencias_registradas), (2, 5))
+        self.assertContadoresCorrectos()
+
+        # Cambios fila por fila a través de las señales
+        asistencia = Asistencia.objects.get(course=self.curso, student_id=c, date=date(2025, 3, 1))
+        asistencia.presente = False
+        asistencia.save()
+        Asistencia.objects.create(course=self.curso, student_id=c, date=date(2025, 3, 3), presente=True)
+        Asistencia.objects.get(course=self.curso, student_id=b, date=date(2025, 3, 1)).delete()
+        self.assertEqual(Curso.objects.get(pk=self.curso.pk).sesiones_registradas, 3)
+        self.assertContadoresCorrectos()
+
+        # Borrado masivo por queryset (por ejemplo, desde el admin)
+        Asistencia.objects.filter(course=self.curso, date=date(2025, 3, 1)).delete()
+        self.assertEqual(Curso.objects.get(pk=self.curso.pk).sesiones_registradas, 2)
+        self.assertContadoresCorrectos()
+
+        eliminar_asistencias(Asistencia.objects.filter(course=self.curso, date__gte=date(2025, 3, 3)))
+        curso = Curso.objects.get(pk=self.curso.pk)
+        self.assertEqual((curso.sesiones_registradas, curso.asistencias_registradas), (1, 2))
+        self.assertContadoresCorrectos()
+
+    def test_notas(self):
+        calificacion = Calificaciones.objects.create(
+            matricula=self.matriculas[0], course=self.curso, student=self.alumnos[0],
+            curso_academico=self.curso_academico,
+        )
+        nota = NotaIndividual.objects.create(calificacion=calificacion, valor=8)
+        NotaIndividual.objects.create(calificacion=calificacion, valor=5)
+        nota.valor = 10
+        nota.save()
+
+        matricula = self.matricula(0)
+        self.assertEqual((matricula.cantidad_notas, matricula.suma_notas), (2, 15))
+        self.assertEqual(float(matricula.promedio_notas), 7.5)
+        self.assertContadoresCorrectos()
+
+        nota.delete()
+        self.assertEqual(float(Curso.objects.get(pk=self.curso.pk).promedio_notas), 5)
+        self.assertContadoresCorrectos()
+
+    def test_recalcular(self):
+        registrar_asistencias(self.curso, date(2025, 3, 1), {alumno.id: True for alumno in self.alumnos})
+        Matriculas.objects.update(asistencias_registradas=0, porcentaje_asistencia=None)
+        self.assertEqual(len(verificar_contadores()), 2 * len(self.alumnos))
+
+        recalcular_contadores()
+        self.assertContadoresCorrectos()
+        self.assertEqual(float(self.matricula(1).porcentaje_asistencia), 100)
+
+
+class PromedioCalificacionesTest(TestCase):
+    """
+    El promedio de Calificaciones se mantiene con suma y cantidad: guardar un
+    formset recalcula una vez por lote y la importación usa pocas consultas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.profesor = User.objects.create_user(username='profesor')
+        cls.curso = Curso.objects.create(name='Inglés', teacher=cls.profesor, curso_academico=cls.curso_academico)
+        cls.matriculas = [
+            Matriculas.objects.create(
+                course=cls.curso, student=User.objects.create_user(username=f'alumno{i}'),
+                curso_academico=cls.curso_academico,
+            )
+            for i in range(5)
+        ]
+
+    def datos_formset(self, valores):
+        datos = {
+            'notas-TOTAL_FORMS': str(len(valores)),
+            'notas-INITIAL_FORMS': '0',
+            'notas-MIN_NUM_FORMS': '0',
+            'notas-MAX_NUM_FORMS': '1000',
+        }
+        for i, valor in enumerate(valores):
+            datos[f'notas-{i}-valor'] = str(valor)
+        return datos
+
+    def test_formset_recalcula_una_vez(self):
+        self.client.force_login(self.profesor)
+        url = reverse('principal:add_nota', args=[self.matriculas[0].pk])
+        valores = [70, 80, 90, 75, 85, 60, 100, 95, 65, 80]
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(url, self.datos_formset(valores))
+        self.assertEqual(response.status_code, 302)
+        escrituras = [q for q in consultas.captured_queries if q['sql'].startswith(('UPDATE', 'INSERT'))]
+        # Una calificación, diez notas, un UPDATE de contadores por tabla y la
+        # versión de las exportaciones por la calificación y por todas las notas juntas
+        self.assertLessEqual(len(escrituras), 1 + len(valores) + 3 + 2)
+
+        calificacion = Calificaciones.objects.get(matricula=self.matriculas[0])
+        self.assertEqual((calificacion.cantidad_notas, calificacion.suma_notas), (10, sum(valores)))
+        self.assertEqual(float(calificacion.average), 80)
+        self.assertEqual(verificar_contadores(), [])
+
+    def test_save_no_pisa_el_promedio(self):
+        calificacion = Calificaciones.objects.create(
+            matricula=self.matriculas[0], course=self.curso, student=self.matriculas[0].student,
+            curso_academico=self.curso_academico,
+        )
+        NotaIndividual.objects.create(calificacion=calificacion, valor=90)
+        calificacion.save()
+        calificacion.refresh_from_db()
+        self.assertEqual(float(calificacion.average), 90)
+
+    def test_importar_columna(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            importar_notas(self.curso, {matricula.pk: 60 for matricula in self.matriculas})
+        with self.assertNumQueries(9), self.captureOnCommitCallbacks(execute=True):
+            notas = importar_notas(self.curso, {matricula.pk: 80 + i for i, matricula in enumerate(self.matriculas)})
+        self.assertEqual(len(notas), 5)
+
+        calificacion = Calificaciones.objects.get(matricula=self.matriculas[4])
+        self.assertEqual(float(calificacion.average), 72)
+        self.assertEqual(float(Curso.objects.get(pk=self.curso.pk).promedio_notas), 71)
+        self.assertEqual(verificar_contadores(), [])
+
+        with self.assertRaises(ValueError):
+            importar_notas(self.curso, {0: 50})
+
+
+class ExportacionExcelTest(TestCase):
+    """
+    El reporte Excel del curso académico se encola, lo genera el worker con un
+    número de consultas que no depende de la cantidad de filas y el archivo se
+    reutiliza mientras los datos no cambien.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.admin = User.objects.create_superuser(username='admin', password='clave-segura-123')
+        cls.curso = Curso.objects.create(name='Inglés', teacher=cls.admin, curso_academico=cls.curso_academico)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.url = reverse('principal:principal_cursoacademico_detail', args=[self.curso_academico.pk]) + '?excel=1'
+
+    def inscribir(self, cantidad):
+        inicio = Matriculas.objects.count()
+        # La versión de las exportaciones se renueva al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            matriculas = [
+                Matriculas.objects.create(
+                    course=self.curso, student=User.objects.create_user(username=f'alumno{inicio + i}'),
+                    curso_academico=self.curso_academico,
+                )
+                for i in range(cantidad)
+            ]
+            importar_notas(self.curso, {matricula.pk: 70 for matricula in matriculas})
+            importar_notas(self.curso, {matricula.pk: 90 for matricula in matriculas[:1]})
+            registrar_asistencias(self.curso, date(2025, 3, 1), {m.student_id: True for m in matriculas})
+
+    def exportar(self):
+        response = self.client.get(self.url)
+        trabajo = TrabajoExportacion.objects.latest('pk')
+        self.assertRedirects(response, reverse('principal:exportacion', args=[trabajo.pk]))
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(procesar_pendientes(), 1)
+        response = self.client.get(reverse('principal:descargar_exportacion', args=[trabajo.pk]))
+        contenido = b''.join(response.streaming_content)
+        return len(consultas), response, openpyxl.load_workbook(BytesIO(contenido))
+
+    def test_reporte_del_curso_academico(self):
+        self.client.force_login(self.admin)
+        self.inscribir(2)
+        pocas, _, _ = self.exportar()
+        self.inscribir(10)
+        muchas, response, libro = self.exportar()
+
+        self.assertEqual(pocas, muchas)
+        self.assertTrue(response.streaming)
+        self.assertIn('curso_academico_2025-2026.xlsx', response['Content-Disposition'])
+        self.assertEqual(
+            libro.sheetnames,
+            ['Información General', 'Cursos', 'Matrículas', 'Calificaciones', 'Asistencias'],
+        )
+        calificaciones = list(libro['Calificaciones'].values)
+        self.assertEqual(calificaciones[0], ('Estudiante', 'Curso', 'Nota 1', 'Nota 2', 'Promedio'))
+        self.assertEqual(calificaciones[1][2:], (70, 90, 80))
+        self.assertEqual(calificaciones[2][2:], (70, 'N/A', 70))
+        self.assertEqual(libro['Matrículas'].max_row, 13)
+
+    def test_reutiliza_el_archivo_hasta_que_cambian_los_datos(self):
+        otro = User.objects.create_superuser(username='otro_admin', password='clave-segura-123')
+        self.client.force_login(self.admin)
+        self.inscribir(2)
+        self.exportar()
+        trabajo = TrabajoExportacion.objects.get()
+
+        estado = self.client.get(reverse('principal:estado_exportacion', args=[trabajo.pk])).json()
+        self.assertEqual((estado['estado'], estado['progreso']), ('completado', 100))
+
+        # Mismo pedido y mismos datos: se descarga directamente el archivo ya generado
+        response = self.client.get(self.url)
+        self.assertRedirects(
+            response, reverse('principal:descargar_exportacion', args=[trabajo.pk]), fetch_redirect_response=False
+        )
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+
+        # Otro usuario recibe su propio trabajo, que apunta al mismo archivo
+        self.client.force_login(otro)
+        self.client.get(self.url)
+        copia = TrabajoExportacion.objects.latest('pk')
+        self.assertEqual((copia.estado, copia.archivo.name), ('completado', trabajo.archivo.name))
+
+        # Con datos nuevos cambia la clave y el reporte se vuelve a generar
+        self.inscribir(1)
+        self.client.get(self.url)
+        nuevo = TrabajoExportacion.objects.latest('pk')
+        self.assertEqual(nuevo.estado, 'pendiente')
+        self.assertNotEqual(nuevo.clave, trabajo.clave)
+
+    def test_la_version_no_depende_del_cache(self):
+        self.client.force_login(self.admin)
+        self.client.get(self.url)
+        trabajo = TrabajoExportacion.objects.get()
+        # Otro proceso, con su propio caché, calcula la misma clave y ve los cambios hechos en este
+        cache.clear()
+        self.assertEqual(clave_exportacion(trabajo.tipo, trabajo.parametros), trabajo.clave)
+        self.inscribir(1)
+        cache.clear()
+        self.assertNotEqual(clave_exportacion(trabajo.tipo, trabajo.parametros), trabajo.clave)
+
+    def test_retoma_trabajos_con_la_reserva_vencida(self):
+        self.client.force_login(self.admin)
+        self.client.get(self.url)
+        trabajo = tomar_siguiente()
+        self.assertIsNone(tomar_siguiente())
+
+        # El worker murió sin terminarlo: al vencer la reserva otro lo toma
+        TrabajoExportacion.objects.filter(pk=trabajo.pk).update(fecha_inicio=timezone.now() - RESERVA_TRABAJO)
+        self.assertEqual(procesar_pendientes(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+
+    def test_el_worker_limpia_periodicamente(self):
+        comando = 'principal.management.commands.exportaciones'
+        with patch(f'{comando}.limpiar_exportaciones', return_value=0) as limpiar, patch(f'{comando}.time') as reloj:
+            # Al iniciar, con la cola vacía antes de cumplirse el plazo y después
+            reloj.monotonic.side_effect = [0, 10, 4000, 4000, 4010]
+            reloj.sleep.side_effect = [None, None, KeyboardInterrupt]
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('exportaciones', '--limpieza', '3600', stdout=StringIO())
+        self.assertEqual(limpiar.call_count, 2)
+
+    def test_solo_quien_pidio_la_exportacion_puede_verla(self):
+        self.client.force_login(self.admin)
+        self.client.get(self.url)
+        trabajo = TrabajoExportacion.objects.get()
+
+        self.client.force_login(User.objects.create_user(username='curioso', password='clave-segura-123'))
+        self.assertEqual(self.client.get(reverse('principal:estado_exportacion', args=[trabajo.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('principal:descargar_exportacion', args=[trabajo.pk])).status_code, 404)
+
+
+class CursoAcademicoSeccionesTest(TestCase):
+    """
+    Las secciones del detalle del curso académico se recorren por cursor sin
+    repetir ni saltar filas y cada página cuesta las mismas consultas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.profesor = User.objects.create_user(username='profesor')
+        cls.curso = Curso.objects.create(name='Inglés', teacher=cls.profesor, curso_academico=cls.curso_academico)
+        cls.matriculas = [
+            Matriculas.objects.create(
+                course=cls.curso, student=User.objects.create_user(username=f'alumno{i}'),
+                curso_academico=cls.curso_academico,
+            )
+            for i in range(7)
+        ]
+        importar_notas(cls.curso, {matricula.pk: 60 + i for i, matricula in enumerate(cls.matriculas)})
+        importar_notas(cls.curso, {cls.matriculas[0].pk: 100})
+        for dia in (1, 2):
+            registrar_asistencias(cls.curso, date(2025, 3, dia), {m.student_id: True for m in cls.matriculas})
+        cls.secretaria = User.objects.create_user(username='secretaria')
+        cls.secretaria.groups.set([Group.objects.create(name='Secretaria')])
+
+    def setUp(self):
+        self.client.force_login(self.secretaria)
+
+    def recorrer(self, seccion, **filtros):
+        url = reverse('principal:principal_cursoacademico_seccion', args=[self.curso_academico.pk, seccion])
+        paginas, consultas = [], []
+        with patch('principal.secciones.TAMANO_PAGINA', 3):
+            response = self.client.get(url, filtros)
+            while True:
+                paginas.append(response.json())
+                if not paginas[-1]['siguiente']:
+                    break
+                with CaptureQueriesContext(connection) as capturadas:
+                    response = self.client.get(paginas[-1]['siguiente'])
+                consultas.append(len(capturadas))
+        return paginas, consultas
+
+    def test_asistencias_por_cursor(self):
+        paginas, consultas = self.recorrer('asistencias')
+        html = ''.join(pagina['html'] for pagina in paginas)
+
+        # 14 asistencias en páginas de 3, con la misma fecha repartida entre páginas
+        self.assertEqual(len(paginas), 5)
+        self.assertEqual(html.count('<tr>'), 14)
+        self.assertEqual(len(set(consultas)), 1)
+        for matricula in self.matriculas:
+            self.assertEqual(html.count(f'>{matricula.student.username}<'), 2)
+        self.assertLess(html.index('2 de marzo de 2025'), html.index('1 de marzo de 2025'))
+
+    def test_calificaciones_con_columnas_fijas(self):
+        paginas, consultas = self.recorrer('calificaciones')
+
+        self.assertEqual(len(set(consultas)), 1)
+        self.assertIn('Nota 2', paginas[0]['encabezado'])
+        self.assertNotIn('encabezado', paginas[1])
+        # La calificación con una sola nota completa la segunda columna con N/A
+        self.assertEqual(paginas[-1]['html'].count('N/A'), 1)
+
+        # La cantidad de columnas viaja en el cursor: las páginas siguientes no la recalculan
+        with CaptureQueriesContext(connection) as capturadas:
+            self.client.get(paginas[0]['siguiente'])
+        self.assertFalse(any('MAX(' in consulta['sql'] for consulta in capturadas))
+
+    def test_filtros_y_cursor_invalido(self):
+        detalle = self.client.get(reverse('principal:principal_cursoacademico_detail', args=[self.curso_academico.pk]))
+        self.assertContains(detalle, 'data-vacio=', count=3)
+        self.assertNotContains(detalle, 'alumno0 ')
+
+        paginas, _ = self.recorrer('matriculas', estudiante=self.matriculas[0].student_id)
+        self.assertEqual(paginas[0]['html'].count('<tr>'), 1)
+
+        url = reverse('principal:principal_cursoacademico_seccion', args=[self.curso_academico.pk, 'matriculas'])
+        self.assertEqual(self.client.get(url, {'cursor': 'alterado'}).status_code, 400)
+        url = reverse('principal:principal_cursoacademico_seccion', args=[self.curso_academico.pk, 'usuarios'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_solo_para_el_personal(self):
+        url = reverse('principal:principal_cursoacademico_seccion', args=[self.curso_academico.pk, 'calificaciones'])
+        self.client.force_login(self.matriculas[0].student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class IndicesConsultasFrecuentesTest(TestCase):
+    """
+    Ninguna de las consultas frecuentes recorre completa su tabla principal
+    (ver principal/planes.py) y la base de datos impide dos cursos académicos
+    activos a la vez.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        CursoAcademico.objects.bulk_create([CursoAcademico(nombre=f'20{i:02d}-20{i + 1:02d}') for i in range(10)])
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.profesor = User.objects.create_user(username='profesor')
+        estudiantes = [User.objects.create_user(username=f'alumno{i}') for i in range(20)]
+        categoria = Categoria.objects.create(nombre='General')
+        for i in range(20):
+            curso = Curso.objects.create(
+                name=f'Curso {i}', teacher=cls.profesor if i % 4 == 0 else estudiantes[i],
+                curso_academico=cls.curso_academico, status='I' if i % 2 else 'P',
+            )
+            formulario = FormularioAplicacion.objects.create(curso=curso, titulo=f'Formulario {i}')
+            for j, estudiante in enumerate(estudiantes[:10]):
+                Matriculas.objects.create(course=curso, student=estudiante, curso_academico=cls.curso_academico)
+                SolicitudInscripcion.objects.create(
+                    curso=curso, estudiante=estudiante, formulario=formulario,
+                    estado='pendiente' if j % 3 == 0 else 'aprobada',
+                )
+            for dia in range(1, 6):
+                registrar_asistencias(curso, date(2025, 3, dia), {e.pk: True for e in estudiantes[:10]})
+            Noticia.objects.create(
+                titulo=f'Noticia {i}', resumen='Resumen', contenido='Contenido', categoria=categoria,
+                autor=cls.profesor, estado='publicado' if i % 2 else 'borrador', destacada=i % 5 == 0,
+            )
+        cls.datos = {
+            'curso_academico': cls.curso_academico,
+            'curso': curso,
+            'profesor': cls.profesor,
+            'estudiante': estudiantes[0],
+            'fecha': date(2025, 3, 3),
+        }
+
+    def test_consultas_frecuentes_usan_indices(self):
+        for nombre, (consulta, modelos) in CONSULTAS_FRECUENTES.items():
+            with self.subTest(nombre):
+                self.assertEqual(recorridos_secuenciales(consulta(self.datos), modelos), [])
+
+    def test_un_solo_curso_academico_activo(self):
+        CursoAcademico.objects.create(nombre='2026-2027', activo=True)
+        self.assertEqual(list(CursoAcademico.objects.filter(activo=True).values_list('nombre', flat=True)), ['2026-2027'])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CursoAcademico.objects.filter(nombre='2025-2026').update(activo=True)
+
+
+class CambioCursoAcademicoTest(TestCase):
+    """
+    El cambio de curso académico activa el nuevo año, archiva el anterior y
+    copia cursos y matrículas aprobadas sin duplicar nada si se repite.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.origen = CursoAcademico.objects.create(nombre='2024-2025', activo=True)
+        cls.destino = CursoAcademico.objects.create(nombre='2025-2026')
+        profesor = User.objects.create_user(username='profesor')
+        cls.cursos = [
+            Curso.objects.create(name=f'Curso {i}', teacher=profesor, curso_academico=cls.origen, status='F')
+            for i in range(3)
+        ]
+
+    def matricular(self, cantidad, estado='A'):
+        inicio = User.objects.count()
+        for i in range(cantidad):
+            alumno = User.objects.create_user(username=f'alumno{inicio + i}')
+            Matriculas.objects.create(
+                course=self.cursos[i % 3], student=alumno, curso_academico=self.origen, estado=estado,
+            )
+
+    def cambiar(self):
+        avances = []
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = cambiar_curso_academico(self.destino, progreso=lambda hechas, total: avances.append((hechas, total)))
+        return resultado, len(consultas), avances
+
+    def test_cambio_y_repeticion(self):
+        self.matricular(4)
+        self.matricular(2, estado='R')
+        (cursos, matriculas), _, avances = self.cambiar()
+
+        self.assertEqual((cursos, matriculas), (3, 4))
+        self.assertEqual(avances, [(4, 4)])
+        self.assertEqual(curso_activo(), self.destino)
+        self.origen.refresh_from_db()
+        self.assertEqual((self.origen.activo, self.origen.archivado), (False, True))
+
+        nuevos = Curso.objects.filter(curso_academico=self.destino)
+        self.assertEqual(sorted(nuevos.values_list('name', 'status')), [(f'Curso {i}', 'I') for i in range(3)])
+        copiadas = Matriculas.objects.filter(curso_academico=self.destino)
+        self.assertEqual(set(copiadas.values_list('estado', flat=True)), {'P'})
+        self.assertFalse(copiadas.exclude(course__in=nuevos).exists())
+
+        # Repetir desde el mismo origen no crea nada nuevo
+        self.assertEqual(cambiar_curso_academico(self.destino, self.origen), (0, 0))
+        self.assertEqual(copiadas.count(), 4)
+
+    def test_consultas_no_dependen_de_las_matriculas(self):
+        self.matricular(3)
+        _, pocas, _ = self.cambiar()
+        Curso.objects.filter(curso_academico=self.destino).delete()
+        self.origen.activar()
+        self.matricular(30)
+        _, muchas, _ = self.cambiar()
+        self.assertEqual(pocas, muchas)
+
+    def test_promover_desde_el_admin_sin_duplicados(self):
+        self.matricular(3)
+        self.destino.activar()
+        admin = User.objects.create_superuser(username='admin', password='clave-segura-123')
+        self.client.force_login(admin)
+        url = reverse('admin:principal_matriculas_changelist')
+        seleccion = list(Matriculas.objects.values_list('pk', flat=True))
+        for _ in range(2):
+            response = self.client.post(url, {'action': 'promover_al_siguiente_curso', '_selected_action': seleccion})
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(Matriculas.objects.filter(curso_academico=self.destino).count(), 3)
+
+
+class TransicionesCursoTest(TestCase):
+    """
+    Las transiciones programadas cambian el estado de todos los cursos
+    vencidos con un UPDATE por regla y dejan registro de cada cambio.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        profesor = User.objects.create_user(username='profesor')
+        cls.hoy = date(2025, 3, 10)
+        datos = {
+            'abierto': (date(2025, 3, 20), date(2025, 4, 1)),
+            'vencido': (date(2025, 3, 1), date(2025, 4, 1)),
+            'iniciado': (date(2025, 3, 1), date(2025, 3, 10)),
+            'sin_fechas': (None, None),
+        }
+        # Se crean con fechas futuras para que el pre_save no los cambie todavía
+        with cls.captureOnCommitCallbacks(execute=True):
+            for nombre in datos:
+                Curso.objects.create(name=nombre, teacher=profesor, enrollment_deadline=date(2099, 1, 1))
+        for nombre, (limite, inicio) in datos.items():
+            Curso.objects.filter(name=nombre).update(enrollment_deadline=limite, start_date=inicio)
+
+    def estados(self):
+        return dict(Curso.objects.values_list('name', 'status'))
+
+    def test_aplica_las_reglas_en_orden_y_registra(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            resultado = aplicar_transiciones(self.hoy)
+        self.assertEqual(resultado, {'inscripcion_terminada': 2, 'curso_iniciado': 1})
+        # Por regla: selección de los cursos, UPDATE e INSERT del registro; al confirmar, la versión de las exportaciones
+        self.assertEqual(len([c for c in consultas if c['sql'].startswith(('UPDATE', 'INSERT'))]), 5)
+        self.assertEqual(self.estados(), {'abierto': 'I', 'vencido': 'IT', 'iniciado': 'P', 'sin_fechas': 'I'})
+        self.assertEqual(
+            sorted(TransicionCurso.objects.values_list('curso__name', 'estado_anterior', 'estado_nuevo')),
+            [('iniciado', 'I', 'IT'), ('iniciado', 'IT', 'P'), ('vencido', 'I', 'IT')],
+        )
+
+        # Una segunda ejecución no tiene nada que hacer
+        self.assertEqual(aplicar_transiciones(self.hoy), {'inscripcion_terminada': 0, 'curso_iniciado': 0})
+        self.assertEqual(TransicionCurso.objects.count(), 3)
+
+    def test_el_comando_aplica_las_transiciones(self):
+        salida = StringIO()
+        with patch('principal.transiciones.timezone.localdate', return_value=self.hoy):
+            call_command('transiciones_cursos', stdout=salida)
+        self.assertIn('inscripcion_terminada: 2 cursos', salida.getvalue())
+        self.assertEqual(self.estados()['iniciado'], 'P')
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0)
+class AplicarCursoTest(TestCase):
+    """
+    El envío de una solicitud valida las opciones con una consulta, guarda
+    todo en bloque y no deja nada a medias si alguna opción no es válida.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.estudiante = User.objects.create_user(username='estudiante', password='clave-segura-123')
+        profesor = User.objects.create_user(username='profesor')
+        cls.cursos = [Curso.objects.create(name=f'Curso {i}', teacher=profesor) for i in range(2)]
+
+    def crear_formulario(self, curso, por_tipo):
+        formulario = FormularioAplicacion.objects.create(curso=curso, titulo='Aplicación')
+        datos = {}
+        for orden in range(por_tipo):
+            for tipo in ('seleccion_multiple', 'seleccion_unica', 'escritura_libre'):
+                pregunta = PreguntaFormulario.objects.create(formulario=formulario, texto=tipo, tipo=tipo, orden=orden)
+                campo = f'pregunta_{pregunta.pk}'
+                if tipo == 'escritura_libre':
+                    datos[campo] = f'Respuesta {orden}'
+                    continue
+                opciones = [OpcionRespuesta.objects.create(pregunta=pregunta, texto=str(i), orden=i) for i in range(3)]
+                datos[campo] = [o.pk for o in opciones[:2]] if tipo == 'seleccion_multiple' else opciones[0].pk
+        return datos
+
+    def enviar(self, curso, datos):
+        self.client.force_login(self.estudiante)
+        url = reverse('principal:aplicar_curso', args=[curso.pk])
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(url, datos)
+        return response, len(consultas)
+
+    def test_consultas_no_dependen_de_las_preguntas(self):
+        response, pocas = self.enviar(self.cursos[0], self.crear_formulario(self.cursos[0], 1))
+        self.assertRedirects(response, reverse('principal:solicitud_enviada', args=[self.cursos[0].pk]), fetch_redirect_response=False)
+        _, muchas = self.enviar(self.cursos[1], self.crear_formulario(self.cursos[1], 5))
+        self.assertEqual(pocas, muchas)
+        # Sesión, usuario y comprobaciones previas, una validación, cuatro INSERT y la versión de las exportaciones
+        self.assertLessEqual(muchas, 18)
+
+        solicitud = SolicitudInscripcion.objects.get(curso=self.cursos[1])
+        self.assertEqual(solicitud.respuestas.count(), 15)
+        seleccionadas = RespuestaEstudiante.opciones_seleccionadas.through.objects.filter(respuestaestudiante__solicitud=solicitud)
+        # 5 preguntas con dos opciones y 5 con una
+        self.assertEqual(seleccionadas.count(), 15)
+        self.assertEqual(
+            sorted(solicitud.respuestas.exclude(texto_respuesta='').values_list('texto_respuesta', flat=True)),
+            [f'Respuesta {i}' for i in range(5)],
+        )
+
+    def test_los_textos_libres_no_crean_opciones(self):
+        datos = self.crear_formulario(self.cursos[0], 2)
+        opciones = OpcionRespuesta.objects.count()
+        self.enviar(self.cursos[0], datos)
+        self.assertEqual(OpcionRespuesta.objects.count(), opciones)
+        respuesta = RespuestaEstudiante.objects.get(pregunta__tipo='escritura_libre', pregunta__orden=1)
+        self.assertEqual(respuesta.resumen(), 'Respuesta 1')
+
+    def test_opcion_de_otra_pregunta_no_guarda_nada(self):
+        datos = self.crear_formulario(self.cursos[0], 1)
+        ajena = OpcionRespuesta.objects.exclude(pregunta__formulario__curso=self.cursos[0]).first() or OpcionRespuesta.objects.create(
+            pregunta=PreguntaFormulario.objects.create(
+                formulario=FormularioAplicacion.objects.create(curso=self.cursos[1], titulo='Otro'), texto='x',
+            ),
+        )
+        campo = next(campo for campo, valor in datos.items() if isinstance(valor, int))
+        datos[campo] = ajena.pk
+        response, _ = self.enviar(self.cursos[0], datos)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(SolicitudInscripcion.objects.exists())
+        self.assertFalse(RespuestaEstudiante.objects.exists())
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0)
+class EsquemaFormularioTest(TestCase):
+    """
+    El formulario de aplicación se arma desde el esquema en caché, sin
+    consultar preguntas ni opciones, y se renueva al cambiar una de ellas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.estudiante = User.objects.create_user(username='estudiante')
+        cls.curso = Curso.objects.create(name='Curso', teacher=User.objects.create_user(username='profesor'))
+        formulario = FormularioAplicacion.objects.create(curso=cls.curso, titulo='Aplicación')
+        for orden in range(10):
+            pregunta = PreguntaFormulario.objects.create(
+                formulario=formulario, texto=f'Pregunta {orden}', tipo='seleccion_multiple', orden=orden,
+            )
+            for i in range(4):
+                OpcionRespuesta.objects.create(pregunta=pregunta, texto=f'Opción {orden}.{i}', orden=i)
+
+    def setUp(self):
+        # Cada prueba revierte la fecha de modificación, pero no lo guardado en el caché
+        cache.clear()
+
+    def cargar(self):
+        self.client.force_login(self.estudiante)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('principal:aplicar_curso', args=[self.curso.pk]))
+        self.assertEqual(response.status_code, 200)
+        tablas = ('principal_preguntaformulario', 'principal_opcionrespuesta')
+        return response, [c['sql'] for c in consultas if any(tabla in c['sql'] for tabla in tablas)]
+
+    def test_sin_consultas_de_opciones_con_el_esquema_en_cache(self):
+        _, primera = self.cargar()
+        self.assertEqual(len(primera), 2)
+        response, segunda = self.cargar()
+        self.assertEqual(segunda, [])
+        self.assertContains(response, 'Opción 9.3')
+
+    def test_cambiar_una_opcion_renueva_el_esquema(self):
+        self.cargar()
+        opcion = OpcionRespuesta.objects.get(texto='Opción 4.2')
+        opcion.texto = 'Opción cambiada'
+        opcion.save()
+        response, consultas = self.cargar()
+        self.assertEqual(len(consultas), 2)
+        self.assertContains(response, 'Opción cambiada')
+
+        opcion.delete()
+        response, _ = self.cargar()
+        self.assertNotContains(response, 'Opción cambiada')
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0, ESTADISTICAS_CACHE_TIMEOUT=300)
+class EstadisticasSolicitudesTest(TestCase):
+    """
+    Los totales de solicitudes por estado salen de una consulta de agregación
+    por ámbito y el resumen del curso académico se invalida al cambiar una
+    solicitud.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.secretaria = User.objects.create_user(username='secretaria')
+        cls.secretaria.groups.add(Group.objects.create(name='Secretaria'))
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.profesor = User.objects.create_user(username='profesor')
+
+    def setUp(self):
+        cache.clear()
+
+    def crear_cursos(self, cantidad, estados=('pendiente', 'aprobada', 'rechazada', 'pendiente')):
+        for _ in range(cantidad):
+            curso = Curso.objects.create(name=f'Curso {Curso.objects.count()}', teacher=self.profesor, curso_academico=self.curso_academico)
+            formulario = FormularioAplicacion.objects.create(curso=curso, titulo='Aplicación')
+            for estado in estados:
+                estudiante = User.objects.create_user(username=f'estudiante{User.objects.count()}')
+                SolicitudInscripcion.objects.create(curso=curso, estudiante=estudiante, formulario=formulario, estado=estado)
+
+    def cargar(self, **filtros):
+        self.client.force_login(self.secretaria)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('principal:registro_respuestas_general'), filtros)
+        return response, len(consultas)
+
+    def test_consultas_no_dependen_de_los_cursos(self):
+        self.crear_cursos(1)
+        _, pocas = self.cargar()
+        cache.clear()
+        self.crear_cursos(5)
+        response, muchas = self.cargar()
+        self.assertEqual(pocas, muchas)
+
+        cursos = response.context['cursos']
+        self.assertEqual(len(cursos), 6)
+        self.assertEqual(
+            {(c.total_solicitudes, c.solicitudes_pendientes, c.solicitudes_aprobadas, c.solicitudes_rechazadas) for c in cursos},
+            {(4, 2, 1, 1)},
+        )
+        self.assertEqual(response.context['total_solicitudes'], 24)
+        self.assertEqual(response.context['solicitudes_pendientes'], 12)
+
+    def test_el_filtro_por_estado_no_altera_los_totales(self):
+        self.crear_cursos(1)
+        self.crear_cursos(1, estados=('pendiente',))
+        response, _ = self.cargar(estado='aprobada')
+        [curso] = response.context['cursos']
+        self.assertEqual((curso.total_solicitudes, curso.solicitudes_aprobadas), (4, 1))
+
+    def test_el_resumen_se_invalida_al_cambiar_una_solicitud(self):
+        self.crear_cursos(1)
+        self.cargar()
+        response, _ = self.cargar()
+        self.assertEqual(response.context['solicitudes_pendientes'], 2)
+
+        solicitud = SolicitudInscripcion.objects.filter(estado='pendiente').first()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            solicitud.rechazar(self.secretaria)
+            # Hasta el commit el resumen guardado sigue en el caché
+            self.assertEqual(self.cargar()[0].context['solicitudes_pendientes'], 2)
+        self.assertTrue(callbacks)
+        response, _ = self.cargar()
+        self.assertEqual(response.context['solicitudes_pendientes'], 1)
+        self.assertEqual(response.context['solicitudes_rechazadas'], 2)
+
+
+class MatrizRespuestasTest(TestCase):
+    """
+    La matriz de respuestas tiene una fila por solicitud y una columna por
+    pregunta y se arma con las mismas consultas sin importar cuántas haya.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.curso = Curso.objects.create(name='Inglés', teacher=User.objects.create_user(username='profesor'))
+        cls.formulario = FormularioAplicacion.objects.create(curso=cls.curso, titulo='Aplicación')
+        cls.multiple = PreguntaFormulario.objects.create(formulario=cls.formulario, texto='Horarios', tipo='seleccion_multiple', orden=0)
+        cls.unica = PreguntaFormulario.objects.create(formulario=cls.formulario, texto='Nivel', tipo='seleccion_unica', orden=1)
+        cls.libre = PreguntaFormulario.objects.create(formulario=cls.formulario, texto='Motivo', tipo='escritura_libre', orden=2)
+        cls.horarios = [OpcionRespuesta.objects.create(pregunta=cls.multiple, texto=t, orden=i) for i, t in enumerate(['Mañana', 'Tarde'])]
+        cls.nivel = OpcionRespuesta.objects.create(pregunta=cls.unica, texto='Básico')
+
+    def solicitar(self, nombre, **datos):
+        estudiante = User.objects.create_user(username=nombre.lower(), first_name=nombre, email=f'{nombre.lower()}@cfbc.cu')
+        post = QueryDict(mutable=True)
+        for campo, valor in datos.items():
+            post.setlist(campo, valor if isinstance(valor, list) else [valor])
+        preguntas = [self.multiple, self.unica, self.libre]
+        return enviar_solicitud(self.curso, estudiante, self.formulario, preguntas, post)
+
+    def filas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            columnas, filas = matriz_respuestas(self.curso)
+            filas = list(filas)
+        return len(consultas), columnas, filas
+
+    def test_una_fila_por_solicitud(self):
+        self.solicitar('Ana', **{
+            f'pregunta_{self.multiple.pk}': [str(o.pk) for o in reversed(self.horarios)],
+            f'pregunta_{self.unica.pk}': str(self.nivel.pk),
+            f'pregunta_{self.libre.pk}': 'Trabajo',
+        })
+        self.solicitar('Beto')
+        pocas, columnas, filas = self.filas()
+        for i in range(5):
+            self.solicitar(f'Carla{i}', **{f'pregunta_{self.unica.pk}': str(self.nivel.pk)})
+        muchas, _, todas = self.filas()
+
+        self.assertEqual(pocas, muchas)
+        self.assertEqual([c for c, _ in columnas][4:], ['Horarios', 'Nivel', 'Motivo'])
+        self.assertEqual(filas[0][:3], ['Ana', 'ana@cfbc.cu', 'Pendiente'])
+        self.assertEqual(filas[0][4:], ['Mañana, Tarde', 'Básico', 'Trabajo'])
+        # Como en el admin, las preguntas sin opción elegida ni texto quedan como 'Sin respuesta'
+        self.assertEqual(filas[1][4:], ['Sin respuesta'] * 3)
+        self.assertEqual(len(todas), 7)
+        self.assertEqual(todas[-1][4:], ['Sin respuesta', 'Básico', 'Sin respuesta'])
+
+    def test_exporta_a_csv(self):
+        self.solicitar('Ana', **{f'pregunta_{self.libre.pk}': 'Línea, con coma'})
+        destino = BytesIO()
+        escribir_csv(hoja_respuestas_curso(self.curso), destino)
+        lineas = destino.getvalue().decode('utf-8-sig').splitlines()
+        self.assertEqual(lineas[0], 'Estudiante,Email,Estado,Fecha Solicitud,Horarios,Nivel,Motivo')
+        self.assertTrue(lineas[1].endswith(',Sin respuesta,Sin respuesta,"Línea, con coma"'))
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0)
+class RevisionSolicitudesTest(TestCase):
+    """
+    Las solicitudes se aprueban o rechazan en bloque en una transacción, con
+    consultas constantes, y las notificaciones quedan en la bandeja de salida.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profesor = User.objects.create_user(username='profesor')
+        cls.profesor.groups.add(Group.objects.create(name='Profesores'))
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.curso = Curso.objects.create(name='Inglés', teacher=cls.profesor, curso_academico=cls.curso_academico)
+        cls.formulario = FormularioAplicacion.objects.create(curso=cls.curso, titulo='Aplicación')
+
+    def solicitudes(self, cantidad, curso=None):
+        curso = curso or self.curso
+        formulario = curso.formulario_aplicacion if curso != self.curso else self.formulario
+        inicio = User.objects.count()
+        return [
+            SolicitudInscripcion.objects.create(
+                curso=curso, formulario=formulario,
+                estudiante=User.objects.create_user(username=f'estudiante{inicio + i}', email=f'e{inicio + i}@cfbc.cu'),
+            )
+            for i in range(cantidad)
+        ]
+
+    def revisar(self, solicitudes, accion='aprobar'):
+        self.client.force_login(self.profesor)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(
+                reverse('principal:revisar_solicitudes'), {'accion': accion, 'solicitudes': [s.pk for s in solicitudes]},
+            )
+        self.assertRedirects(response, reverse('principal:solicitudes_list'), fetch_redirect_response=False)
+        return len(consultas)
+
+    def test_aprobar_en_bloque(self):
+        otro = User.objects.create_user(username='otro_profesor')
+        ajeno = Curso.objects.create(name='Francés', teacher=otro, curso_academico=self.curso_academico)
+        FormularioAplicacion.objects.create(curso=ajeno, titulo='Otra')
+        [solicitud_ajena] = self.solicitudes(1, ajeno)
+        propias = self.solicitudes(3)
+        # Una matrícula que ya existía no impide aprobar
+        Matriculas.objects.create(course=self.curso, student=propias[0].estudiante, curso_academico=self.curso_academico)
+
+        self.revisar(propias + [solicitud_ajena])
+
+        self.assertEqual(
+            set(SolicitudInscripcion.objects.values_list('pk', 'estado')),
+            {(s.pk, 'aprobada') for s in propias} | {(solicitud_ajena.pk, 'pendiente')},
+        )
+        self.assertEqual(Matriculas.objects.filter(course=self.curso, curso_academico=self.curso_academico).count(), 3)
+        self.assertEqual(CorreoPendiente.objects.filter(estado='pendiente').count(), 3)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(enviar_pendientes(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('ha sido aprobada', mail.outbox[0].subject)
+        self.assertFalse(CorreoPendiente.objects.filter(estado='pendiente').exists())
+
+    def test_consultas_no_dependen_de_la_cantidad(self):
+        pocas = self.revisar(self.solicitudes(2), 'rechazar')
+        muchas = self.revisar(self.solicitudes(20), 'rechazar')
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(SolicitudInscripcion.objects.filter(estado='rechazada').count(), 22)
+        self.assertFalse(Matriculas.objects.exists())
+
+    def test_solicitud_de_otro_profesor(self):
+        otro = User.objects.create_user(username='otro_profesor')
+        self.client.force_login(otro)
+        [solicitud] = self.solicitudes(1)
+        response = self.client.get(reverse('principal:aprobar_solicitud', args=[solicitud.pk]))
+        self.assertEqual(response.status_code, 403)
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado, 'pendiente')
+
+    def test_solicitud_ya_revisada(self):
+        self.client.force_login(self.profesor)
+        [solicitud] = self.solicitudes(1)
+        response = self.client.get(reverse('principal:aprobar_solicitud', args=[solicitud.pk]), follow=True)
+        self.assertEqual([str(m) for m in response.context['messages']], [f'La solicitud de {solicitud.estudiante.username} ha sido aprobada.'])
+
+        # Rechazarla después no la cambia ni encola otro correo
+        response = self.client.get(reverse('principal:rechazar_solicitud', args=[solicitud.pk]), follow=True)
+        [mensaje] = response.context['messages']
+        self.assertEqual(mensaje.level, messages.INFO)
+        self.assertIn('ya había sido revisada', str(mensaje))
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado, 'aprobada')
+        self.assertEqual(CorreoPendiente.objects.count(), 1)
+
+
+class BackendInestable(locmem.EmailBackend):
+    """Backend de prueba: cuenta las conexiones abiertas y rechaza los destinatarios 'falla@...'."""
+    conexiones = 0
+
+    def open(self):
+        BackendInestable.conexiones += 1
+        return super().open()
+
+    def send_messages(self, mensajes):
+        if any(destino.startswith('falla@') for mensaje in mensajes for destino in mensaje.to):
+            raise ConnectionError('Servidor no disponible')
+        return super().send_messages(mensajes)
+
+
+@override_settings(
+    CORREOS_BACKEND='principal.tests.BackendInestable', CORREOS_LOTE=2, CORREOS_MAX_INTENTOS=2, CORREOS_REINTENTO=60,
+)
+class BandejaSalidaTest(TestCase):
+    """
+    Los correos se encolan en lugar de enviarse en la petición y el worker los
+    envía por lotes, una conexión por lote, reintentando los que fallan.
+    """
+
+    def setUp(self):
+        BackendInestable.conexiones = 0
+
+    def test_restablecer_contrasena_encola_el_codigo(self):
+        User.objects.create_user(username='ana', email='ana@cfbc.cu')
+        response = self.client.post(reverse('principal:password_reset_request'), {'email': 'ana@cfbc.cu'})
+        self.assertRedirects(response, reverse('principal:password_reset_verify'), fetch_redirect_response=False)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(enviar_pendientes(), 1)
+        [correo] = mail.outbox
+        self.assertEqual(correo.to, ['ana@cfbc.cu'])
+        self.assertIn(self.client.session['reset_verification_code'], correo.body)
+
+    def test_una_conexion_por_lote(self):
+        encolar_correos([(f'e{i}@cfbc.cu', 'Aviso', 'Texto') for i in range(5)])
+        self.assertEqual(enviar_pendientes(), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(BackendInestable.conexiones, 3)
+        self.assertFalse(CorreoPendiente.objects.exclude(estado='enviado').exists())
+        # El cuerpo no se guarda una vez enviado
+        self.assertFalse(CorreoPendiente.objects.exclude(mensaje='').exists())
+
+    def test_reintentos_con_espera(self):
+        encolar_correos([('falla@cfbc.cu', 'Aviso', 'Texto'), ('ok@cfbc.cu', 'Aviso', 'Texto')])
+        self.assertEqual(enviar_pendientes(), 1)
+        fallido = CorreoPendiente.objects.get(destinatario='falla@cfbc.cu')
+        self.assertEqual((fallido.estado, fallido.intentos, fallido.error), ('pendiente', 1, 'Servidor no disponible'))
+        self.assertEqual(fallido.mensaje, 'Texto')
+        self.assertGreater(fallido.proximo_intento, timezone.now() + timedelta(seconds=50))
+
+        # Hasta que vence la espera no se vuelve a intentar
+        self.assertEqual(enviar_pendientes(), 0)
+        self.assertEqual(CorreoPendiente.objects.get(pk=fallido.pk).intentos, 1)
+
+        CorreoPendiente.objects.filter(pk=fallido.pk).update(proximo_intento=timezone.now())
+        enviar_pendientes()
+        fallido.refresh_from_db()
+        self.assertEqual((fallido.estado, fallido.intentos, fallido.mensaje), ('error', 2, ''))
+        self.assertEqual([correo.to for correo in mail.outbox], [['ok@cfbc.cu']])
+
+
+@override_settings(PORTADA_CACHE_TIMEOUT=300, CURSO_ACTIVO_CACHE_TIMEOUT=300)
+class PortadaCacheTest(TestCase):
+    """
+    La portada se sirve desde el caché: completa a los anónimos y solo los
+    carruseles a los autenticados. Las señales la invalidan.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.profesor = User.objects.create_user(username='profesor')
+        CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        Curso.objects.create(name='Inglés', teacher=self.profesor, curso_academico=curso_activo())
+
+    def test_anonimo_desde_cache(self):
+        self.assertContains(self.client.get(reverse('principal:home')), 'Inglés')
+        # Solo se lee la versión de la portada
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(reverse('principal:home')), 'Inglés')
+
+        # La versión está en la base de datos: otro proceso, con su propio caché, ve el cambio al confirmarse
+        with self.captureOnCommitCallbacks(execute=True):
+            curso = Curso.objects.create(name='Francés', teacher=self.profesor, curso_academico=curso_activo())
+        self.assertContains(self.client.get(reverse('principal:home')), 'Francés')
+        with self.captureOnCommitCallbacks(execute=True):
+            FormularioAplicacion.objects.create(curso=curso, titulo='Aplicación')
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('principal:home'))
+        self.assertGreater(len(consultas), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Noticia.objects.create(
+                titulo='Matrícula abierta', resumen='Resumen', contenido='Contenido', estado='publicado',
+                categoria=Categoria.objects.create(nombre='Avisos'), autor=self.profesor,
+            )
+        self.assertContains(self.client.get(reverse('principal:home')), 'Matrícula abierta')
+
+    def test_autenticado_comparte_carruseles(self):
+        self.client.get(reverse('principal:home'))
+        estudiante = User.objects.create_user(username='ana')
+        self.client.force_login(estudiante)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('principal:home'))
+        self.assertContains(response, 'Bienvenido ANA')
+        self.assertContains(response, 'Inglés')
+        self.assertFalse(any('blog_noticia' in consulta['sql'] for consulta in consultas))
+        self.assertFalse(any('principal_curso' in consulta['sql'] for consulta in consultas))
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0)
+class PerfilQueriesTest(TestCase):
+    """El panel de cada rol en el perfil se carga con consultas constantes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profesor = User.objects.create_user(username='profesor')
+        # Los usuarios nuevos entran al grupo Estudiantes (ver accounts/signals.py)
+        cls.profesor.groups.set([Group.objects.create(name='Profesores')])
+        cls.estudiante = User.objects.create_user(username='estudiante')
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+
+    def crear_cursos(self, cantidad):
+        for _ in range(cantidad):
+            numero = Curso.objects.count()
+            curso = Curso.objects.create(name=f'Curso {numero}', teacher=self.profesor, curso_academico=self.curso_academico)
+            formulario = FormularioAplicacion.objects.create(curso=curso, titulo='Aplicación')
+            Matriculas.objects.create(course=curso, student=self.estudiante, curso_academico=self.curso_academico)
+            # Los cursos pares quedan con la solicitud pendiente y los impares aprobada
+            SolicitudInscripcion.objects.create(
+                curso=curso, estudiante=self.estudiante, formulario=formulario,
+                estado='aprobada' if numero % 2 else 'pendiente', revisado_por=self.profesor if numero % 2 else None,
+            )
+
+    def consultas(self, usuario):
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('principal:profile'))
+        self.assertEqual(response.status_code, 200)
+        return len(consultas), response
+
+    def test_profesor(self):
+        self.crear_cursos(2)
+        pocas, _ = self.consultas(self.profesor)
+        self.crear_cursos(20)
+        muchas, response = self.consultas(self.profesor)
+        self.assertEqual(pocas, muchas)
+        self.assertEqual([curso.enrollment_count for curso in response.context['assigned_courses']], [1] * 22)
+        self.assertEqual(len(response.context['pending_solicitudes']), 11)
+        self.assertContains(response, 'Curso 20')
+
+    def test_estudiante(self):
+        self.crear_cursos(2)
+        pocas, _ = self.consultas(self.estudiante)
+        self.crear_cursos(20)
+        muchas, response = self.consultas(self.estudiante)
+        self.assertEqual(pocas, muchas)
+        pendientes, inscritos = response.context['pending_courses'], response.context['enrolled_courses']
+        self.assertEqual(len(pendientes), 11)
+        self.assertEqual({curso.solicitud_estado for curso in inscritos}, {'aprobada'})
+        self.assertEqual({curso.revisado_por for curso in inscritos}, {self.profesor})
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0)
+class LibroNotasTest(TestCase):
+    """El libro de notas de un curso se carga con consultas constantes, en HTML o en JSON por páginas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profesor = User.objects.create_user(username='profesor')
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.curso = Curso.objects.create(name='Inglés', teacher=cls.profesor, curso_academico=cls.curso_academico)
+        inactiva = Matriculas.objects.create(
+            course=cls.curso, student=User.objects.create_user(username='baja'), curso_academico=cls.curso_academico, activo=False,
+        )
+        importar_notas(cls.curso, {inactiva.pk: 2})
+
+    def matricular(self, cantidad):
+        inicio = User.objects.count()
+        matriculas = [
+            Matriculas.objects.create(
+                course=self.curso, curso_academico=self.curso_academico,
+                student=User.objects.create_user(username=f'e{inicio + i}', first_name='Estudiante', last_name=str(inicio + i)),
+            )
+            for i in range(cantidad)
+        ]
+        # Todos menos el último tienen dos notas; el primero, una tercera
+        importar_notas(self.curso, {m.pk: 4 for m in matriculas[:-1]})
+        importar_notas(self.curso, {m.pk: 5 for m in matriculas[:-1]})
+        importar_notas(self.curso, {matriculas[0].pk: 3})
+        return matriculas
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(consultas), response
+
+    def test_libro_del_curso(self):
+        url = reverse('principal:student_list_notas_by_course', args=[self.curso.pk])
+        matriculas = self.matricular(3)
+        pocas, response = self.consultas(url)
+        self.assertEqual(
+            [(fila['matricula_id'], fila['notas'], fila['average']) for fila in response.context['student_data']],
+            [
+                (matriculas[0].pk, [4, 5, 3], Decimal('4.0')),
+                (matriculas[1].pk, [4, 5, None], Decimal('4.5')),
+                (matriculas[2].pk, [None, None, None], None),
+            ],
+        )
+        self.matricular(6)
+        muchas, _ = self.consultas(url)
+        self.assertEqual(pocas, muchas)
+
+    def test_sin_curso(self):
+        self.matricular(2)
+        _, response = self.consultas(reverse('principal:student_list_notas'))
+        self.assertEqual(len(response.context['student_data']), 3)
+        self.assertContains(response, 'Inglés')
+
+    def test_json_por_paginas(self):
+        matriculas = self.matricular(3)
+        self.client.force_login(self.profesor)
+        url = reverse('principal:libro_notas', args=[self.curso.pk])
+        with patch('principal.secciones.TAMANO_PAGINA', 2):
+            primera = self.client.get(url).json()
+            segunda = self.client.get(primera['siguiente']).json()
+        self.assertEqual(primera['columnas'], 3)
+        self.assertEqual([fila['notas'] for fila in primera['filas']], [[4, 5, 3], [4, 5, None]])
+        self.assertEqual(segunda['filas'][0]['matricula_id'], matriculas[2].pk)
+        self.assertIsNone(segunda['siguiente'])
+        self.assertNotIn('columnas', segunda)
+
+    def test_json_solo_para_quien_gestiona_el_curso(self):
+        [matricula] = self.matricular(1)
+        url = reverse('principal:libro_notas', args=[self.curso.pk])
+        self.client.force_login(matricula.student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        secretaria = User.objects.create_user(username='secretaria')
+        secretaria.groups.set([Group.objects.create(name='Secretaria')])
+        self.client.force_login(secretaria)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CargaNotasTest(TestCase):
+    """La grilla de notas de un curso se valida entera y se guarda en bloque desde JSON, XLSX o CSV."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profesor = User.objects.create_user(username='profesor')
+        cls.curso_academico = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.curso = Curso.objects.create(name='Inglés', teacher=cls.profesor, curso_academico=cls.curso_academico)
+        cls.matriculas = [
+            Matriculas.objects.create(
+                course=cls.curso, curso_academico=cls.curso_academico, student=User.objects.create_user(username=f'e{i}'),
+            )
+            for i in range(3)
+        ]
+        importar_notas(cls.curso, {cls.matriculas[0].pk: 80, cls.matriculas[1].pk: 60})
+        importar_notas(cls.curso, {cls.matriculas[0].pk: 70})
+
+    def setUp(self):
+        self.client.force_login(self.profesor)
+        self.url = reverse('principal:cargar_notas', args=[self.curso.pk])
+
+    def notas(self):
+        return [
+            list(NotaIndividual.objects.filter(calificacion__matricula=m).order_by('id').values_list('valor', flat=True))
+            for m in self.matriculas
+        ]
+
+    def cargar_json(self, filas):
+        return self.client.post(
+            self.url, json.dumps({'filas': [{'matricula_id': m.pk, 'notas': notas} for m, notas in filas]}),
+            content_type='application/json',
+        )
+
+    def test_grilla_json(self):
+        m0, m1, m2 = self.matriculas
+        response = self.cargar_json([(m0, [90, None, 100]), (m1, [60, '75']), (m2, [None, 40])])
+        self.assertEqual(response.json(), {'creadas': 3, 'modificadas': 1})
+        self.assertEqual(self.notas(), [[90, 70, 100], [60, 75], [40]])
+        self.assertEqual(Calificaciones.objects.get(matricula=m0).average, Decimal('86.7'))
+        self.assertEqual(verificar_contadores(), [])
+
+    def test_nota_invalida_no_guarda_nada(self):
+        m0, m1, _ = self.matriculas
+        response = self.cargar_json([(m0, [95]), (m1, [60, 150])])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('columna 2', response.json()['error'])
+        self.assertEqual(self.notas(), [[80, 70], [60], []])
+
+    def test_filas_repetidas_o_notas_que_no_son_lista(self):
+        m0, m1, _ = self.matriculas
+        response = self.cargar_json([(m0, [95]), (m0, [40])])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('más de una vez', response.json()['error'])
+        response = self.cargar_json([(m1, '95')])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('lista', response.json()['error'])
+        self.assertEqual(self.notas(), [[80, 70], [60], []])
+
+    def test_xlsx_danado(self):
+        response = self.client.post(self.url, {'archivo': SimpleUploadedFile('notas.xlsx', b'no es un zip')}, follow=True)
+        self.assertContains(response, 'no es un XLSX válido')
+        self.assertEqual(self.notas(), [[80, 70], [60], []])
+
+    def test_csv_danado(self):
+        for contenido in (b'matricula_id\n"' + b'x' * 200000 + b'"\n', b'matricula_id,Nota 1\n1,\xff\n'):
+            response = self.client.post(self.url, {'archivo': SimpleUploadedFile('notas.csv', contenido)}, follow=True)
+            self.assertContains(response, 'no es un CSV válido')
+        self.assertEqual(self.notas(), [[80, 70], [60], []])
+
+    def test_archivo_csv(self):
+        m0, _, m2 = self.matriculas
+        contenido = f'matricula_id,Estudiante,Nota 1,Nota 2\n{m0.pk},e0,85,\n{m2.pk},e2,55,65\n'.encode('utf-8-sig')
+        response = self.client.post(self.url, {'archivo': SimpleUploadedFile('notas.csv', contenido)})
+        self.assertRedirects(
+            response, reverse('principal:student_list_notas_by_course', args=[self.curso.pk]), fetch_redirect_response=False,
+        )
+        self.assertEqual(self.notas(), [[85, 70], [60], [55, 65]])
+        self.assertEqual(verificar_contadores(), [])
+
+    def test_archivo_xlsx(self):
+        libro = openpyxl.Workbook()
+        libro.active.append(['matricula_id', 'Nota 1'])
+        libro.active.append([self.matriculas[1].pk, 61])
+        destino = BytesIO()
+        libro.save(destino)
+        self.client.post(self.url, {'archivo': SimpleUploadedFile('notas.xlsx', destino.getvalue())})
+        self.assertEqual(self.notas(), [[80, 70], [61], []])
+
+    def test_solo_el_profesor_del_curso(self):
+        self.client.force_login(User.objects.create_user(username='otro'))
+        self.assertEqual(self.cargar_json([(self.matriculas[0], [10])]).status_code, 403)
+
+
+@override_settings(ROLES_CACHE_TIMEOUT=0, CURSO_ACTIVO_CACHE_TIMEOUT=0)
+class HistorialEstudianteTest(TestCase):
+    """
+    El historial de un estudiante reúne todos sus cursos académicos con dos
+    consultas, se guarda en el caché y se invalida al cambiar sus notas,
+    asistencias o matrículas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profesor = User.objects.create_user(username='profesor', first_name='Ana', last_name='Pérez')
+        cls.profesor.groups.set([Group.objects.create(name='Profesores')])
+        cls.estudiante = User.objects.create_user(username='luis')
+        cls.anterior = CursoAcademico.objects.create(nombre='2024-2025')
+        cls.actual = CursoAcademico.objects.create(nombre='2025-2026', activo=True)
+        cls.ingles = cls.cursar('Inglés', cls.anterior, [60, 80], {date(2024, 3, 1): True, date(2024, 3, 2): False})
+        cls.ingles_matricula = Matriculas.objects.get(course=cls.ingles)
+        cls.ingles_matricula.estado = 'A'
+        cls.ingles_matricula.save()
+        cls.frances = cls.cursar('Francés', cls.actual, [90], {date(2025, 3, 1): True})
+
+    @classmethod
+    def cursar(cls, nombre, curso_academico, notas, asistencias):
+        curso = Curso.objects.create(name=nombre, teacher=cls.profesor, curso_academico=curso_academico)
+        matricula = Matriculas.objects.create(course=curso, student=cls.estudiante, curso_academico=curso_academico)
+        for nota in notas:
+            importar_notas(curso, {matricula.pk: nota})
+        for dia, presente in asistencias.items():
+            registrar_asistencias(curso, dia, {cls.estudiante.pk: presente})
+        return curso
+
+    def setUp(self):
+        cache.clear()
+
+    def test_agrupa_por_curso_academico_con_consultas_constantes(self):
+        with self.assertNumQueries(2):
+            historial = construir_historial(self.estudiante.pk)
+        anterior, actual = historial['anios']
+        self.assertEqual((anterior['curso_academico'], actual['curso_academico']), ('2024-2025', '2025-2026'))
+        [ingles] = anterior['cursos']
+        self.assertEqual((ingles['curso'], ingles['profesor'], ingles['notas']), ('Inglés', 'Ana Pérez', [60, 80]))
+        self.assertEqual((ingles['promedio'], ingles['porcentaje_asistencia']), (Decimal('70'), Decimal('50')))
+        self.assertEqual((anterior['aprobados'], actual['aprobados']), (1, 0))
+        # Los totales generales se ponderan por notas y asistencias, no por curso
+        self.assertEqual(historial['promedio'], Decimal('76.67'))
+        self.assertEqual(historial['porcentaje_asistencia'], Decimal('66.67'))
+
+        for i in range(3):
+            self.cursar(f'Curso {i}', self.actual, [50, 70], {date(2025, 4, 1): True})
+        with self.assertNumQueries(2):
+            historial = construir_historial(self.estudiante.pk)
+        self.assertEqual(historial['cantidad_cursos'], 5)
+
+    @override_settings(HISTORIAL_CACHE_TIMEOUT=300)
+    def test_cache_e_invalidacion(self):
+        def promedio_actual():
+            return historial_estudiante(self.estudiante.pk)['anios'][1]['promedio']
+
+        self.assertEqual(promedio_actual(), Decimal('90'))
+        with self.assertNumQueries(0):
+            historial_estudiante(self.estudiante.pk)
+
+        # Las operaciones en bloque invalidan a mano
+        importar_notas(self.frances, {Matriculas.objects.get(course=self.frances).pk: 70})
+        self.assertEqual(promedio_actual(), Decimal('80'))
+        registrar_asistencias(self.frances, date(2025, 3, 2), {self.estudiante.pk: False})
+        self.assertEqual(historial_estudiante(self.estudiante.pk)['porcentaje_asistencia'], Decimal('50'))
+
+        # Y las señales, al guardar o borrar de a uno
+        NotaIndividual.objects.filter(calificacion__course=self.frances, valor=70).delete()
+        self.assertEqual(promedio_actual(), Decimal('90'))
+        self.ingles_matricula.estado = 'R'
+        self.ingles_matricula.save()
+        self.assertEqual(historial_estudiante(self.estudiante.pk)['aprobados'], 0)
+
+    def test_vista_y_permisos(self):
+        url = reverse('principal:historico_alumno', args=[self.estudiante.pk])
+        self.client.force_login(self.estudiante)
+        response = self.client.get(url)
+        self.assertContains(response, 'Francés')
+        self.assertEqual(response.context['historial']['cantidad_cursos'], 2)
+
+        self.client.force_login(User.objects.create_user(username='otro'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.profesor)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_exportar_pdf(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.client.force_login(self.estudiante)
+        with override_settings(MEDIA_ROOT=media.name):
+            response = self.client.get(reverse('principal:historico_alumno', args=[self.estudiante.pk]) + '?formato=pdf')
+            trabajo = TrabajoExportacion.objects.get(tipo='historial_pdf')
+            self.assertRedirects(response, reverse('principal:exportacion', args=[trabajo.pk]))
+            self.assertEqual(procesar_pendientes(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+
+    @override_settings(HISTORIAL_CACHE_TIMEOUT=300)
+    def test_el_pdf_no_usa_el_cache(self):
+        # El caché del worker puede tener un historial que las señales de los procesos web no invalidaron
+        cache.set(clave_historial(self.estudiante.pk), {'anios': [], 'cantidad_cursos': 0})
+        with patch('principal.reportes.escribir_pdf') as escribir:
+            REPORTES['historial_pdf'].generar({'estudiante': self.estudiante.pk}, BytesIO(), None)
+        self.assertEqual(escribir.call_args.args[1]['historial']['cantidad_cursos'], 2)
+
+    def test_notas_del_curso_en_una_consulta(self):
+        url = reverse('principal:student_course_notes', args=[self.estudiante.pk, self.ingles.pk])
+        self.client.force_login(self.profesor)
+        response = self.client.get(url)
+        self.assertEqual([nota.valor for nota in response.context['all_notes']], [60, 80])
+        self.assertEqual(response.context['average_score'], 70)
@@ -0,0 +1,182 @@
+"""
+Cola de exportaciones en segundo plano.
+
+Las vistas de exportación ya no generan el archivo: `solicitar_exportacion`
+crea un TrabajoExportacion y el worker (`manage.py exportaciones`) lo procesa
+con el generador de `reportes.REPORTES`. El archivo se guarda en
+MEDIA_ROOT/exportaciones/ con el nombre de la clave del trabajo, que es un
+hash del tipo, los filtros y la versión de los datos; mientras los datos no
+cambien, un pedido idéntico reutiliza el archivo ya generado.
+
+La versión de los datos se guarda en la base de datos (ver versiones.py), para
+que todos los procesos la compartan, y se renueva con cada cambio en los
+modelos que aparecen en los reportes (ver signals.py).
+
+Un trabajo tomado queda reservado para su worker durante RESERVA_TRABAJO; si
+el worker muere sin terminarlo, otro lo vuelve a tomar al vencer la reserva.
+"""
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TrabajoExportacion
+from .reportes import REPORTES
+from .versiones import renovar_version, version
+
+logger = logging.getLogger(__name__)
+
+VERSION = 'exportaciones'
+
+# Tiempo que un trabajo tomado queda reservado para su worker
+RESERVA_TRABAJO = timedelta(minutes=30)
+
+
+def version_datos():
+    return version(VERSION)
+
+
+def invalidar_exportaciones():
+    """Marca los datos como modificados: las próximas exportaciones se generan de nuevo."""
+    renovar_version(VERSION)
+
+
+def clave_exportacion(tipo, parametros):
+    contenido = json.dumps({'tipo': tipo, 'parametros': parametros, 'version': version_datos()}, sort_keys=True)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _vigentes():
+    limite = timezone.now() - timedelta(seconds=settings.EXPORTACIONES_VIGENCIA)
+    return TrabajoExportacion.objects.filter(fecha_creacion__gte=limite)
+
+
+def _archivo_disponible(trabajo):
+    return bool(trabajo.archivo) and trabajo.archivo.storage.exists(trabajo.archivo.name)
+
+
+def _generado(clave):
+    """Trabajo vigente y completado con la misma clave cuyo archivo sigue en disco."""
+    for trabajo in _vigentes().filter(clave=clave, estado='completado'):
+        if _archivo_disponible(trabajo):
+            return trabajo
+    return None
+
+
+def _copiar_resultado(trabajo, origen):
+    trabajo.archivo = origen.archivo.name
+    trabajo.estado = 'completado'
+    trabajo.progreso = 100
+    trabajo.fecha_inicio = trabajo.fecha_inicio or timezone.now()
+    trabajo.fecha_fin = timezone.now()
+
+
+def solicitar_exportacion(tipo, parametros, usuario):
+    """
+    Devuelve el trabajo que atiende el pedido de `usuario`.
+
+    Si el mismo usuario ya tiene un trabajo vigente con la misma clave se
+    reutiliza; si otro usuario ya generó ese archivo se crea un trabajo nuevo
+    ya completado que apunta al mismo archivo. Los parámetros vacíos se
+    descartan para que '?curso=' y la ausencia del filtro den la misma clave.
+    """
+    reporte = REPORTES[tipo]
+    parametros = {clave: valor for clave, valor in parametros.items() if valor not in ('', None)}
+    clave = clave_exportacion(tipo, parametros)
+
+    propio = _vigentes().filter(clave=clave, solicitado_por=usuario).exclude(estado='error').first()
+    if propio and (propio.estado != 'completado' or _archivo_disponible(propio)):
+        return propio
+
+    trabajo = TrabajoExportacion(
+        tipo=tipo, parametros=parametros, clave=clave, solicitado_por=usuario,
+        nombre_archivo=reporte.nombre_archivo(parametros),
+    )
+    generado = _generado(clave)
+    if generado:
+        _copiar_resultado(trabajo, generado)
+    trabajo.save()
+    return trabajo
+
+
+def tomar_siguiente():
+    """
+    Marca como 'en_proceso' el trabajo pendiente más antiguo, o uno en proceso
+    cuya reserva venció, y lo devuelve (o None).
+    """
+    with transaction.atomic():
+        vencida = timezone.now() - RESERVA_TRABAJO
+        pendientes = TrabajoExportacion.objects.filter(
+            Q(estado='pendiente') | Q(estado='en_proceso', fecha_inicio__lt=vencida),
+        ).order_by('fecha_creacion')
+        if connection.features.has_select_for_update_skip_locked:
+            # Varios workers pueden tomar trabajos a la vez sin esperarse
+            pendientes = pendientes.select_for_update(skip_locked=True)
+        trabajo = pendientes.first()
+        if trabajo is None:
+            return None
+        trabajo.estado = 'en_proceso'
+        trabajo.fecha_inicio = timezone.now()
+        trabajo.save(update_fields=['estado', 'fecha_inicio'])
+    return trabajo
+
+
+def procesar(trabajo):
+    """Genera el archivo del trabajo, o reutiliza uno igual, y guarda el resultado."""
+    generado = _generado(trabajo.clave)
+    if generado:
+        _copiar_resultado(trabajo, generado)
+        trabajo.save()
+        return trabajo
+
+    reporte = REPORTES[trabajo.tipo]
+
+    def progreso(fraccion):
+        TrabajoExportacion.objects.filter(pk=trabajo.pk).update(progreso=min(int(fraccion * 100), 99))
+
+    try:
+        with tempfile.TemporaryFile() as archivo:
+            reporte.generar(trabajo.parametros, archivo, progreso)
+            archivo.seek(0)
+            nombre = f'{trabajo.clave}.{reporte.extension}'
+            trabajo.archivo.save(nombre, File(archivo), save=False)
+    except Exception as error:
+        logger.exception('Error al generar la exportación %s', trabajo.pk)
+        trabajo.estado = 'error'
+        trabajo.error = str(error)
+    else:
+        trabajo.estado = 'completado'
+        trabajo.progreso = 100
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save()
+    return trabajo
+
+
+def procesar_pendientes():
+    """Procesa trabajos hasta vaciar la cola; devuelve cuántos se procesaron."""
+    procesados = 0
+    while (trabajo := tomar_siguiente()) is not None:
+        procesar(trabajo)
+        procesados += 1
+    return procesados
+
+
+def limpiar_exportaciones():
+    """Borra los trabajos vencidos y los archivos que ya no usa ningún trabajo."""
+    limite = timezone.now() - timedelta(seconds=settings.EXPORTACIONES_VIGENCIA)
+    vencidos = TrabajoExportacion.objects.filter(fecha_creacion__lt=limite)
+    archivos = set(vencidos.exclude(archivo='').values_list('archivo', flat=True))
+    cantidad, _ = vencidos.delete()
+
+    en_uso = set(TrabajoExportacion.objects.filter(archivo__in=archivos).values_list('archivo', flat=True))
+    storage = TrabajoExportacion._meta.get_field('archivo').storage
+    for nombre in archivos - en_uso:
+        storage.delete(nombre)
+    return cantidad
@@ -0,0 +1,81 @@
+"""
+Transiciones programadas del estado de los cursos.
+
+Antes el estado solo cambiaba en el `pre_save` de Curso, así que un curso
+cuyo plazo de inscripción ya había vencido seguía apareciendo abierto hasta
+que alguien lo editaba. `aplicar_transiciones` recorre `REGLAS` en orden y
+aplica cada una con un solo UPDATE sobre todos los cursos que la cumplen,
+deja una TransicionCurso por curso afectado e invalida las exportaciones.
+Se ejecuta desde `manage.py transiciones_cursos`, una vez (cron) o en bucle.
+
+El `pre_save` de Curso sigue usando las mismas reglas con `estado_debido`,
+para que un curso editado a mano quede en el estado correcto sin esperar a
+la próxima ejecución.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Curso, TransicionCurso
+from .trabajos import invalidar_exportaciones
+
+
+class Regla:
+    """Pasa de `desde` a `hasta` los cursos que cumplen `condicion(hoy)`."""
+    def __init__(self, nombre, desde, hasta, condicion, vigente):
+        self.nombre = nombre
+        self.desde = desde
+        self.hasta = hasta
+        self.condicion = condicion
+        # La misma condición evaluada sobre una instancia, para el pre_save
+        self.vigente = vigente
+
+
+# En orden: un curso con el plazo vencido y la fecha de inicio alcanzada pasa
+# de 'I' a 'P' en una sola ejecución
+REGLAS = (
+    Regla(
+        'inscripcion_terminada', 'I', 'IT',
+        lambda hoy: Q(enrollment_deadline__lt=hoy),
+        lambda curso, hoy: curso.enrollment_deadline is not None and curso.enrollment_deadline < hoy,
+    ),
+    Regla(
+        'curso_iniciado', 'IT', 'P',
+        lambda hoy: Q(start_date__lte=hoy),
+        lambda curso, hoy: curso.start_date is not None and curso.start_date <= hoy,
+    ),
+)
+
+
+def estado_debido(curso, hoy=None):
+    """Estado que le corresponde a la instancia según las reglas, sin guardarla."""
+    hoy = hoy or timezone.localdate()
+    estado = curso.status
+    for regla in REGLAS:
+        if estado == regla.desde and regla.vigente(curso, hoy):
+            estado = regla.hasta
+    return estado
+
+
+def aplicar_transiciones(hoy=None):
+    """
+    Aplica todas las transiciones vencidas. Devuelve {nombre de la regla:
+    cursos cambiados}.
+    """
+    hoy = hoy or timezone.localdate()
+    resultado = {}
+    with transaction.atomic():
+        for regla in REGLAS:
+            pendientes = Curso.objects.filter(regla.condicion(hoy), status=regla.desde)
+            # Se bloquean las filas para que el registro coincida con lo que cambia el UPDATE
+            ids = list(pendientes.select_for_update().values_list('pk', flat=True))
+            if ids:
+                Curso.objects.filter(pk__in=ids).update(status=regla.hasta)
+                TransicionCurso.objects.bulk_create([
+                    TransicionCurso(curso_id=pk, regla=regla.nombre, estado_anterior=regla.desde, estado_nuevo=regla.hasta)
+                    for pk in ids
+                ])
+            resultado[regla.nombre] = len(ids)
+        if any(resultado.values()):
+            invalidar_exportaciones()
+    return resultado
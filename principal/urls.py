@@ -11,6 +11,7 @@ urlpatterns = [
     path('usuarios-registrados/', views.UsuariosRegistradosView.as_view(), name='usuarios_registrados'),
     path('test-usuarios/', views.UsuariosRegistradosView.as_view(), name='test_usuarios'),
     path('admin/principal/cursoacademico/<int:pk>/detail/', views.CursoAcademicoDetailView.as_view(), name='principal_cursoacademico_detail'),
+    path('admin/principal/cursoacademico/<int:pk>/detail/<str:seccion>/', views.CursoAcademicoSeccionView.as_view(), name='principal_cursoacademico_seccion'),
     path('', views.HomeView.as_view(), name='home'),
     path('listado_cursos/', views.ListadoCursosView.as_view(), name='listado_cursos'),
     path('login_redirect/', views.LoginRedirectView.as_view(), name='login_redirect'),
@@ -31,6 +32,8 @@ urlpatterns = [
     path('cursos/editar/<int:pk>/', views.CourseUpdateView.as_view(), name='editar_curso'),
     path('cursos/eliminar/<int:curso_id>/', views.eliminar_curso, name='eliminar_curso'),
     path('cursos/<int:course_id>/', views.StudentListNotasView.as_view(), name='student_list_notas_by_course'),
+    path('cursos/<int:course_id>/notas/', views.LibroNotasView.as_view(), name='libro_notas'),
+    path('cursos/<int:course_id>/notas/cargar/', views.cargar_notas, name='cargar_notas'),
     path('matricula/<int:matricula_id>/add_nota/', views.AddNotaView.as_view(), name='add_nota'),
     path('cursos/<int:course_id>/asistencias/', views.AsistenciaView.as_view(), name='asistencias'),
     path('student/<int:student_id>/course/<int:course_id>/attendances/', views.StudentCourseAttendanceView.as_view(), name='student_course_attendances'),
@@ -45,6 +48,9 @@ urlpatterns = [
     path('matriculas/export-excel/', views.export_matriculas_excel, name='export_matriculas_excel'),
     
     path('export-usuarios-excel/', views.export_usuarios_excel, name='export_usuarios_excel'),
+    path('exportaciones/<int:pk>/', views.exportacion, name='exportacion'),
+    path('exportaciones/<int:pk>/estado/', views.estado_exportacion, name='estado_exportacion'),
+    path('exportaciones/<int:pk>/descargar/', views.descargar_exportacion, name='descargar_exportacion'),
     path('verify_email/', views.verify_email, name='verify_email'),
     
     # Rutas para el sistema de formularios de aplicación a cursos
@@ -66,6 +72,7 @@ urlpatterns = [
     path('solicitudes/<int:pk>/', views.SolicitudInscripcionDetailView.as_view(), name='solicitud_detail'),
     path('solicitudes/<int:pk>/aprobar/', views.aprobar_solicitud, name='aprobar_solicitud'),
     path('solicitudes/<int:pk>/rechazar/', views.rechazar_solicitud, name='rechazar_solicitud'),
+    path('solicitudes/revisar/', views.revisar_solicitudes_en_bloque, name='revisar_solicitudes'),
     
     # Rutas para recuperación de contraseña
     path('password-reset/', views.password_reset_request, name='password_reset_request'),
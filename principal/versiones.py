@@ -0,0 +1,61 @@
+"""
+Versiones de datos compartidas por todos los procesos.
+
+Los cachés que se invalidan cambiando una versión (las exportaciones, la
+portada) la guardan en VersionDatos en lugar del caché de Django: con el caché
+local de cada proceso, la versión renovada en un worker no la veían los demás.
+`renovar_version` la incrementa al confirmarse la transacción de quien modifica
+los datos, con un UPDATE propio: la fila de la versión no queda bloqueada
+mientras dura esa transacción, así que los escritores de modelos distintos no
+se esperan entre sí.
+
+Las señales renuevan la versión por cada fila guardada; las operaciones que
+guardan muchas filas de una vez las envuelven en `agrupar_versiones()` para
+renovar cada versión una sola vez al final.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import VersionDatos
+
+_estado = threading.local()
+
+
+@contextmanager
+def agrupar_versiones():
+    """Acumula las versiones renovadas dentro del bloque y las renueva una vez, al confirmarse."""
+    if getattr(_estado, 'pendientes', None) is not None:
+        yield
+        return
+    _estado.pendientes = set()
+    try:
+        yield
+        pendientes = _estado.pendientes
+    finally:
+        _estado.pendientes = None
+    for nombre in sorted(pendientes):
+        renovar_version(nombre)
+
+
+def version(nombre):
+    """Versión actual de los datos `nombre` (0 si nunca cambiaron)."""
+    return VersionDatos.objects.filter(nombre=nombre).values_list('version', flat=True).first() or 0
+
+
+def renovar_version(nombre):
+    pendientes = getattr(_estado, 'pendientes', None)
+    if pendientes is not None:
+        pendientes.add(nombre)
+        return
+    transaction.on_commit(lambda: _incrementar(nombre))
+
+
+def _incrementar(nombre):
+    if not VersionDatos.objects.filter(nombre=nombre).update(version=F('version') + 1):
+        _, creada = VersionDatos.objects.get_or_create(nombre=nombre, defaults={'version': 1})
+        if not creada:
+            # Otro proceso la creó entre el UPDATE y el INSERT
+            VersionDatos.objects.filter(nombre=nombre).update(version=F('version') + 1)
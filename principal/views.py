@@ -1,36 +1,53 @@
+import json
 from typing import override
 from django.contrib.auth.forms import UserCreationForm
 from django.views import View
-from django.core.mail import send_mail
-from django.conf import settings
+from django.core.exceptions import PermissionDenied
 from django.views.generic import ListView, DetailView, TemplateView, CreateView, UpdateView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.urls import reverse_lazy, reverse
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_POST
 from django.contrib.auth import logout
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from .forms import (
     CustomUserCreationForm, CourseForm, CalificacionesForm, NotaIndividualFormSet,
     FormularioAplicacionForm, PreguntaFormularioForm, OpcionRespuestaForm,
     OpcionRespuestaFormSet, PreguntaFormularioFormSet, RespuestaEstudianteForm
 )
 from django.contrib.auth.models import Group, User
+from django.db import transaction
 from django.db.models import Q, Max
 from datetime import date, datetime
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from io import BytesIO
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from django.contrib.auth.views import redirect_to_login
+from django.core import signing
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.template.loader import render_to_string
 from accounts.models import Registro
-from blog.models import Noticia
+from . import contadores
+from .asistencias import MatrizAsistencias, eliminar_asistencias, registrar_asistencias
+from .calificaciones import columnas_notas, con_calificacion, filas_libro, guardar_grilla, leer_grilla, libro_notas
+from .catalogo import cursos_catalogo
+from .correos import encolar_correos
+from .cursos_academicos import curso_activo
+from .esquemas import preguntas_formulario
+from .historial import historial_estudiante
+from .perfil import datos_perfil
+from .portada import carruseles, pagina_anonima
+from .reportes import contexto_curso_academico
+from .roles import grupo_principal, pertenece_a
+from .secciones import SECCIONES, datos_cursor, paginar
+from .solicitudes import enviar_solicitud, revisar_solicitudes
+from .trabajos import solicitar_exportacion
+from .versiones import agrupar_versiones
 from .models import (
-    CursoAcademico, Curso, Matriculas, Calificaciones, Asistencia,
-    FormularioAplicacion, PreguntaFormulario, OpcionRespuesta, SolicitudInscripcion, RespuestaEstudiante
+    CursoAcademico, Curso, Matriculas, Calificaciones, NotaIndividual, Asistencia,
+    FormularioAplicacion, PreguntaFormulario, OpcionRespuesta, SolicitudInscripcion, RespuestaEstudiante,
+    TrabajoExportacion,
 )
 
 # Create your views here.
@@ -41,7 +58,7 @@ class UsuariosRegistradosView(LoginRequiredMixin, UserPassesTestMixin, ListView)
     context_object_name = 'registros'
 
     def test_func(self):
-        return self.request.user.groups.filter(name='Secretaria').exists()
+        return pertenece_a(self.request.user, 'Secretaria')
 
     def get_queryset(self):
         queryset = Registro.objects.all().select_related('user').prefetch_related('user__groups')
@@ -64,510 +81,164 @@ class UsuariosRegistradosView(LoginRequiredMixin, UserPassesTestMixin, ListView)
         return queryset
 
 
+def encolar_exportacion(request, tipo, parametros):
+    """Encola la exportación y lleva al usuario a la descarga o a la página de progreso."""
+    trabajo = solicitar_exportacion(tipo, parametros, request.user)
+    if trabajo.estado == 'completado':
+        return redirect('principal:descargar_exportacion', pk=trabajo.pk)
+    return redirect('principal:exportacion', pk=trabajo.pk)
+
+
+def _trabajo_del_usuario(request, pk):
+    trabajo = get_object_or_404(TrabajoExportacion, pk=pk)
+    # Los archivos pueden contener datos personales: solo los ve quien los pidió
+    if trabajo.solicitado_por_id != request.user.pk and not request.user.is_superuser:
+        raise Http404
+    return trabajo
+
+
 @login_required
-def export_usuarios_excel(request):
-    search_query = request.GET.get('search', '')
-    registros = Registro.objects.filter(user__groups__name='Estudiantes')
-
-    if search_query:
-        registros = registros.filter(
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(user__email__icontains=search_query) |
-            Q(carnet__icontains=search_query)
-        ).distinct()
+def exportacion(request, pk):
+    return render(request, 'exportacion_estado.html', {'trabajo': _trabajo_del_usuario(request, pk)})
 
-    context = {
-        'registros': registros
-    }
-    excel_file = generate_excel(context)
-    response = HttpResponse(excel_file.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="usuarios_registrados.xlsx"'
-    return response
 
 @login_required
-def export_matriculas_pdf(request):
-    curso_academico_id = request.GET.get('curso_academico')
-    curso_id = request.GET.get('curso')
-    student_id = request.GET.get('student')
+def estado_exportacion(request, pk):
+    trabajo = _trabajo_del_usuario(request, pk)
+    return JsonResponse({
+        'id': trabajo.pk,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'error': trabajo.error,
+        'descarga': reverse('principal:descargar_exportacion', args=[trabajo.pk]) if trabajo.estado == 'completado' else None,
+    })
 
-    matriculas = Matriculas.objects.all()
 
-    if curso_academico_id:
-        matriculas = matriculas.filter(course__curso_academico__id=curso_academico_id)
-    if curso_id:
-        matriculas = matriculas.filter(course__id=curso_id)
-    if student_id:
-        matriculas = matriculas.filter(student__id=student_id)
+@login_required
+def descargar_exportacion(request, pk):
+    trabajo = _trabajo_del_usuario(request, pk)
+    if trabajo.estado != 'completado' or not trabajo.archivo:
+        return redirect('principal:exportacion', pk=trabajo.pk)
+    return FileResponse(trabajo.archivo.open('rb'), as_attachment=True, filename=trabajo.nombre_archivo)
 
-    context = {
-        'matriculas': matriculas,
-        'curso_academico': CursoAcademico.objects.get(id=curso_academico_id) if curso_academico_id else None,
-    }
-    return render_to_pdf('matriculas_pdf.html', context)
 
 @login_required
-def export_matriculas_excel(request):
-    curso_academico_id = request.GET.get('curso_academico')
-    curso_id = request.GET.get('curso')
-    student_id = request.GET.get('student')
+def export_usuarios_excel(request):
+    return encolar_exportacion(request, 'usuarios_excel', {'search': request.GET.get('search', '')})
 
-    matriculas = Matriculas.objects.all()
 
-    if curso_academico_id:
-        matriculas = matriculas.filter(course__curso_academico__id=curso_academico_id)
-    if curso_id:
-        matriculas = matriculas.filter(course__id=curso_id)
-    if student_id:
-        matriculas = matriculas.filter(student__id=student_id)
+def _parametros_matriculas(request):
+    return {clave: request.GET.get(clave) for clave in ('curso_academico', 'curso', 'student')}
 
-    context = {
-        'matriculas': matriculas,
-        'curso_academico': CursoAcademico.objects.get(id=curso_academico_id) if curso_academico_id else None,
-    }
-    
-    # Generar el archivo Excel
-    output = generate_excel(context)
-    response = HttpResponse(output.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=matriculas.xlsx'
-    return response
-
-# Función auxiliar para generar PDF
-def render_to_pdf(template_src, context_dict={}):
-    template = get_template(template_src)
-    html = template.render(context_dict)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-    if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
-    return None
-
-# Función auxiliar para generar Excel
-def generate_excel(context_dict={}):
-    # Crear un nuevo libro de Excel
-    wb = openpyxl.Workbook()
-    
-    # Estilos para el Excel
-    header_font = Font(name='Arial', bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center')
-    border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    
-    # Obtener datos del contexto
-    curso_academico = context_dict.get('curso_academico')
-    cursos = context_dict.get('cursos', [])
-    matriculas = context_dict.get('matriculas', [])
-    calificaciones = context_dict.get('calificaciones', [])
-    asistencias = context_dict.get('asistencias', [])
-    registros = context_dict.get('registros', []) # Añadir registros al contexto
-    
-    # Hoja de información general
-    if curso_academico:
-        ws_info = wb.active
-        ws_info.title = "Información General"
-        ws_info['A1'] = f"Curso Académico: {curso_academico.nombre}"
-        ws_info['A2'] = f"Activo: {'Sí' if curso_academico.activo else 'No'}"
-        ws_info['A3'] = f"Archivado: {'Sí' if curso_academico.archivado else 'No'}"
-        ws_info['A4'] = f"Fecha de Creación: {curso_academico.fecha_creacion}"
-    else:
-        # Remove the default active sheet if no curso_academico is provided
-        if 'Sheet' in wb.sheetnames:
-            std = wb['Sheet']
-            wb.remove(std)
-    
-    # Hoja de cursos
-    if cursos:
-        ws_cursos = wb.create_sheet(title="Cursos")
-        # Encabezados
-        headers = ["Nombre del Curso", "Profesor", "Estado"]
-        for col_num, header in enumerate(headers, 1):
-            cell = ws_cursos.cell(row=1, column=col_num, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Datos
-        for row_num, curso in enumerate(cursos, 2):
-            ws_cursos.cell(row=row_num, column=1, value=curso.name)
-            ws_cursos.cell(row=row_num, column=2, value=curso.teacher.get_full_name() or curso.teacher.username)
-            ws_cursos.cell(row=row_num, column=3, value=curso.get_status_display())
-            
-            # Aplicar bordes a todas las celdas
-            for col_num in range(1, 4):
-                ws_cursos.cell(row=row_num, column=col_num).border = border
-        
-        # Ajustar ancho de columnas
-        for col in ws_cursos.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            adjusted_width = (max_length + 2)
-            ws_cursos.column_dimensions[column].width = adjusted_width
-    
-    # Hoja de matrículas
-    if matriculas:
-        ws_matriculas = wb.create_sheet(title="Matrículas")
-        # Encabezados
-        headers = ["Estudiante", "Curso Académico", "Curso", "Fecha Matrícula", "Estado Matrícula"]
-        for col_num, header in enumerate(headers, 1):
-            cell = ws_matriculas.cell(row=1, column=col_num, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Datos
-        for row_num, matricula in enumerate(matriculas, 2):
-            ws_matriculas.cell(row=row_num, column=1, value=matricula.student.get_full_name() or matricula.student.username)
-            ws_matriculas.cell(row=row_num, column=2, value=matricula.course.curso_academico.nombre if matricula.course and matricula.course.curso_academico else 'N/A')
-            ws_matriculas.cell(row=row_num, column=3, value=matricula.course.name if matricula.course else 'N/A')
-            ws_matriculas.cell(row=row_num, column=4, value=matricula.fecha_matricula.strftime('%d/%m/%Y') if matricula.fecha_matricula else 'N/A')
-            ws_matriculas.cell(row=row_num, column=5, value=matricula.get_estado_display())
-            
-            # Aplicar bordes a todas las celdas
-            for col_num in range(1, 6):
-                ws_matriculas.cell(row=row_num, column=col_num).border = border
-        
-        # Ajustar ancho de columnas
-        for col in ws_matriculas.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            adjusted_width = (max_length + 2)
-            ws_matriculas.column_dimensions[column].width = adjusted_width
 
-    
-    # Hoja de calificaciones
-    if calificaciones:
-        ws_calificaciones = wb.create_sheet(title="Calificaciones")
-        
-        # Determinar el número máximo de notas individuales
-        max_notas = 0
-        for calificacion in calificaciones:
-            num_notas = calificacion.notas.count()
-            if num_notas > max_notas:
-                max_notas = num_notas
-        
-        # Crear encabezados dinámicos
-        headers = ["Estudiante", "Curso"]
-        for i in range(1, max_notas + 1):
-            headers.append(f"Nota {i}")
-        headers.append("Promedio")
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws_calificaciones.cell(row=1, column=col_num, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Datos
-        for row_num, calificacion in enumerate(calificaciones, 2):
-            # Información básica
-            ws_calificaciones.cell(row=row_num, column=1, value=calificacion.student.get_full_name() or calificacion.student.username)
-            ws_calificaciones.cell(row=row_num, column=2, value=calificacion.course.name)
-            
-            # Notas individuales
-            notas_individuales = list(calificacion.notas.all().order_by('fecha_creacion'))
-            for i, nota in enumerate(notas_individuales, 3):
-                ws_calificaciones.cell(row=row_num, column=i, value=nota.valor)
-            
-            # Rellenar con N/A las notas que no existen
-            for i in range(len(notas_individuales) + 3, max_notas + 3):
-                ws_calificaciones.cell(row=row_num, column=i, value='N/A')
-            
-            # Promedio
-            ws_calificaciones.cell(row=row_num, column=max_notas + 3, value=calificacion.average if calificacion.average is not None else 'N/A')
-            
-            # Aplicar bordes a todas las celdas
-            for col_num in range(1, max_notas + 4):
-                ws_calificaciones.cell(row=row_num, column=col_num).border = border
-        
-    # Hoja de usuarios registrados
-    if registros:
-        ws_usuarios = wb.create_sheet(title="Usuarios Registrados")
-        # Encabezados
-        headers = [
-            "Nombre", "Apellidos", "Email", "Nacionalidad", "Carnet ID", "Carnet Disponible", "Sexo",
-            "Dirección", "Municipio", "Provincia", "Movil", "Grado Académico",
-            "Ocupación", "Título", "Título Disponible", "Grupo", "Fecha de Registro"
-        ]
-        for col_num, header in enumerate(headers, 1):
-            cell = ws_usuarios.cell(row=1, column=col_num, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Datos
-        for row_num, registro in enumerate(registros, 2):
-            ws_usuarios.cell(row=row_num, column=1, value=registro.user.first_name)
-            ws_usuarios.cell(row=row_num, column=2, value=registro.user.last_name)
-            ws_usuarios.cell(row=row_num, column=3, value=registro.user.email)
-            ws_usuarios.cell(row=row_num, column=4, value=registro.nacionalidad)
-            ws_usuarios.cell(row=row_num, column=5, value=registro.carnet)
-            ws_usuarios.cell(row=row_num, column=6, value="Sí" if registro.foto_carnet else "No")
-            ws_usuarios.cell(row=row_num, column=7, value=registro.sexo)
-            ws_usuarios.cell(row=row_num, column=8, value=registro.address)
-            ws_usuarios.cell(row=row_num, column=9, value=registro.location)
-            ws_usuarios.cell(row=row_num, column=10, value=registro.provincia)
-            ws_usuarios.cell(row=row_num, column=11, value=registro.movil)
-            ws_usuarios.cell(row=row_num, column=12, value=registro.get_grado_display())
-            ws_usuarios.cell(row=row_num, column=13, value=registro.get_ocupacion_display())
-            ws_usuarios.cell(row=row_num, column=14, value=registro.titulo)
-            ws_usuarios.cell(row=row_num, column=15, value="Sí" if registro.foto_titulo else "No")
-            ws_usuarios.cell(row=row_num, column=16, value=registro.user.groups.first().name if registro.user.groups.first() else '')
-            ws_usuarios.cell(row=row_num, column=17, value=registro.user.date_joined.strftime("%d/%m/%Y"))
-            
-            for col_num in range(1, len(headers) + 1):
-                ws_usuarios.cell(row=row_num, column=col_num).border = border
-        
-        # Ajustar ancho de columnas
-        for col in ws_usuarios.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            adjusted_width = (max_length + 2)
-            ws_usuarios.column_dimensions[column].width = adjusted_width
-
-    if calificaciones:
-        # Ajustar ancho de columnas
-        for col in ws_calificaciones.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            adjusted_width = (max_length + 2)
-            ws_calificaciones.column_dimensions[column].width = adjusted_width
-
-    # Hoja de asistencias
-    if asistencias:
-        ws_asistencias = wb.create_sheet(title="Asistencias")
-        # Encabezados
-        headers = ["Estudiante", "Curso", "Fecha", "Presente"]
-        for col_num, header in enumerate(headers, 1):
-            cell = ws_asistencias.cell(row=1, column=col_num, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-
-        # Datos
-        for row_num, asistencia in enumerate(asistencias, 2):
-            ws_asistencias.cell(row=row_num, column=1, value=asistencia.student.get_full_name() or asistencia.student.username)
-            ws_asistencias.cell(row=row_num, column=2, value=asistencia.course.name)
-            ws_asistencias.cell(row=row_num, column=3, value=asistencia.date.strftime('%d/%m/%Y') if asistencia.date else 'N/A')
-            ws_asistencias.cell(row=row_num, column=4, value='Sí' if asistencia.presente else 'No')
-
-            # Aplicar bordes a todas las celdas
-            for col_num in range(1, 5):
-                ws_asistencias.cell(row=row_num, column=col_num).border = border
-
-        # Ajustar ancho de columnas
-        for col in ws_asistencias.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            adjusted_width = (max_length + 2)
-            ws_asistencias.column_dimensions[column].width = adjusted_width
-
-    # Guardar el archivo en memoria
-    excel_file = BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
-
-    return excel_file
+@login_required
+def export_matriculas_pdf(request):
+    return encolar_exportacion(request, 'matriculas_pdf', _parametros_matriculas(request))
+
+
+@login_required
+def export_matriculas_excel(request):
+    return encolar_exportacion(request, 'matriculas_excel', _parametros_matriculas(request))
+
 
 class CursoAcademicoDetailView(DetailView):
     model = CursoAcademico
     template_name = 'curso_academico_detail.html'
     context_object_name = 'curso_academico'
 
+    def get(self, request, *args, **kwargs):
+        # ?pdf y ?excel se generan en segundo plano con el worker de exportaciones
+        formato = next((formato for formato in ('pdf', 'excel') if formato in request.GET), None)
+        if formato is None:
+            return super().get(request, *args, **kwargs)
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        curso_academico = self.get_object()
+        parametros = {
+            'pk': curso_academico.pk,
+            'curso': request.GET.get('curso'),
+            'estudiante': request.GET.get('estudiante'),
+        }
+        return encolar_exportacion(request, f'curso_academico_{formato}', parametros)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        curso_academico = self.get_object()
-        
-        # Obtener los filtros de la URL
-        curso_id = self.request.GET.get('curso')
-        estudiante_id = self.request.GET.get('estudiante')
-        
-        # Filtrar cursos
-        cursos = Curso.objects.filter(matriculas__curso_academico=curso_academico).distinct()
-        if curso_id:
-            cursos = cursos.filter(id=curso_id)
-        context['cursos'] = cursos
-        
-        # Filtrar matrículas
-        matriculas = Matriculas.objects.filter(curso_academico=curso_academico)
-        if curso_id:
-            matriculas = matriculas.filter(course_id=curso_id)
-        if estudiante_id:
-            matriculas = matriculas.filter(student_id=estudiante_id)
-        context['matriculas'] = matriculas
-        
-        # Filtrar calificaciones
-        calificaciones = Calificaciones.objects.filter(curso_academico=curso_academico)
-        if curso_id:
-            calificaciones = calificaciones.filter(course_id=curso_id)
-        if estudiante_id:
-            calificaciones = calificaciones.filter(student_id=estudiante_id)
-        context['calificaciones'] = calificaciones
-        
-        # Filtrar asistencias
-        asistencias = Asistencia.objects.filter(course__matriculas__curso_academico=curso_academico).distinct()
-        if curso_id:
-            asistencias = asistencias.filter(course_id=curso_id)
-        if estudiante_id:
-            asistencias = asistencias.filter(student_id=estudiante_id)
-        context['asistencias'] = asistencias
-        
+        # Matrículas, calificaciones y asistencias se cargan aparte con CursoAcademicoSeccionView
+        cursos = contexto_curso_academico(self.object, self.request.GET)['cursos']
+        context['cursos'] = cursos.select_related('teacher')
+
         # Agregar listas para los selectores de filtro
-        context['cursos_disponibles'] = Curso.objects.filter(matriculas__curso_academico=curso_academico).distinct()
+        context['cursos_disponibles'] = Curso.objects.filter(matriculas__curso_academico=self.object).distinct()
         context['estudiantes_disponibles'] = User.objects.filter(
-            matriculas__curso_academico=curso_academico
+            matriculas__curso_academico=self.object
         ).distinct()
-        
+
         return context
-        
-    def render_to_response(self, context, **response_kwargs):
-        # Verificar si se solicita PDF
-        if 'pdf' in self.request.GET:
-            # Añadir fecha actual al contexto para el PDF
-            context['now'] = datetime.now()
-            # Crear un template para PDF basado en el mismo contexto
-            pdf = render_to_pdf('curso_academico_pdf.html', context)
-            if pdf:
-                response = HttpResponse(pdf, content_type='application/pdf')
-                filename = f"curso_academico_{context['curso_academico'].nombre}.pdf"
-                content = f"attachment; filename={filename}"
-                response['Content-Disposition'] = content
-                return response
-        # Verificar si se solicita Excel
-        elif 'excel' in self.request.GET:
-            # Generar archivo Excel
-            excel_file = generate_excel(context)
-            if excel_file:
-                response = HttpResponse(excel_file.getvalue(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                filename = f"curso_academico_{context['curso_academico'].nombre}.xlsx"
-                response['Content-Disposition'] = f'attachment; filename={filename}'
-                return response
-        # Si no se solicita PDF ni Excel, renderizar normalmente
-        return super().render_to_response(context, **response_kwargs)
+
+
+class CursoAcademicoSeccionView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    Una página de una sección del detalle del curso académico (matrículas,
+    calificaciones o asistencias) con los mismos filtros GET que el detalle.
+    Responde JSON con el HTML de las filas y la URL de la página siguiente.
+    Solo para el personal: staff, Secretaria y Administracion.
+    """
+    def test_func(self):
+        return self.request.user.is_staff or pertenece_a(self.request.user, 'Secretaria', 'Administracion')
+
+    def get(self, request, pk, seccion):
+        if seccion not in SECCIONES:
+            raise Http404
+        seccion = SECCIONES[seccion]
+        curso_academico = get_object_or_404(CursoAcademico, pk=pk)
+        queryset = seccion.preparar(contexto_curso_academico(curso_academico, request.GET)[seccion.clave])
+
+        cursor = request.GET.get('cursor')
+        try:
+            # Los datos de toda la sección se calculan con la primera página y luego vienen en el cursor
+            if cursor:
+                extra = datos_cursor(cursor) or {}
+            else:
+                extra = seccion.extra(queryset) if seccion.extra else {}
+            filas, siguiente = paginar(queryset, seccion.orden, cursor, datos=extra)
+        except signing.BadSignature:
+            return HttpResponseBadRequest('Cursor inválido')
+
+        contexto = {'filas': filas, **extra}
+        datos = {'html': render_to_string(seccion.plantilla, contexto, request), 'siguiente': None}
+        if seccion.encabezado and not cursor:
+            datos['encabezado'] = render_to_string(seccion.encabezado, contexto, request)
+        if siguiente:
+            parametros = request.GET.copy()
+            parametros['cursor'] = siguiente
+            datos['siguiente'] = f'{request.path}?{parametros.urlencode()}'
+        return JsonResponse(datos)
 
 
 class BaseContextMixin:
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        group_name = None
         if user.is_authenticated:
-            group = Group.objects.filter(user=user).first()
-            if group:
-                group_name = group.name
-            context['group_name'] = group_name
+            context['group_name'] = grupo_principal(user)
         return context
 
 
 class HomeView(BaseContextMixin, TemplateView):
     template_name = 'home.html'
 
+    @override
+    def get(self, request, *args, **kwargs):
+        # Con mensajes pendientes la página no es la compartida y no se guarda
+        if request.user.is_authenticated or len(messages.get_messages(request)):
+            return super().get(request, *args, **kwargs)
+        return pagina_anonima(lambda: super(HomeView, self).get(request, *args, **kwargs))
+
     @override
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-        if curso_academico_activo:
-            courses = Curso.objects.filter(curso_academico=curso_academico_activo)
-        else:
-            courses = Curso.objects.none()
-        
-        # Obtener todos los formularios de aplicación existentes
-        formularios = FormularioAplicacion.objects.all()
-        formularios_por_curso = {f.curso_id: f for f in formularios}
-        
-        # Asignar los formularios a los cursos
-        for curso in courses:
-            if curso.id in formularios_por_curso:
-                curso.formulario_aplicacion = formularios_por_curso[curso.id]
-            else:
-                curso.formulario_aplicacion = None
-        
-        # Group courses into chunks of four for the carousel
-        grouped_courses = [courses[i:i + 4] for i in range(0, len(courses), 4)]
-        context['grouped_courses'] = grouped_courses
-        
-        # Obtener las noticias publicadas más recientes
-        noticias = Noticia.objects.filter(estado='publicado').order_by('-fecha_publicacion')[:8]
-        
-        # Agrupar noticias en chunks de 4 para el carousel
-        grouped_noticias = [noticias[i:i + 4] for i in range(0, len(noticias), 4)]
-        context['grouped_noticias'] = grouped_noticias
-        student = self.request.user if self.request.user.is_authenticated else None
-        
-        # Crear conjuntos de IDs de cursos con solicitudes pendientes y rechazadas
-        cursos_con_solicitudes_pendientes = set()
-        cursos_con_solicitudes_rechazadas = set()
-        
-        if student:
-            # Obtener todos los IDs de cursos con solicitudes pendientes
-            cursos_con_solicitudes_pendientes = set(
-                SolicitudInscripcion.objects.filter(
-                    estudiante=student,
-                    estado='pendiente'
-                ).values_list('curso_id', flat=True)
-            )
-            
-            # Obtener todos los IDs de cursos con solicitudes rechazadas
-            cursos_con_solicitudes_rechazadas = set(
-                SolicitudInscripcion.objects.filter(
-                    estudiante=student,
-                    estado='rechazada'
-                ).values_list('curso_id', flat=True)
-            )
-            
-            print(f"DEBUG: Home - Cursos con solicitudes pendientes: {cursos_con_solicitudes_pendientes}")
-            print(f"DEBUG: Home - Cursos con solicitudes rechazadas: {cursos_con_solicitudes_rechazadas}")
-
-        for item in courses:
-            if student:
-                # Verificar si el estudiante está matriculado
-                item.is_enrolled = Matriculas.objects.filter(
-                    course=item, 
-                    student=student
-                ).exists()
-                
-                # Verificar si el estudiante tiene una solicitud pendiente para este curso
-                item.tiene_solicitud_pendiente = item.id in cursos_con_solicitudes_pendientes
-                
-                # Verificar si el estudiante tiene una solicitud rechazada para este curso
-                item.tiene_solicitud_rechazada = item.id in cursos_con_solicitudes_rechazadas
-                
-                if item.tiene_solicitud_pendiente:
-                    print(f"DEBUG: Home - Curso {item.name} (ID: {item.id}) tiene solicitud pendiente")
-                if item.tiene_solicitud_rechazada:
-                    print(f"DEBUG: Home - Curso {item.name} (ID: {item.id}) tiene solicitud rechazada")
-            else:
-                item.is_enrolled = False
-                item.tiene_solicitud_pendiente = False
-                item.tiene_solicitud_rechazada = False
-            
-            # Calcular el conteo de inscripciones
-            enrollment_count = Matriculas.objects.filter(course=item).count()
-            item.enrollment_count = enrollment_count
-            
-            # Ya no necesitamos este código porque los formularios se cargan en get_context_data
-
-        context['courses'] = courses
-        return context
+        # Carruseles de cursos y noticias ya renderizados, compartidos por todos los visitantes
+        context.update(carruseles())
         return context
 
 
@@ -583,73 +254,10 @@ class ListadoCursosView(BaseContextMixin, ListView):
 
     def get_queryset(self):
         # Obtener el CursoAcademico activo
-        curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-        if curso_academico_activo:
-            # Filtrar los cursos por el CursoAcademico activo
-            return Curso.objects.filter(curso_academico=curso_academico_activo)
-        return Curso.objects.none() # No mostrar cursos si no hay un CursoAcademico activo
-        
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        student = self.request.user if self.request.user.is_authenticated else None
-        
-        # Crear conjuntos de IDs de cursos con solicitudes pendientes y rechazadas
-        cursos_con_solicitudes_pendientes = set()
-        cursos_con_solicitudes_rechazadas = set()
-        
-        if student:
-            # Obtener todos los IDs de cursos con solicitudes pendientes
-            cursos_con_solicitudes_pendientes = set(
-                SolicitudInscripcion.objects.filter(
-                    estudiante=student,
-                    estado='pendiente'
-                ).values_list('curso_id', flat=True)
-            )
-            
-            # Obtener todos los IDs de cursos con solicitudes rechazadas
-            cursos_con_solicitudes_rechazadas = set(
-                SolicitudInscripcion.objects.filter(
-                    estudiante=student,
-                    estado='rechazada'
-                ).values_list('curso_id', flat=True)
-            )
-        
-        # Obtener todos los formularios de aplicación existentes
-        formularios = FormularioAplicacion.objects.all()
-        formularios_por_curso = {f.curso_id: f for f in formularios}
-        
-        # Procesar cada curso
-        for course in context['courses']:
-            if student:
-                # Verificar si el estudiante está matriculado
-                course.is_enrolled = Matriculas.objects.filter(
-                    course=course, 
-                    student=student
-                ).exists()
-                
-                # Verificar si el estudiante tiene una solicitud pendiente para este curso
-                course.tiene_solicitud_pendiente = course.id in cursos_con_solicitudes_pendientes
-                
-                # Verificar si el estudiante tiene una solicitud rechazada para este curso
-                course.tiene_solicitud_rechazada = course.id in cursos_con_solicitudes_rechazadas
-            else:
-                course.is_enrolled = False
-                course.tiene_solicitud_pendiente = False
-                course.tiene_solicitud_rechazada = False
-            
-            # Calcular el conteo de inscripciones
-            enrollment_count = Matriculas.objects.filter(course=course).count()
-            course.enrollment_count = enrollment_count
-            
-            # Asignar el formulario de aplicación si existe
-            if course.id in formularios_por_curso:
-                course.formulario_aplicacion = formularios_por_curso[course.id]
-            else:
-                course.formulario_aplicacion = None
-        
-        return context
-            
-        return context
+        curso_academico_activo = curso_activo()
+        # Cursos del año activo con inscripciones, estado de solicitud y formulario ya anotados
+        return cursos_catalogo(curso_academico_activo, self.request.user)
+
 
 # para cerrar sesion
 
@@ -725,21 +333,15 @@ def registro(request):
             
             request.session['temp_files'] = temp_files
 
-            # Enviar email
+            # Encolar el email; lo envía el worker `manage.py enviar_correos`
             email_text = 'Bienvenido al Centro Fray Bartolome de las Casas, para completar su registro ingrese el siguiente codigo : ' + verification_code
-            try:
-                send_mail(
-                    'Código de Verificación - Centro Fray Bartolome de las Casas',
-                    email_text,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user_creation_form.cleaned_data['email']],
-                    fail_silently=False,
-                )
-                # Redirigir a la página de verificación
-                return redirect('principal:verify_email')
-            except Exception as e:
-                print(f"Error al enviar email: {str(e)}")
-                messages.error(request, 'Error al enviar el código de verificación. Por favor, intente nuevamente más tarde.')
+            encolar_correos([(
+                user_creation_form.cleaned_data['email'],
+                'Código de Verificación - Centro Fray Bartolome de las Casas',
+                email_text,
+            )])
+            # Redirigir a la página de verificación
+            return redirect('principal:verify_email')
         else:
             # Mostrar solo errores específicos como mensajes, excepto email y carnet
             for field, errors in user_creation_form.errors.items():
@@ -800,17 +402,7 @@ def verify_email(request):
                 # Enviar correo de confirmación de registro
                 confirmation_subject = 'Registro Exitoso - Centro Fray Bartolome de las Casas'
                 confirmation_message = f'Usted se ha registrado satisfactoriamente. Su Nombre de Usuario es: {user.username}'
-                try:
-                    send_mail(
-                        confirmation_subject,
-                        confirmation_message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [user.email],
-                        fail_silently=False,
-                    )
-                except Exception as e:
-                    print(f"Error al enviar correo de confirmación: {str(e)}")
-                    # Considerar si se debe mostrar un mensaje de error al usuario o simplemente loguear
+                encolar_correos([(user.email, confirmation_subject, confirmation_message)])
 
                 return redirect('login')
             else:
@@ -832,7 +424,7 @@ class LoginRedirectView(LoginRequiredMixin, TemplateView):
     def get(self, request, *args, **kwargs):
         user = request.user
         if user.is_authenticated:
-            if user.groups.filter(name='Profesores').exists() or user.groups.filter(name='Administracion').exists() or user.groups.filter(name='Secretaria').exists():
+            if pertenece_a(user, 'Profesores', 'Administracion', 'Secretaria'):
                 return redirect('principal:profile')  # Redirige a la página de perfil del profesor o el admin
             else:
                 return redirect('principal:cursos')  # Redirige a la página de cursos para otros usuarios
@@ -851,74 +443,11 @@ class ProfileView(BaseContextMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
 
-        # Obtener el primer grupo del usuario de forma segura
-        user_group = user.groups.first()
-        group_name = user_group.name if user_group else None
-        
-        # Asegurar que group_name esté en el contexto (BaseContextMixin ya lo hace, pero por seguridad)
+        # El grupo del usuario ya se resolvió en BaseContextMixin
+        group_name = grupo_principal(user)
         context['group_name'] = group_name
-
-        if group_name == 'Profesores':
-            # Obtener todos los cursos asignados al profesor del curso académico activo
-            curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-            if curso_academico_activo:
-                assigned_courses = Curso.objects.filter(teacher=user, curso_academico=curso_academico_activo)
-            else:
-                assigned_courses = Curso.objects.none()
-            context['assigned_courses'] = assigned_courses
-            
-            # Obtener las solicitudes de inscripción pendientes para los cursos del profesor
-            pending_solicitudes = SolicitudInscripcion.objects.filter(
-                curso__teacher=user,
-                estado='pendiente'
-            ).order_by('-fecha_solicitud')
-            context['pending_solicitudes'] = pending_solicitudes
-        elif group_name == 'Estudiantes':
-            # Obtener los cursos en los que el estudiante está inscrito y que pertenecen al curso académico activo
-            curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-            if curso_academico_activo:
-                enrolled_courses = Curso.objects.filter(matriculas__student=user, curso_academico=curso_academico_activo)
-                
-                # Separar cursos por estado de solicitud
-                approved_courses = []
-                pending_courses = []
-                
-                # Para cada curso inscrito, obtener información adicional sobre solicitudes
-                for course in enrolled_courses:
-                    # Verificar si hay una solicitud de inscripción para este curso
-                    try:
-                        solicitud = SolicitudInscripcion.objects.get(
-                            estudiante=user,
-                            curso=course
-                        )
-                        course.solicitud_estado = solicitud.estado
-                        course.fecha_revision = solicitud.fecha_revision
-                        course.revisado_por = solicitud.revisado_por
-                        
-                        # Separar por estado solo para cursos en inscripción
-                        if course.status in ['I', 'IT'] and solicitud.estado == 'pendiente':
-                            pending_courses.append(course)
-                        else:
-                            approved_courses.append(course)
-                    except SolicitudInscripcion.DoesNotExist:
-                        course.solicitud_estado = None
-                        course.fecha_revision = None
-                        course.revisado_por = None
-                        approved_courses.append(course)
-                
-                context['enrolled_courses'] = approved_courses
-                context['pending_courses'] = pending_courses
-            else:
-                context['enrolled_courses'] = Curso.objects.none()
-                context['pending_courses'] = Curso.objects.none()
-        elif group_name in ['Administracion', 'Secretaria']:
-            curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-            if curso_academico_activo:
-                all_courses = Curso.objects.filter(curso_academico=curso_academico_activo)
-            else:
-                all_courses = Curso.objects.none()
-            context['all_courses'] = all_courses
-        
+        # Cursos, solicitudes y conteos del panel de cada rol, en consultas constantes
+        context.update(datos_perfil(user, group_name))
         return context
 
 # Vista de los Cursos
@@ -999,19 +528,14 @@ class StudentCourseAttendanceView(BaseContextMixin, ListView):
     context_object_name = 'asistencias'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        student_id = self.kwargs['student_id']
-        course_id = self.kwargs['course_id']
-        queryset = queryset.filter(student__id=student_id, course__id=course_id)
-        return queryset
+        return Asistencia.objects.filter(
+            student_id=self.kwargs['student_id'], course_id=self.kwargs['course_id'],
+        ).order_by('date', 'id')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        student_id = self.kwargs['student_id']
-        course_id = self.kwargs['course_id']
-        context['student'] = User.objects.get(id=student_id)
-        context['course'] = Curso.objects.get(id=course_id)
-        context['student'] = User.objects.get(id=student_id)
+        context['student'] = get_object_or_404(User, id=self.kwargs['student_id'])
+        context['course'] = get_object_or_404(Curso, id=self.kwargs['course_id'])
         return context
 
 
@@ -1059,9 +583,14 @@ class AsistenciasListView(ListView):
         estudiante_id = self.request.GET.get('estudiante')
         
         if curso_id and estudiante_id:
-            # Obtener todas las asistencias del estudiante en el curso
-            total_asistencias = Asistencia.objects.filter(course_id=curso_id, student_id=estudiante_id).count()
-            presentes = Asistencia.objects.filter(course_id=curso_id, student_id=estudiante_id, presente=True).count()
+            # Contadores precalculados en la matrícula del estudiante en el curso
+            # (si hay varias, todas cuentan las mismas asistencias del curso)
+            totales = Matriculas.objects.filter(course_id=curso_id, student_id=estudiante_id).aggregate(
+                total=Max('asistencias_registradas'),
+                presentes=Max('asistencias_presentes'),
+            )
+            total_asistencias = totales['total'] or 0
+            presentes = totales['presentes'] or 0
             
             if total_asistencias > 0:
                 porcentaje = (presentes / total_asistencias) * 100
@@ -1081,51 +610,21 @@ class StudentCourseNotesView(BaseContextMixin, ListView):
     context_object_name = 'calificaciones'
 
     def get_queryset(self):
-        student_id = self.kwargs['student_id']
-        course_id = self.kwargs['course_id']
-        # Filter grades for the specific student and course
-        return Calificaciones.objects.filter(student__id=student_id, course__id=course_id)
+        return Calificaciones.objects.filter(student_id=self.kwargs['student_id'], course_id=self.kwargs['course_id'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        student_id = self.kwargs['student_id']
-        course_id = self.kwargs['course_id']
-
-        student = User.objects.get(id=student_id)
-        course = Curso.objects.get(id=course_id)
-
-        context['student'] = student
-        context['course'] = course
+        context['student'] = get_object_or_404(User, id=self.kwargs['student_id'])
+        context['course'] = get_object_or_404(Curso, id=self.kwargs['course_id'])
 
-        print(f"[DEBUG] StudentCourseNotesView - student_id: {student_id}, course_id: {course_id}")
-
-        # Get all Calificaciones for the student and course
-        calificaciones_for_student_course = Calificaciones.objects.filter(
-            student=student,
-            course=course
-        )
-        print(f"[DEBUG] Calificaciones found: {calificaciones_for_student_course.count()}")
-
-        all_notes = []
-        total_score = 0
-        num_grades = 0
-
-        for calificacion in calificaciones_for_student_course:
-            print(f"[DEBUG] Processing Calificacion ID: {calificacion.id}")
-            for nota in calificacion.notas.all():
-                print(f"[DEBUG] Adding Nota: {nota.valor} (ID: {nota.id})")
-                all_notes.append(nota)
-                if nota.valor is not None:
-                    total_score += nota.valor
-                    num_grades += 1
-
-        if num_grades > 0:
-            average_score = total_score / num_grades
-        else:
-            average_score = 0
+        # Todas las notas del estudiante en el curso en una consulta, en lugar de una por calificación
+        all_notes = list(NotaIndividual.objects.filter(
+            calificacion__student_id=self.kwargs['student_id'], calificacion__course_id=self.kwargs['course_id'],
+        ).order_by('fecha_creacion', 'id'))
+        valores = [nota.valor for nota in all_notes if nota.valor is not None]
 
         context['all_notes'] = all_notes
-        context['average_score'] = average_score
+        context['average_score'] = sum(valores) / len(valores) if valores else 0
         return context
 
 
@@ -1135,36 +634,15 @@ class CoursesView(BaseContextMixin, TemplateView):
     @override
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-        if curso_academico_activo:
-            courses = Curso.objects.filter(curso_academico=curso_academico_activo)
-        else:
-            courses = Curso.objects.none()
+        curso_academico_activo = curso_activo()
         student = self.request.user if self.request.user.is_authenticated else None
 
-        for item in courses:
-            if student:
-                registration = Matriculas.objects.filter(
-                    course=item, student=student).first()
-                item.is_enrolled = registration is not None
-            else:
-                item.is_enrolled = False
-
-            # Calcular el conteo de inscripciones para todos los cursos
-            enrollment_count = Matriculas.objects.filter(course=item).count()
-            item.enrollment_count = enrollment_count
+        # Cursos con inscripciones, estado de solicitud y formulario ya anotados
+        courses = cursos_catalogo(curso_academico_activo, student)
 
         context['courses'] = courses
         # Asegurarse de que group_name esté en el contexto
-        user = self.request.user
-        if user.is_authenticated:
-            group = Group.objects.filter(user=user).first()
-            if group:
-                context['group_name'] = group.name
-            else:
-                context['group_name'] = None
-        else:
-            context['group_name'] = None
+        context['group_name'] = grupo_principal(self.request.user)
 
         return context
 
@@ -1179,7 +657,7 @@ class CourseCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         # Asigna el curso académico activo al curso
-        active_academic_course = CursoAcademico.objects.filter(activo=True).first()
+        active_academic_course = curso_activo()
         if active_academic_course:
             form.instance.curso_academico = active_academic_course
         messages.success(self.request, 'El Curso se guardo correctamente')
@@ -1205,7 +683,7 @@ def inscribirse_curso(request, curso_id):
 
     if not inscripcion_existente:
         # Obtener el curso académico activo
-        curso_academico = CursoAcademico.objects.filter(activo=True).first()
+        curso_academico = curso_activo()
         
         if not curso_academico:
             messages.error(request, 'No hay un curso académico activo configurado. Contacte al administrador.')
@@ -1263,7 +741,7 @@ class CourseUpdateView(BaseContextMixin, UpdateView):
 @login_required
 def eliminar_curso(request, curso_id):
     # Verificar si el usuario pertenece al grupo 'Secretaria'
-    if request.user.groups.filter(name='Secretaria').exists():
+    if pertenece_a(request.user, 'Secretaria'):
         try:
             # Obtener el curso
             curso = Curso.objects.get(id=curso_id)
@@ -1290,120 +768,106 @@ class StudentListNotasView(BaseContextMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related(
-            'student',
-            'course',
-            'course__teacher',
-            'calificaciones'
-        )
-
         # Verificar si se está accediendo desde la URL con course_id
         course_id = self.kwargs.get('course_id')
         if course_id:
-            queryset = queryset.filter(course__id=course_id)
-            return queryset
+            # Solo las matrículas activas del curso en el curso académico activo
+            self.course = get_object_or_404(Curso, id=course_id)
+            self.curso_academico = curso_activo()
+            queryset = libro_notas(self.course, self.curso_academico)
+        else:
+            queryset = con_calificacion(super().get_queryset()).select_related('student', 'course').order_by('id')
 
-        # Si no hay course_id en la URL, usar los filtros normales
         search_query = self.request.GET.get('search_query')
-        course_filter = self.request.GET.get('course')
-        teacher_filter = self.request.GET.get('teacher')
-
         if search_query:
             queryset = queryset.filter(
                 Q(student__username__icontains=search_query) |
                 Q(student__first_name__icontains=search_query) |
                 Q(student__last_name__icontains=search_query)
             )
-
-
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        course_id = self.kwargs.get('course_id')
-        if course_id:
-            course = get_object_or_404(Curso, id=course_id)
-            context['course'] = course
-
-            # Obtener el curso académico activo
-            curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-            context['curso_academico'] = curso_academico_activo
-
-            # Obtener solo las matrículas activas para este curso y curso académico activo
-            active_enrollments = Matriculas.objects.filter(
-                course=course,
-                activo=True,
-                curso_academico=curso_academico_activo
-            )
-
-            student_data = []
-            for enrollment in active_enrollments:
-                student = enrollment.student
-                # Buscar calificación por curso, estudiante y curso académico
-                calificacion = Calificaciones.objects.filter(
-                    course=course,
-                    student=student,
-                    curso_academico=curso_academico_activo
-                ).first()
-
-                all_notes = []
-                if calificacion:
-                    # Obtener todas las notas individuales relacionadas con esta calificación
-                    all_notes = list(calificacion.notas.all().order_by('fecha_creacion'))
-
-                student_data.append({
-                    'calificacion_id': calificacion.id if calificacion else None,
-                    'name': student.get_full_name(),
-                    'notas': all_notes, # Lista de notas individuales
-                    'average': calificacion.average if calificacion else None,
-                    'matricula_id': enrollment.id,
-                    'student_id': student.id, # Add student.id here
-                })
-            context['student_data'] = student_data
+        # Notas de las matrículas de la página con una consulta, columnas fijas para todo el listado
+        context['student_data'] = filas_libro(context['matriculas'], columnas_notas(self.object_list))
+        if self.kwargs.get('course_id'):
+            context['course'] = self.course
+            context['curso_academico'] = self.curso_academico
         else:
             context['courses'] = CursoAcademico.objects.all()
             context['teachers'] = User.objects.filter(groups__name='Docente')
-        
-        # Obtener el curso académico activo
-        curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-        
-        # Obtener solo las matrículas activas para este curso y curso académico activo
-        active_enrollments = Matriculas.objects.filter(
-            course=course, 
-            activo=True,
-            curso_academico=curso_academico_activo
-        )
-        
-        student_data = []
-        for enrollment in active_enrollments:
-            student = enrollment.student
-            # Buscar calificación por curso, estudiante y curso académico
-            calificacion = Calificaciones.objects.filter(
-                course=course, 
-                student=student,
-                curso_academico=curso_academico_activo
-            ).first()
-            
-            all_notes = []
-            notas_list = []
-            if calificacion:
-                # Obtener todas las notas individuales relacionadas con esta calificación
-                notas_list = list(calificacion.notas.all().order_by('fecha_creacion').values_list('valor', flat=True))
-
-            student_data.append({
-                'calificacion_id': calificacion.id if calificacion else None,
-                'name': student.get_full_name(),
-                'notas': notas_list, # Lista de notas individuales
-                'average': calificacion.average if calificacion else None,
-                'matricula_id': enrollment.id,
-                'student_id': student.id, # Add student.id here
-            })
-
-        context['course'] = course
-        context['student_data'] = student_data
-        context['curso_academico'] = curso_academico_activo
         return context
+
+
+def _gestiona_notas(user, course):
+    """El libro de notas completo solo lo ven y cargan el profesor del curso, Secretaria y Administracion."""
+    return course.teacher_id == user.id or pertenece_a(user, 'Secretaria', 'Administracion')
+
+
+class LibroNotasView(LoginRequiredMixin, View):
+    """
+    Libro de notas de un curso en JSON, por páginas, para cursos grandes.
+    Responde las filas de la página, la URL de la siguiente y, en la primera,
+    la cantidad de columnas de notas de todo el libro.
+    """
+    def get(self, request, course_id):
+        course = get_object_or_404(Curso, id=course_id)
+        if not _gestiona_notas(request.user, course):
+            raise PermissionDenied
+        queryset = libro_notas(course, curso_activo())
+
+        cursor = request.GET.get('cursor')
+        try:
+            matriculas, siguiente = paginar(queryset, (('id', False),), cursor)
+        except signing.BadSignature:
+            return HttpResponseBadRequest('Cursor inválido')
+
+        datos = {'filas': filas_libro(matriculas), 'siguiente': None}
+        if not cursor:
+            datos['columnas'] = columnas_notas(queryset)
+        if siguiente:
+            parametros = request.GET.copy()
+            parametros['cursor'] = siguiente
+            datos['siguiente'] = f'{request.path}?{parametros.urlencode()}'
+        return JsonResponse(datos)
+
+
+@login_required
+@require_POST
+def cargar_notas(request, course_id):
+    """
+    Carga en bloque la grilla de notas de un curso (estudiantes x columnas).
+
+    Acepta JSON con {"filas": [{"matricula_id": ..., "notas": [...]}, ...]},
+    el mismo formato que devuelve LibroNotasView, y responde JSON; o un
+    archivo XLSX/CSV en el campo `archivo`, y vuelve al libro de notas con un
+    mensaje. Solo el profesor del curso, Secretaria y Administracion.
+    """
+    course = get_object_or_404(Curso, id=course_id)
+    if not _gestiona_notas(request.user, course):
+        raise PermissionDenied
+
+    if request.content_type == 'application/json':
+        try:
+            filas = json.loads(request.body)['filas']
+            # Como pares, para que una matrícula repetida se rechace en lugar de pisar la anterior
+            creadas, modificadas = guardar_grilla(course, [(fila['matricula_id'], fila['notas']) for fila in filas])
+        except (ValueError, KeyError, TypeError) as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        return JsonResponse({'creadas': creadas, 'modificadas': modificadas})
+
+    try:
+        if 'archivo' not in request.FILES:
+            raise ValueError('Seleccione un archivo XLSX o CSV con las notas.')
+        creadas, modificadas = guardar_grilla(course, leer_grilla(request.FILES['archivo']))
+    except ValueError as error:
+        messages.error(request, str(error))
+    else:
+        messages.success(request, f'Notas guardadas: {creadas} nuevas y {modificadas} modificadas.')
+    return redirect('principal:student_list_notas_by_course', course_id=course.id)
+
 # Agregar Notas de los estudiantes
 
 class AddNotaView(LoginRequiredMixin, View):
@@ -1476,8 +940,11 @@ class AddNotaView(LoginRequiredMixin, View):
             formset = NotaIndividualFormSet(request.POST, instance=calificacion)
 
             if formset.is_valid():
-                
-                formset.save()
+                # Guardar todas las notas y recalcular el promedio una sola vez
+                with transaction.atomic():
+                    with contadores.en_lote(), agrupar_versiones():
+                        formset.save()
+                    contadores.recalcular_calificacion(calificacion)
                 messages.success(request, 'Notas guardadas correctamente.')
                 return redirect('principal:student_list_notas_by_course', course_id=matricula.course.id)
             else:
@@ -1525,9 +992,15 @@ def editar_curso(request, course_id):
 
 #vistas para historicos
 
+@login_required
 def historico_alumno(request, student_id):
-        matriculas = Matriculas.objects.filter(student_id=student_id).select_related('curso_academico')
-        return render(request, 'historico.html', {'matriculas': matriculas})
+    """Historial académico del estudiante en todos los cursos académicos; `?formato=pdf` lo exporta."""
+    if request.user.pk != student_id and not pertenece_a(request.user, 'Profesores', 'Secretaria', 'Administracion'):
+        raise PermissionDenied
+    student = get_object_or_404(User, id=student_id)
+    if request.GET.get('formato') == 'pdf':
+        return encolar_exportacion(request, 'historial_pdf', {'estudiante': student.pk})
+    return render(request, 'historico.html', {'student': student, 'historial': historial_estudiante(student.pk)})
 
 
 # Agregando asistencias
@@ -1542,14 +1015,7 @@ class AsistenciaView(BaseContextMixin, TemplateView):
         course = get_object_or_404(Curso, id=course_id)
         
         # Obtener el curso académico activo
-        curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-        
-        # Filtrar asistencias por curso y ordenar por fecha descendente
-        asistencias = Asistencia.objects.filter(
-            course=course,
-            student__matriculas__curso_academico=curso_academico_activo,
-            student__matriculas__activo=True
-        ).select_related('student', 'course').order_by('-date')
+        curso_academico_activo = curso_activo()
         
         # Obtener todas las matrículas activas para este curso en el curso académico activo
         matriculas = Matriculas.objects.filter(
@@ -1559,12 +1025,17 @@ class AsistenciaView(BaseContextMixin, TemplateView):
         ).select_related('student')  # Optimizar consulta de estudiantes
         
         # Filtrar por fecha si se proporciona en la solicitud
-        fecha_filtro = self.request.GET.get('fecha')
-        if fecha_filtro:
-            asistencias = asistencias.filter(date=fecha_filtro)
+        fecha_filtro = None
+        try:
+            fecha_filtro = parse_date(self.request.GET.get('fecha') or '')
+        except ValueError:
+            pass
         
-        # Calcular la cantidad de asistencias registradas (fechas únicas)
-        asistencias_registradas = Asistencia.objects.filter(course=course).values('date').distinct().count()
+        # Matriz estudiante × fecha con totales por estudiante, en una sola consulta
+        matriz = MatrizAsistencias(course, matriculas, fecha=fecha_filtro)
+        
+        # Cantidad de asistencias registradas (fechas únicas), precalculada en el curso
+        asistencias_registradas = course.sesiones_registradas
         
         # Obtener la cantidad total de clases del curso
         cantidad_total_clases = course.class_quantity
@@ -1573,8 +1044,8 @@ class AsistenciaView(BaseContextMixin, TemplateView):
         clases_restantes = cantidad_total_clases - asistencias_registradas
 
         context['course'] = course
-        context['asistencias'] = asistencias
-        context['matriculas'] = matriculas
+        context['matriz'] = matriz
+        context['matriculas'] = matriz.matriculas
         context['curso_academico'] = curso_academico_activo
         context['cantidad_total_clases'] = cantidad_total_clases
         context['asistencias_registradas'] = asistencias_registradas
@@ -1601,24 +1072,22 @@ class AddAsistenciaView(LoginRequiredMixin, TemplateView):
 
     def post(self, request, course_id):
         course = Curso.objects.get(id=course_id)
-        matriculas = Matriculas.objects.filter(course=course)
+        matriculas = Matriculas.objects.filter(course=course).values_list('id', 'student_id')
+
+        try:
+            attendance_date = datetime.strptime(request.POST.get('date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            messages.error(request, "Formato de fecha inválido.")
+            return redirect('principal:add_asistencias', course_id=course_id)
+
+        # Si la casilla está marcada el estudiante está ausente
+        presentes = {
+            student_id: not bool(request.POST.get('asistencia_' + str(matricula_id)))
+            for matricula_id, student_id in matriculas
+        }
+        # Insertar o actualizar todo el grupo en una sola operación
+        registrar_asistencias(course, attendance_date, presentes)
 
-        if request.method == 'POST':
-            date = request.POST.get('date')
-
-            for matricula in matriculas:
-                absent = request.POST.get('asistencia_' + str(matricula.id))
-                # Buscar si ya existe un registro de asistencia para este estudiante en esta fecha
-                asistencia, created = Asistencia.objects.get_or_create(
-                    student=matricula.student,
-                    course=course,
-                    date=date,
-                    defaults={'presente': not bool(absent)}
-                )
-                # Si el registro ya existía, actualizar el estado de presente
-                if not created:
-                    asistencia.presente = not bool(absent)
-                    asistencia.save()
         # Redirigir a la misma página para mostrar las asistencias actualizadas
         return redirect('principal:asistencias', course_id=course_id)
 
@@ -1650,19 +1119,14 @@ def add_asistencias(request, course_id):
             messages.error(request, "Formato de fecha inválido.")
             return redirect('principal:add_asistencias', course_id=course.id)
 
-        # Eliminar asistencias existentes para esta fecha y curso
-        Asistencia.objects.filter(course=course, date=attendance_date).delete()
-
-        for matricula in matriculas:
-            is_absent = request.POST.get(f'asistencia_{matricula.id}')
-            presente = not bool(is_absent) # Si está marcado, significa que está ausente, por lo tanto, no presente
+        # Si está marcado, significa que está ausente, por lo tanto, no presente
+        presentes = {
+            matricula.student_id: not bool(request.POST.get(f'asistencia_{matricula.id}'))
+            for matricula in matriculas
+        }
 
-            Asistencia.objects.create(
-                course=course,
-                student=matricula.student,
-                date=attendance_date,
-                presente=presente
-            )
+        # Reemplazar las asistencias de esta fecha y curso en una sola transacción
+        registrar_asistencias(course, attendance_date, presentes, reemplazar=True)
         messages.success(request, "Asistencias guardadas correctamente.")
         return redirect('principal:asistencias', course_id=course.id) # Redirige a la página de asistencias del curso
     
@@ -1685,7 +1149,7 @@ def undo_last_asistencia(request, course_id):
 
     if latest_attendance_date:
         # Eliminar todos los registros de asistencia para este curso en la fecha más reciente
-        Asistencia.objects.filter(course=course, date=latest_attendance_date).delete()
+        eliminar_asistencias(Asistencia.objects.filter(course=course, date=latest_attendance_date))
         messages.success(request, f"La asistencia del {latest_attendance_date.strftime('%d-%m-%Y')} ha sido deshecha correctamente.")
     else:
         messages.info(request, "No hay asistencias registradas para deshacer en este curso.")
@@ -1701,14 +1165,14 @@ class SecretariaRequiredMixin(UserPassesTestMixin):
     Mixin que verifica que el usuario pertenezca al grupo Secretaria.
     """
     def test_func(self):
-        return self.request.user.groups.filter(name='Secretaria').exists()
+        return pertenece_a(self.request.user, 'Secretaria')
 
 class ProfesorRequiredMixin(UserPassesTestMixin):
     """
     Mixin que verifica que el usuario pertenezca al grupo Profesores.
     """
     def test_func(self):
-        return self.request.user.groups.filter(name='Profesores').exists()
+        return pertenece_a(self.request.user, 'Profesores')
 
 class FormularioAplicacionListView(LoginRequiredMixin, SecretariaRequiredMixin, ListView):
     """
@@ -2089,69 +1553,19 @@ def aplicar_curso(request, curso_id):
         messages.info(request, 'Ya estás matriculado en este curso.')
         return redirect('principal:cursos')
     
-    # Obtener las preguntas del formulario
-    preguntas = formulario.preguntas.all().order_by('orden')
+    # Obtener las preguntas del formulario, con sus opciones, desde el esquema en caché
+    preguntas = preguntas_formulario(formulario)
     
     if request.method == 'POST':
         try:
-            # Crear la solicitud de inscripción
-            solicitud = SolicitudInscripcion.objects.create(
-                curso=curso,
-                estudiante=request.user,
-                formulario=formulario,
-                estado='pendiente'  # Asegurarse de que el estado sea 'pendiente'
-            )
-            
-            # Mensaje de depuración
-            print(f"DEBUG: Solicitud creada - ID: {solicitud.id}, Estado: {solicitud.estado}, Curso: {curso.name}, Estudiante: {request.user.username}")
-            
-            # Verificar que la solicitud se haya creado correctamente
-            solicitud_verificada = SolicitudInscripcion.objects.filter(
-                id=solicitud.id
-            ).first()
-            
-            if solicitud_verificada:
-                print(f"DEBUG: Solicitud verificada - ID: {solicitud_verificada.id}, Estado: {solicitud_verificada.estado}")
-            else:
-                print("ERROR: No se pudo verificar la solicitud creada")
-        except Exception as e:
-            print(f"ERROR al crear la solicitud: {str(e)}")
-            raise
-        
-        # Procesar las respuestas
-        for pregunta in preguntas:
-            respuesta = RespuestaEstudiante.objects.create(
-                solicitud=solicitud,
-                pregunta=pregunta
-            )
-            
-            # Obtener las opciones seleccionadas
-            if pregunta.tipo == 'seleccion_multiple':
-                opcion_ids = request.POST.getlist(f'pregunta_{pregunta.id}')
-                for opcion_id in opcion_ids:
-                    opcion = get_object_or_404(OpcionRespuesta, id=opcion_id)
-                    respuesta.opciones_seleccionadas.add(opcion)
-            elif pregunta.tipo == 'seleccion_unica':
-                opcion_id = request.POST.get(f'pregunta_{pregunta.id}')
-                if opcion_id:
-                    opcion = get_object_or_404(OpcionRespuesta, id=opcion_id)
-                    respuesta.opciones_seleccionadas.add(opcion)
-            elif pregunta.tipo == 'escritura_libre':
-                # Para preguntas de escritura libre, creamos una opción de respuesta con el texto ingresado
-                texto_respuesta = request.POST.get(f'pregunta_{pregunta.id}', '')
-                if texto_respuesta:
-                    # Crear una opción de respuesta para almacenar el texto
-                    opcion = OpcionRespuesta.objects.create(
-                        pregunta=pregunta,
-                        texto=texto_respuesta,
-                        orden=0
-                    )
-                    respuesta.opciones_seleccionadas.add(opcion)
-        
-        # En lugar de redirigir a la lista de cursos, redirigimos a una página de confirmación
-        # que luego redirigirá automáticamente a la lista de cursos
-        request.session['solicitud_enviada_curso_id'] = curso_id
-        return redirect('principal:solicitud_enviada', curso_id=curso_id)
+            enviar_solicitud(curso, request.user, formulario, preguntas, request.POST)
+        except ValueError as e:
+            messages.error(request, str(e))
+        else:
+            # En lugar de redirigir a la lista de cursos, redirigimos a una página de confirmación
+            # que luego redirigirá automáticamente a la lista de cursos
+            request.session['solicitud_enviada_curso_id'] = curso_id
+            return redirect('principal:solicitud_enviada', curso_id=curso_id)
     
     # Crear formularios dinámicos para cada pregunta
     formularios_preguntas = []
@@ -2205,7 +1619,7 @@ class SolicitudesInscripcionListView(LoginRequiredMixin, ProfesorRequiredMixin,
         return SolicitudInscripcion.objects.filter(
             curso__teacher=self.request.user,
             estado='pendiente'
-        ).order_by('-fecha_solicitud')
+        ).select_related('estudiante', 'curso').order_by('-fecha_solicitud')
 
 class SolicitudInscripcionDetailView(LoginRequiredMixin, ProfesorRequiredMixin, DetailView):
     """
@@ -2234,46 +1648,18 @@ def aprobar_solicitud(request, pk):
     """
     Vista para que un profesor apruebe una solicitud de inscripción.
     """
-    solicitud = get_object_or_404(SolicitudInscripcion, pk=pk)
+    solicitud = get_object_or_404(SolicitudInscripcion.objects.select_related('curso', 'estudiante'), pk=pk)
     
     # Verificar que el profesor sea el profesor del curso
-    if solicitud.curso.teacher != request.user:
+    if solicitud.curso.teacher_id != request.user.id:
         raise PermissionDenied
     
-    # Aprobar la solicitud
-    matricula = solicitud.aprobar(request.user)
-    
-    # Enviar correo de confirmación al estudiante
-    try:
-        nombre_estudiante = solicitud.estudiante.get_full_name() or solicitud.estudiante.username
-        nombre_curso = solicitud.curso.name
-        email_estudiante = solicitud.estudiante.email
-        
-        if email_estudiante:
-            asunto = f'¡Enhorabuena! Su aplicación al curso {nombre_curso} ha sido aprobada'
-            mensaje = f'''¡Enhorabuena! Su aplicación al curso "{nombre_curso}" ha sido aprobada.
-
-Ya puede acceder al curso y comenzar con las actividades académicas.
-
-Saludos cordiales,
-Centro Fray Bartolomé de las Casas'''
-            
-            send_mail(
-                asunto,
-                mensaje,
-                settings.DEFAULT_FROM_EMAIL,
-                [email_estudiante],
-                fail_silently=False,
-            )
-            print(f"Correo enviado exitosamente a {email_estudiante} para el curso {nombre_curso}")
-        else:
-            print(f"No se pudo enviar correo: el estudiante {nombre_estudiante} no tiene email registrado")
-    except Exception as e:
-        print(f"Error al enviar correo de aprobación: {str(e)}")
-        # No interrumpimos el proceso si falla el envío del correo
-    
-    # Agregar un solo mensaje de éxito
-    messages.success(request, f'La solicitud de {solicitud.estudiante.get_full_name() or solicitud.estudiante.username} ha sido aprobada.')
+    # Aprobar la solicitud; la matrícula se crea y el correo de confirmación queda en la bandeja de salida
+    nombre = solicitud.estudiante.get_full_name() or solicitud.estudiante.username
+    if revisar_solicitudes(SolicitudInscripcion.objects.filter(pk=solicitud.pk), True, request.user):
+        messages.success(request, f'La solicitud de {nombre} ha sido aprobada.')
+    else:
+        messages.info(request, f'La solicitud de {nombre} ya había sido revisada; no se realizaron cambios.')
     
     # Verificar si la solicitud viene del perfil o de la página de solicitudes
     referer = request.META.get('HTTP_REFERER', '')
@@ -2287,47 +1673,42 @@ def rechazar_solicitud(request, pk):
     """
     Vista para que un profesor rechace una solicitud de inscripción.
     """
-    solicitud = get_object_or_404(SolicitudInscripcion, pk=pk)
+    solicitud = get_object_or_404(SolicitudInscripcion.objects.select_related('curso', 'estudiante'), pk=pk)
     
     # Verificar que el profesor sea el profesor del curso
-    if solicitud.curso.teacher != request.user:
+    if solicitud.curso.teacher_id != request.user.id:
         raise PermissionDenied
     
-    # Rechazar la solicitud
-    solicitud.rechazar(request.user)
-    
-    # Enviar correo de notificación al estudiante
-    try:
-        nombre_estudiante = solicitud.estudiante.get_full_name() or solicitud.estudiante.username
-        nombre_curso = solicitud.curso.name
-        email_estudiante = solicitud.estudiante.email
-        
-        if email_estudiante:
-            asunto = f'Su aplicación al curso {nombre_curso} ha sido denegada'
-            mensaje = f'''Lo sentimos! Su aplicación al curso "{nombre_curso}" ha sido denegada.
-
-Le recomendamos revisar los requisitos del curso y considerar aplicar en futuras convocatorias.
-
-Si tiene alguna pregunta, no dude en contactarnos.
+    # Rechazar la solicitud; el correo de notificación queda en la bandeja de salida
+    nombre = solicitud.estudiante.get_full_name() or solicitud.estudiante.username
+    if revisar_solicitudes(SolicitudInscripcion.objects.filter(pk=solicitud.pk), False, request.user):
+        messages.success(request, f'La solicitud de {nombre} ha sido rechazada.')
+    else:
+        messages.info(request, f'La solicitud de {nombre} ya había sido revisada; no se realizaron cambios.')
+    return redirect('principal:solicitudes_list')
 
-Saludos cordiales,
-Centro Fray Bartolomé de las Casas'''
-            
-            send_mail(
-                asunto,
-                mensaje,
-                settings.DEFAULT_FROM_EMAIL,
-                [email_estudiante],
-                fail_silently=False,
-            )
-            print(f"Correo de denegación enviado exitosamente a {email_estudiante} para el curso {nombre_curso}")
-        else:
-            print(f"No se pudo enviar correo: el estudiante {nombre_estudiante} no tiene email registrado")
-    except Exception as e:
-        print(f"Error al enviar correo de denegación: {str(e)}")
-        # No interrumpimos el proceso si falla el envío del correo
+@login_required
+@require_POST
+def revisar_solicitudes_en_bloque(request):
+    """
+    Vista para que un profesor apruebe o rechace de una vez las solicitudes
+    seleccionadas de sus cursos.
+    """
+    accion = request.POST.get('accion')
+    if accion not in ('aprobar', 'rechazar'):
+        messages.error(request, 'Acción no válida.')
+        return redirect('principal:solicitudes_list')
+    
+    ids = [pk for pk in request.POST.getlist('solicitudes') if pk.isdigit()]
+    # Solo las solicitudes de los cursos del profesor; las ajenas se ignoran
+    solicitudes = SolicitudInscripcion.objects.filter(pk__in=ids, curso__teacher=request.user)
+    revisadas = revisar_solicitudes(solicitudes, accion == 'aprobar', request.user)
     
-    messages.success(request, f'La solicitud de {solicitud.estudiante.get_full_name() or solicitud.estudiante.username} ha sido rechazada.')
+    if revisadas:
+        verbo = 'aprobadas' if accion == 'aprobar' else 'rechazadas'
+        messages.success(request, f'{revisadas} solicitudes han sido {verbo}.')
+    else:
+        messages.info(request, 'No se seleccionó ninguna solicitud pendiente.')
     return redirect('principal:solicitudes_list')
 
 @login_required
@@ -2336,7 +1717,7 @@ def guardar_pregunta_y_redirigir(request, formulario_id):
     Vista para guardar una pregunta y redirigir a la página de opciones.
     """
     # Verificar que el usuario pertenezca al grupo 'Secretaria'
-    if not request.user.groups.filter(name='Secretaria').exists():
+    if not pertenece_a(request.user, 'Secretaria'):
         messages.error(request, 'No tienes permisos para realizar esta acción.')
         return redirect('principal:formulario_list')
     
@@ -2400,7 +1781,7 @@ def eliminar_formulario(request, pk):
     Vista para eliminar un formulario de aplicación.
     """
     # Verificar que el usuario pertenezca al grupo Secretaria
-    if not request.user.groups.filter(name='Secretaria').exists():
+    if not pertenece_a(request.user, 'Secretaria'):
         messages.error(request, 'No tienes permisos para realizar esta acción.')
         return redirect('principal:cursos')
     
@@ -2445,21 +1826,15 @@ def password_reset_request(request):
             request.session['reset_verification_code'] = verification_code
             request.session['reset_user_id'] = user.id
             
-            # Enviar email con el código de verificación
+            # Encolar el email con el código de verificación
             email_text = f'Para restablecer su contraseña en el Centro Fray Bartolome de las Casas, ingrese el siguiente código: {verification_code}'
-            try:
-                send_mail(
-                    'Código para Restablecer Contraseña - Centro Fray Bartolome de las Casas',
-                    email_text,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [email],
-                    fail_silently=False,
-                )
-                messages.success(request, 'Se ha enviado un código de verificación a su correo electrónico.')
-                return redirect('principal:password_reset_verify')
-            except Exception as e:
-                print(f"Error al enviar email: {str(e)}")
-                messages.error(request, 'Error al enviar el código de verificación. Por favor, intente nuevamente más tarde.')
+            encolar_correos([(
+                email,
+                'Código para Restablecer Contraseña - Centro Fray Bartolome de las Casas',
+                email_text,
+            )])
+            messages.success(request, 'Se ha enviado un código de verificación a su correo electrónico.')
+            return redirect('principal:password_reset_verify')
         except User.DoesNotExist:
             messages.error(request, 'No existe una cuenta con ese correo electrónico.')
     
@@ -2503,14 +1878,11 @@ def password_reset_confirm(request):
             user.password = make_password(password1)
             user.save()
             
-            # Enviar correo de confirmación de cambio de contraseña
-            try:
-                nombre_usuario = user.get_full_name() or user.username
-                email_usuario = user.email
-                
-                if email_usuario:
-                    asunto = 'Su contraseña ha sido cambiada satisfactoriamente'
-                    mensaje = f'''Estimado/a {nombre_usuario},
+            # Encolar el correo de confirmación de cambio de contraseña
+            # (encolar_correos omite a los usuarios sin email registrado)
+            nombre_usuario = user.get_full_name() or user.username
+            asunto = 'Su contraseña ha sido cambiada satisfactoriamente'
+            mensaje = f'''Estimado/a {nombre_usuario},
 
 Su contraseña ha sido cambiada satisfactoriamente en el Centro Fray Bartolomé de las Casas.
 
@@ -2520,20 +1892,7 @@ Fecha y hora del cambio: {timezone.now().strftime('%d/%m/%Y a las %H:%M')}
 
 Saludos cordiales,
 Centro Fray Bartolomé de las Casas'''
-                    
-                    send_mail(
-                        asunto,
-                        mensaje,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [email_usuario],
-                        fail_silently=False,
-                    )
-                    print(f"Correo de confirmación de cambio de contraseña enviado a {email_usuario}")
-                else:
-                    print(f"No se pudo enviar correo: el usuario {nombre_usuario} no tiene email registrado")
-            except Exception as e:
-                print(f"Error al enviar correo de confirmación de cambio de contraseña: {str(e)}")
-                # No interrumpimos el proceso si falla el envío del correo
+            encolar_correos([(user.email, asunto, mensaje)])
             
             # Limpiar datos de sesión
             del request.session['reset_verification_code']
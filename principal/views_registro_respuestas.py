@@ -2,17 +2,20 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView
-from django.db.models import Q, Prefetch
+from django.db.models import Exists, OuterRef, Q, Prefetch
 from django.contrib.auth.models import User
 from .models import (
     Curso, SolicitudInscripcion, RespuestaEstudiante, 
     FormularioAplicacion, PreguntaFormulario, OpcionRespuesta,
-    CursoAcademico
 )
+from .cursos_academicos import curso_activo
+from .estadisticas import con_estadisticas, estadisticas_solicitudes, resumen_curso_academico
+from .roles import pertenece_a
+from .views import encolar_exportacion
 
 def es_profesor_o_secretaria(user):
     """Verifica si el usuario es profesor o secretaria"""
-    return user.groups.filter(name__in=['Profesores', 'Secretaria']).exists()
+    return pertenece_a(user, 'Profesores', 'Secretaria')
 
 class RegistroRespuestasGeneralView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     """
@@ -28,25 +31,16 @@ class RegistroRespuestasGeneralView(LoginRequiredMixin, UserPassesTestMixin, Lis
     
     def get_queryset(self):
         # Obtener el curso académico activo
-        curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
+        curso_academico_activo = curso_activo()
         
-        # Filtrar cursos que tengan formularios de aplicación y solicitudes
-        queryset = Curso.objects.filter(
+        # Filtrar cursos que tengan formularios de aplicación y solicitudes. Los
+        # filtros sobre solicitudes van con Exists para no alterar los totales anotados
+        solicitudes = SolicitudInscripcion.objects.filter(curso=OuterRef('pk'))
+        queryset = con_estadisticas(Curso.objects.filter(
+            Exists(solicitudes),
             formulario_aplicacion__isnull=False,
-            solicitudes__isnull=False,
             curso_academico=curso_academico_activo
-        ).distinct().prefetch_related(
-            'formulario_aplicacion',
-            Prefetch(
-                'solicitudes',
-                queryset=SolicitudInscripcion.objects.select_related('estudiante').prefetch_related(
-                    Prefetch(
-                        'respuestas',
-                        queryset=RespuestaEstudiante.objects.select_related('pregunta').prefetch_related('opciones_seleccionadas')
-                    )
-                )
-            )
-        )
+        ).select_related('teacher'))
         
         # Filtros opcionales
         search = self.request.GET.get('search')
@@ -60,7 +54,7 @@ class RegistroRespuestasGeneralView(LoginRequiredMixin, UserPassesTestMixin, Lis
             )
         
         if estado_filter:
-            queryset = queryset.filter(solicitudes__estado=estado_filter)
+            queryset = queryset.filter(Exists(solicitudes.filter(estado=estado_filter)))
         
         return queryset.order_by('name')
     
@@ -68,36 +62,13 @@ class RegistroRespuestasGeneralView(LoginRequiredMixin, UserPassesTestMixin, Lis
         context = super().get_context_data(**kwargs)
         
         # Agregar estadísticas generales
-        curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
+        curso_academico_activo = curso_activo()
         context['curso_academico'] = curso_academico_activo
         
         if curso_academico_activo:
-            context['total_solicitudes'] = SolicitudInscripcion.objects.filter(
-                curso__curso_academico=curso_academico_activo
-            ).count()
-            
-            context['solicitudes_pendientes'] = SolicitudInscripcion.objects.filter(
-                curso__curso_academico=curso_academico_activo,
-                estado='pendiente'
-            ).count()
-            
-            context['solicitudes_aprobadas'] = SolicitudInscripcion.objects.filter(
-                curso__curso_academico=curso_academico_activo,
-                estado='aprobada'
-            ).count()
-            
-            context['solicitudes_rechazadas'] = SolicitudInscripcion.objects.filter(
-                curso__curso_academico=curso_academico_activo,
-                estado='rechazada'
-            ).count()
+            context.update(resumen_curso_academico(curso_academico_activo))
         
-        # Agregar estadísticas por curso
-        cursos = context['cursos']
-        for curso in cursos:
-            curso.total_solicitudes = curso.solicitudes.count()
-            curso.solicitudes_pendientes = curso.solicitudes.filter(estado='pendiente').count()
-            curso.solicitudes_aprobadas = curso.solicitudes.filter(estado='aprobada').count()
-            curso.solicitudes_rechazadas = curso.solicitudes.filter(estado='rechazada').count()
+        # Las estadísticas por curso vienen anotadas en el queryset
         
         # Opciones para filtros
         context['estados_choices'] = SolicitudInscripcion.ESTADO_CHOICES
@@ -118,7 +89,7 @@ class RegistroRespuestasCursoView(LoginRequiredMixin, UserPassesTestMixin, Detai
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        curso = self.get_object()
+        curso = self.object
         
         # Obtener todas las solicitudes del curso con sus respuestas
         solicitudes = SolicitudInscripcion.objects.filter(
@@ -157,10 +128,8 @@ class RegistroRespuestasCursoView(LoginRequiredMixin, UserPassesTestMixin, Detai
             context['preguntas'] = []
         
         # Estadísticas del curso
-        context['total_solicitudes_curso'] = solicitudes.count()
-        context['solicitudes_pendientes_curso'] = solicitudes.filter(estado='pendiente').count()
-        context['solicitudes_aprobadas_curso'] = solicitudes.filter(estado='aprobada').count()
-        context['solicitudes_rechazadas_curso'] = solicitudes.filter(estado='rechazada').count()
+        for nombre, total in estadisticas_solicitudes(solicitudes).items():
+            context[f'{nombre}_curso'] = total
         
         # Opciones para filtros
         context['estados_choices'] = SolicitudInscripcion.ESTADO_CHOICES
@@ -203,138 +172,11 @@ class RegistroRespuestasEstudianteView(LoginRequiredMixin, UserPassesTestMixin,
 @user_passes_test(es_profesor_o_secretaria)
 def exportar_respuestas_excel(request, curso_id=None):
     """
-    Vista para exportar las respuestas a Excel
+    Vista para exportar las respuestas a Excel, o a CSV con ?formato=csv para
+    un curso (se genera en segundo plano)
     """
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from django.http import HttpResponse
-    from io import BytesIO
-    
-    # Crear libro de Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    
-    # Estilos
-    header_font = Font(name='Arial', bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='003366', end_color='003366', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center')
-    border = Border(left=Side(style='thin'), right=Side(style='thin'), 
-                   top=Side(style='thin'), bottom=Side(style='thin'))
-    
     if curso_id:
-        # Exportar respuestas de un curso específico
-        curso = get_object_or_404(Curso, id=curso_id)
-        ws.title = f"Respuestas {curso.name}"
-        
-        solicitudes = SolicitudInscripcion.objects.filter(
-            curso=curso
-        ).select_related('estudiante').prefetch_related(
-            'respuestas__pregunta',
-            'respuestas__opciones_seleccionadas'
-        ).order_by('estudiante__first_name', 'estudiante__last_name')
-        
-        # Obtener preguntas del formulario
-        try:
-            formulario = FormularioAplicacion.objects.get(curso=curso)
-            preguntas = list(formulario.preguntas.all().order_by('orden'))
-        except FormularioAplicacion.DoesNotExist:
-            preguntas = []
-        
-        # Encabezados
-        headers = ['Estudiante', 'Email', 'Estado', 'Fecha Solicitud']
-        for pregunta in preguntas:
-            headers.append(pregunta.texto)
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Datos
-        for row_num, solicitud in enumerate(solicitudes, 2):
-            ws.cell(row=row_num, column=1, value=solicitud.estudiante.get_full_name() or solicitud.estudiante.username)
-            ws.cell(row=row_num, column=2, value=solicitud.estudiante.email)
-            ws.cell(row=row_num, column=3, value=solicitud.get_estado_display())
-            ws.cell(row=row_num, column=4, value=solicitud.fecha_solicitud.strftime('%d/%m/%Y %H:%M'))
-            
-            # Respuestas por pregunta
-            respuestas_dict = {}
-            for respuesta in solicitud.respuestas.all():
-                opciones_texto = ', '.join([opcion.texto for opcion in respuesta.opciones_seleccionadas.all()])
-                respuestas_dict[respuesta.pregunta.id] = opciones_texto
-            
-            for col_num, pregunta in enumerate(preguntas, 5):
-                respuesta_texto = respuestas_dict.get(pregunta.id, 'Sin respuesta')
-                ws.cell(row=row_num, column=col_num, value=respuesta_texto)
-            
-            # Aplicar bordes
-            for col_num in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col_num).border = border
-        
-        filename = f"respuestas_{curso.name.replace(' ', '_')}.xlsx"
-    
-    else:
-        # Exportar resumen general de todos los cursos
-        ws.title = "Resumen General"
-        
-        curso_academico_activo = CursoAcademico.objects.filter(activo=True).first()
-        cursos = Curso.objects.filter(
-            formulario_aplicacion__isnull=False,
-            solicitudes__isnull=False,
-            curso_academico=curso_academico_activo
-        ).distinct()
-        
-        # Encabezados
-        headers = ['Curso', 'Profesor', 'Total Solicitudes', 'Pendientes', 'Aprobadas', 'Rechazadas']
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
-        
-        # Datos
-        for row_num, curso in enumerate(cursos, 2):
-            total = curso.solicitudes.count()
-            pendientes = curso.solicitudes.filter(estado='pendiente').count()
-            aprobadas = curso.solicitudes.filter(estado='aprobada').count()
-            rechazadas = curso.solicitudes.filter(estado='rechazada').count()
-            
-            ws.cell(row=row_num, column=1, value=curso.name)
-            ws.cell(row=row_num, column=2, value=curso.teacher.get_full_name() or curso.teacher.username)
-            ws.cell(row=row_num, column=3, value=total)
-            ws.cell(row=row_num, column=4, value=pendientes)
-            ws.cell(row=row_num, column=5, value=aprobadas)
-            ws.cell(row=row_num, column=6, value=rechazadas)
-            
-            # Aplicar bordes
-            for col_num in range(1, len(headers) + 1):
-                ws.cell(row=row_num, column=col_num).border = border
-        
-        filename = "resumen_respuestas_general.xlsx"
-    
-    # Ajustar ancho de columnas
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            if cell.value:
-                max_length = max(max_length, len(str(cell.value)))
-        adjusted_width = min(max_length + 2, 50)  # Máximo 50 caracteres
-        ws.column_dimensions[column].width = adjusted_width
-    
-    # Guardar archivo
-    excel_file = BytesIO()
-    wb.save(excel_file)
-    excel_file.seek(0)
-    
-    response = HttpResponse(
-        excel_file.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename={filename}'
-    
-    return response
\ No newline at end of file
+        get_object_or_404(Curso, id=curso_id)
+        if request.GET.get('formato') == 'csv':
+            return encolar_exportacion(request, 'respuestas_csv', {'curso_id': curso_id})
+    return encolar_exportacion(request, 'respuestas_excel', {'curso_id': curso_id})